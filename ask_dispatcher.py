@@ -0,0 +1,185 @@
+#  Background answering for the GUI
+#  A fixed pool of threads takes questions from one FIFO queue, results are
+#  handed back in submission order, and every history change goes through a
+#  single writer thread so the history list and file are never mutated
+#  concurrently.
+
+import queue
+import threading
+import time
+
+from response_cache import normalize_question
+
+
+class HistoryWriter:
+    """Single thread that owns all writes to bot.history and its journal"""
+
+    _CLEAR = object()
+    _STOP = object()
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, question, answer):
+        self._queue.put((question, answer))
+
+    def clear(self):
+        self._queue.put(self._CLEAR)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            # Drain whatever else is waiting so bursts become one journal write
+            items = [item]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            turns = []
+            for item in items:
+                if item is self._STOP or item is self._CLEAR:
+                    if turns:
+                        self.bot.record(turns)
+                        turns = []
+                    if item is self._STOP:
+                        return
+                    self.bot.clear_history()
+                else:
+                    turns.append(item)
+            if turns:
+                self.bot.record(turns)
+
+    def stop(self, timeout=None):
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+
+class AskDispatcher:
+    """Answers questions on a fixed-size thread pool.
+
+    deliver(ticket, answer) is called once per submitted question, strictly in
+    submission order, from a worker thread; answer is None when the request
+    was cancelled or superseded by an identical question submitted later.
+
+    With on_partial, answers are streamed and on_partial(ticket, text_so_far)
+    is called at most every partial_interval seconds while one is still being
+    written (in practice only model answers take that long).
+    """
+
+    _STOP = object()
+
+    def __init__(self, bot, deliver, workers=2, on_partial=None, partial_interval=0.05):
+        self.bot = bot
+        self.deliver = deliver
+        self.on_partial = on_partial
+        self.partial_interval = partial_interval
+        self.writer = HistoryWriter(bot)
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_ticket = 0
+        self._next_delivery = 0
+        self._ready = {}
+        self._pending = {}  # ticket -> normalized question, until a worker picks it up
+        self._cancelled = set()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"ask-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, question):
+        """Queue a question and return its ticket"""
+        key = normalize_question(question)
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            # An identical question still waiting in the queue is superseded
+            for older, older_key in list(self._pending.items()):
+                if older_key == key:
+                    self._cancelled.add(older)
+                    del self._pending[older]
+            self._pending[ticket] = key
+        self._requests.put((ticket, question))
+        return ticket
+
+    def cancel(self, ticket):
+        with self._lock:
+            if self._pending.pop(ticket, None) is not None:
+                self._cancelled.add(ticket)
+
+    def cancel_all(self):
+        """Cancel every question whose answer has not been delivered yet (e.g. on Clear)"""
+        with self._lock:
+            self._cancelled.update(range(self._next_delivery, self._next_ticket))
+            self._pending.clear()
+
+    def clear_history(self):
+        self.cancel_all()
+        self.writer.clear()
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is self._STOP:
+                return
+            ticket, question = item
+            with self._lock:
+                skip = ticket in self._cancelled
+                self._pending.pop(ticket, None)
+            answer, failed = None, False
+            if not skip:
+                try:
+                    if self.on_partial is None:
+                        answer = self.bot.get_smart_response(question)
+                    else:
+                        answer = self._stream(ticket, question)
+                except Exception as e:
+                    answer, failed = f"Sorry, I encountered an error: {str(e)}", True
+            self._complete(ticket, question, answer, failed)
+
+    def _stream(self, ticket, question):
+        _, chunks = self.bot.stream_response(question)
+        parts = []
+        last = time.monotonic()
+        for chunk in chunks:
+            parts.append(chunk)
+            with self._lock:
+                cancelled = ticket in self._cancelled
+            if cancelled:
+                # A model backend stops generating once its generator is closed
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                break
+            now = time.monotonic()
+            if now - last >= self.partial_interval:
+                last = now
+                self.on_partial(ticket, "".join(parts))
+        return "".join(parts)
+
+    def _complete(self, ticket, question, answer, failed):
+        with self._lock:
+            self._ready[ticket] = (question, answer, failed)
+            # Hand results over in submission order, whatever order they finished in
+            while self._next_delivery in self._ready:
+                current = self._next_delivery
+                question, answer, failed = self._ready.pop(current)
+                self._next_delivery += 1
+                if current in self._cancelled:
+                    self._cancelled.discard(current)
+                    answer = None
+                if answer is not None and not failed:
+                    self.writer.record(question, answer)
+                self.deliver(current, answer)
+
+    def shutdown(self, timeout=None):
+        for _ in self._workers:
+            self._requests.put(self._STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+        self.writer.stop(timeout)
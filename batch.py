@@ -0,0 +1,68 @@
+#  Headless bulk processing: JSONL questions in, JSONL answers out
+#  bash: python coder_chatbot.py --batch questions.jsonl --output answers.jsonl
+#
+#  Each input line is either a JSON object holding the question in `field`
+#  (default "question") or a bare JSON string. Output lines echo the input
+#  object with "answer" and "rule" added, in the same order as the input.
+#  With trace=True (--trace) a "trace" field lists the decision stages.
+
+import contextlib
+import itertools
+import json
+import sys
+
+
+def read_records(lines, field="question"):
+    """Yield (record, question) pairs from JSONL lines, skipping blank lines"""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e})") from e
+        if isinstance(record, str):
+            record = {field: record}
+        if not isinstance(record, dict) or not isinstance(record.get(field), str):
+            raise ValueError(f"Line {number}: expected an object with a string {field!r} field")
+        yield record, record[field]
+
+
+def run_batch(bot, input_file, output_file, field="question", workers=None,
+              chunksize=256, record_history=True, trace=False):
+    """Answer every question of input_file and stream the results to output_file"""
+    records, questions = itertools.tee(read_records(input_file, field))
+    questions = (question for _, question in questions)
+    turns = []
+    count = 0
+    for (record, _), (question, answer, rule_id) in zip(
+            records, bot.iter_responses(questions, workers, chunksize)):
+        record["answer"] = answer
+        record["rule"] = rule_id
+        if trace:
+            # Traced here rather than in the pool workers; this is a debugging aid
+            record["trace"] = bot.explain(question)["stages"]
+        output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+        if record_history:
+            turns.append((question, answer))
+            # One bulk journal append per chunk instead of one write per item
+            if len(turns) >= chunksize:
+                bot.record(turns)
+                turns = []
+    if turns:
+        bot.record(turns)
+    output_file.flush()
+    return count
+
+
+# "-" is a standard stream: usable in a with block, but left open afterwards for
+# later output (metrics, the interpreter's final flush)
+
+def open_input(path):
+    return contextlib.nullcontext(sys.stdin) if path == "-" else open(path, "r", encoding="utf-8")
+
+
+def open_output(path):
+    return contextlib.nullcontext(sys.stdout) if path == "-" else open(path, "w", encoding="utf-8")
@@ -0,0 +1,437 @@
+#  Reproducible benchmarks for the response engine, history I/O (multi-process included) and GUI rendering
+#  bash: python benchmark.py --output results.json
+#  bash: python benchmark.py --compare results.json   (exit code 1 on a regression)
+#
+#  Every corpus is generated from a fixed seed, so two runs on the same machine
+#  measure exactly the same work. Each metric records whether lower or higher
+#  is better, which is what --compare uses to spot regressions.
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from coder_chatbot import FriendlyCodeChatbot
+from history_store import HistoryArchive, HistoryJournal
+from sqlite_history import SqliteHistory
+
+SEED = 1234
+HISTORY_SIZES = (10, 1000, 10000, 100000)
+RENDER_SIZES = (10, 1000, 10000)
+QUICK_HISTORY_SIZES = (10, 1000)
+QUICK_RENDER_SIZES = (10, 1000)
+CONTENTION_WRITERS = 4
+CONTENTION_TURNS = 500
+QUICK_CONTENTION_TURNS = 100
+
+_TEMPLATES = (
+    "{kw}",
+    "tell me about {kw} please",
+    "I have a question about {kw} in my project",
+    "can you show an example of {kw} for a beginner",
+)
+_FILLER = ("please", "quick", "question", "about", "my", "project", "today", "thanks", "idea", "weather")
+
+
+class Results:
+    """Flat metric name -> {"value", "unit", "better"}"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better="lower"):
+        self.metrics[name] = {"value": round(value, 6), "unit": unit, "better": better}
+        print(f"  {name:<45} {value:>14.4f} {unit}")
+
+
+def _median_time(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+# Corpora
+
+def rule_questions(pack, rng, per_rule=200):
+    """{rule_id: [questions]} aimed at every answering rule of the pack"""
+    rules = {rule.rule_id: rule for rule in pack.rules}
+    corpus = {}
+    for rule in pack.rules:
+        if rule.fallthrough or rule.rule_id in ("default", "short_message"):
+            continue
+        if not rule.keywords:
+            continue
+        questions = []
+        for _ in range(per_rule):
+            keyword = rng.choice(rule.keywords)
+            if rule.max_words is not None:
+                questions.append(keyword)
+                continue
+            parent = rules.get(rule.parent)
+            if parent is not None and parent.keywords:
+                keyword = f"{rng.choice(parent.keywords)} {keyword}"
+            questions.append(rng.choice(_TEMPLATES).format(kw=keyword))
+        corpus[rule.rule_id] = questions
+    corpus["default"] = [" ".join(rng.choice(_FILLER) for _ in range(rng.randint(3, 8)))
+                         for _ in range(per_rule)]
+    corpus["short_message"] = [rng.choice("?!ab") for _ in range(per_rule)]
+    return corpus
+
+
+def misspell(word, rng):
+    """word with one typo: two neighbouring letters swapped, one dropped or one replaced"""
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == 1:
+        return word[:i] + word[i + 1:]
+    letter = rng.choice([c for c in "aeioutnrsl" if c != word[i]])
+    return word[:i] + letter + word[i + 1:]
+
+
+def typo_questions(pack, rng, corpus):
+    """{rule_id: [questions]} of corpus with one typo in a keyword word long enough to correct"""
+    vocabulary = pack.matcher.vocabulary
+    typos = {}
+    for rule_id, questions in corpus.items():
+        for question in questions:
+            words = question.split(" ")
+            long_words = [i for i, word in enumerate(words) if len(word) >= 5 and word in vocabulary]
+            if not long_words:
+                continue
+            i = rng.choice(long_words)
+            words[i] = misspell(words[i], rng)
+            typos.setdefault(rule_id, []).append(" ".join(words))
+    return typos
+
+
+def synthetic_turns(rng, count):
+    for i in range(count):
+        words = " ".join(rng.choice(_FILLER) for _ in range(rng.randint(3, 10)))
+        yield f"question {i}: {words}", "answer " * rng.randint(5, 60)
+
+
+def write_history(path, count, seed=SEED):
+    journal = HistoryJournal(path, durability="none")
+    rng = random.Random(seed)
+    chunk = []
+    for turn in synthetic_turns(rng, count):
+        chunk.append(turn)
+        if len(chunk) >= 10000:
+            journal.extend(chunk)
+            chunk = []
+    journal.extend(chunk)
+    journal.close()
+
+
+# Benchmarks
+
+def bench_throughput(results, per_rule=200):
+    """Questions per second of get_smart_response, per target rule, with the cache off"""
+    bot = FriendlyCodeChatbot(history_file=None, cache_size=0)
+    corpus = rule_questions(bot.pack, random.Random(SEED), per_rule)
+    for rule_id, questions in sorted(corpus.items()):
+        elapsed = _median_time(lambda: [bot.get_smart_response(q) for q in questions])
+        results.add(f"throughput.{rule_id}", len(questions) / elapsed, "questions/s", "higher")
+    matched = sum(bot.respond(q)[1] == rule_id for rule_id, qs in corpus.items() for q in qs)
+    total = sum(len(qs) for qs in corpus.values())
+    # Not a timing, but a changed matcher would make the numbers incomparable
+    results.add("throughput.corpus_match_rate", matched / total, "ratio", "higher")
+    typos = typo_questions(bot.pack, random.Random(SEED), corpus)
+    questions = [q for qs in typos.values() for q in qs]
+    elapsed = _median_time(lambda: [bot.get_smart_response(q) for q in questions])
+    results.add("throughput.typos", len(questions) / elapsed, "questions/s", "higher")
+    matched = sum(bot.respond(q)[1] == rule_id for rule_id, qs in typos.items() for q in qs)
+    results.add("throughput.typo_match_rate", matched / len(questions), "ratio", "higher")
+
+
+def bench_history(results, sizes, asks=200):
+    """ask() latency (journal append included) and a full save_history() as history grows"""
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "history.jsonl")
+            write_history(path, size)
+            bot = FriendlyCodeChatbot(history_file=path, cache_size=0)
+            rng = random.Random(SEED)
+            questions = [f"how do I use a python list {rng.random()}" for _ in range(asks)]
+            latencies = []
+            for question in questions:
+                start = time.perf_counter()
+                bot.ask(question)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            results.add(f"history.ask_p50.{size}", latencies[len(latencies) // 2] * 1000, "ms")
+            results.add(f"history.ask_p95.{size}", latencies[int(len(latencies) * 0.95)] * 1000, "ms")
+            results.add(f"history.save_history.{size}", _median_time(bot.save_history, 3) * 1000, "ms")
+            bot.journal.close()
+
+
+def bench_history_size(results, sizes):
+    """Journal bytes per turn and full load() time for rule answers, against storing the text"""
+    bot = FriendlyCodeChatbot(history_file=None, cache_size=0)
+    rng = random.Random(SEED)
+    corpus = [(q, bot.get_smart_response(q))
+              for questions in rule_questions(bot.pack, rng, per_rule=5).values() for q in questions]
+    for size in sizes:
+        turns = [corpus[i % len(corpus)] for i in range(size)]
+        for label, source in (("interned", lambda: bot.pack), ("full_text", None)):
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "history.jsonl")
+                journal = HistoryJournal(path, durability="none", answer_source=source)
+                journal.extend(turns)
+                journal.close()
+                results.add(f"history.bytes_per_turn.{label}.{size}", os.path.getsize(path) / size, "bytes")
+                load = HistoryJournal(path, answer_source=source).load
+                results.add(f"history.load.{label}.{size}", _median_time(load, 3) * 1000, "ms")
+
+
+def bench_sqlite_history(results, sizes, page=200):
+    """SQLite backend: import rate, one page of history and a full-text search as history grows"""
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            history = SqliteHistory(os.path.join(folder, "history.db"), durability="none")
+            turns = list(synthetic_turns(random.Random(SEED), size))
+            start = time.perf_counter()
+            for i in range(0, size, 10000):
+                history.extend(turns[i:i + 10000])
+            results.add(f"history.sqlite.insert_rate.{size}", size / (time.perf_counter() - start),
+                        "turns/s", "higher")
+            middle = size // 2 + 1
+            results.add(f"history.sqlite.load_tail.{size}",
+                        _median_time(lambda: history.load_tail(page)) * 1000, "ms")
+            results.add(f"history.sqlite.load_before.{size}",
+                        _median_time(lambda: history.load_before(middle, page)) * 1000, "ms")
+            # "weather" is in about half the questions, "question 7" narrows that down
+            results.add(f"history.sqlite.search_common.{size}",
+                        _median_time(lambda: history.search("weather")) * 1000, "ms")
+            results.add(f"history.sqlite.search_two_words.{size}",
+                        _median_time(lambda: history.search("question 7")) * 1000, "ms")
+            history.close()
+
+
+_COLD_START_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import coder_chatbot
+coder_chatbot.FriendlyCodeChatbot(sys.argv[1], history_limit=coder_chatbot.HISTORY_PAGE_SIZE)
+print(time.perf_counter() - start)
+"""
+
+
+def bench_cold_start(results, sizes, repeat=5):
+    """Import plus bot construction in a fresh interpreter, as the GUI does it"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for size in (sizes[0], sizes[-1]):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "history.jsonl")
+            write_history(path, size)
+            timings = []
+            for _ in range(repeat):
+                output = subprocess.run([sys.executable, "-c", _COLD_START_SCRIPT, path], cwd=here,
+                                        capture_output=True, text=True, check=True).stdout
+                timings.append(float(output.strip()))
+            results.add(f"cold_start.{size}", statistics.median(timings) * 1000, "ms")
+
+
+def bench_render(results, sizes):
+    """Full transcript refreshes of both GUI views; skipped without a display"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"  render benchmarks skipped: {e}")
+        return
+    from chat_views import ClassicTranscript, VirtualBubbleList
+    from code_highlight import Highlighter
+    root.geometry("800x600")
+    text = tk.Text(root, wrap=tk.WORD, width=80, height=25)
+    text.pack()
+    highlighter = Highlighter()
+    transcript = ClassicTranscript(text, highlighter)
+    bubbles = VirtualBubbleList(root, bg="#2E2E2E")
+    bubbles.pack(fill="both", expand=True)
+    root.update()
+    rng = random.Random(SEED)
+    try:
+        for size in sizes:
+            messages = []
+            for question, answer in synthetic_turns(rng, size):
+                messages.append(("User", question))
+                messages.append(("Bot", answer))
+
+            def classic():
+                transcript.set_messages(messages)
+                transcript.flush()
+                root.update_idletasks()
+
+            def bubble():
+                bubbles.set_messages(messages)
+                root.update_idletasks()
+
+            # These are what refresh_classic_chat/refresh_bubbles_chat do
+            results.add(f"render.classic_refresh.{size}", _median_time(classic, 3) * 1000, "ms")
+            results.add(f"render.bubbles_refresh.{size}", _median_time(bubble, 3) * 1000, "ms")
+
+        # One huge answer full of code: the longest the event loop is kept busy at a time
+        answer = long_code_answer(rng)
+        transcript.clear()
+        start = time.perf_counter()
+        transcript.append("Bot", answer)
+        longest = time.perf_counter() - start
+        while transcript.pending:
+            start = time.perf_counter()
+            root.update()
+            longest = max(longest, time.perf_counter() - start)
+        results.add("render.long_answer_longest_frame", longest * 1000, "ms")
+    finally:
+        highlighter.close()
+        root.destroy()
+
+
+def long_code_answer(rng, blocks=100):
+    """About 200 KB of prose and fenced Python, like a very long model answer"""
+    parts = []
+    for i in range(blocks):
+        parts.append(" ".join(rng.choice(_FILLER) for _ in range(200)))
+        lines = [f"def step_{i}_{j}(value):\n    # keep {j} digits\n    return round(value * {j}.5, {j})"
+                 for j in range(10)]
+        parts.append("```python\n" + "\n".join(lines) + "\n```")
+    return "\n\n".join(parts)
+
+
+def _contention_writer(path, writer, turns, interval, keep_turns):
+    # Small thresholds make every writer compact and rotate many times
+    journal = HistoryJournal(path, durability="batch", compact_threshold=16 * 1024,
+                             archive=HistoryArchive(path + ".archive"), keep_turns=keep_turns)
+    rng = random.Random(SEED + writer)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(turns):
+        answer = "answer " * rng.randint(5, 60)
+        began = time.perf_counter()
+        journal.append(f"writer {writer} turn {i}", answer)
+        latencies.append(time.perf_counter() - began)
+        time.sleep(rng.uniform(0, 2 * interval))
+    elapsed = time.perf_counter() - start
+    journal.wait_for_compaction()
+    journal.close()
+    return latencies, elapsed
+
+
+def bench_contention(results, writers=CONTENTION_WRITERS, turns=CONTENTION_TURNS, interval=0.002):
+    """Several processes appending to, compacting and rotating one shared journal"""
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        with context.Pool(writers) as pool:
+            runs = pool.starmap(_contention_writer,
+                                [(path, writer, turns, interval, 200) for writer in range(writers)])
+        journal = HistoryJournal(path, archive=HistoryArchive(path + ".archive"))
+        seen = Counter(question for question, _ in journal.iter_all())
+        journal.close()
+    expected = {f"writer {writer} turn {i}" for writer in range(writers) for i in range(turns)}
+    latencies = sorted(latency for run_latencies, _ in runs for latency in run_latencies)
+    results.add("contention.lost_records", len(expected - set(seen)), "records")
+    results.add("contention.duplicated_records", sum(count - 1 for count in seen.values()), "records")
+    results.add("contention.append_p95", latencies[int(len(latencies) * 0.95)] * 1000, "ms")
+    results.add("contention.appends_per_second", len(expected) / max(elapsed for _, elapsed in runs),
+                "appends/s", "higher")
+
+
+# Comparison
+
+def compare_results(baseline, current, tolerance=0.2):
+    """Return [(name, old, new, change)] for metrics that got worse by more than tolerance"""
+    regressions = []
+    for name, metric in current["metrics"].items():
+        old = baseline.get("metrics", {}).get(name)
+        if old is None:
+            continue
+        if not old["value"]:
+            # No relative change from zero; any lost record is a regression
+            change = float("inf") if metric["value"] > 0 else 0.0
+            worse = metric["better"] == "lower" and metric["value"] > 0
+        else:
+            change = (metric["value"] - old["value"]) / old["value"]
+            worse = change > tolerance if metric["better"] == "lower" else change < -tolerance
+        if worse:
+            regressions.append((name, old["value"], metric["value"], change))
+    return regressions
+
+
+def run(sections, quick=False, per_rule=200):
+    results = Results()
+    history_sizes = QUICK_HISTORY_SIZES if quick else HISTORY_SIZES
+    render_sizes = QUICK_RENDER_SIZES if quick else RENDER_SIZES
+    if "throughput" in sections:
+        print("Response throughput:")
+        bench_throughput(results, per_rule)
+    if "history" in sections:
+        print("History I/O:")
+        bench_history(results, history_sizes)
+        bench_history_size(results, history_sizes)
+        bench_sqlite_history(results, history_sizes)
+    if "cold_start" in sections:
+        print("Cold start:")
+        bench_cold_start(results, history_sizes)
+    if "render" in sections:
+        print("GUI rendering:")
+        bench_render(results, render_sizes)
+    if "contention" in sections:
+        print("History contention:")
+        bench_contention(results, turns=QUICK_CONTENTION_TURNS if quick else CONTENTION_TURNS)
+    return {
+        "meta": {
+            "seed": SEED,
+            "quick": quick,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "metrics": results.metrics,
+    }
+
+
+SECTIONS = ("throughput", "history", "cold_start", "render", "contention")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Friendly Code Chatbot benchmarks")
+    parser.add_argument("--output", "-o", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier results file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown before --compare fails (default: 0.2)")
+    parser.add_argument("--only", action="append", choices=SECTIONS, help="run only these sections")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast local check")
+    args = parser.parse_args(argv)
+
+    current = run(args.only or SECTIONS, quick=args.quick)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, current, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.4f} -> {new:.4f} ({change:+.0%})")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,653 @@
+#  Tk widgets for the chat transcript
+#  Only imported by run_gui(), so headless modes never load tkinter.
+
+import itertools
+import time
+import tkinter as tk
+import tkinter.font as tkfont
+from concurrent.futures import Future
+
+from code_highlight import code_spans
+
+# The classic transcript inserts message text INSERT_CHUNK characters at a
+# time from idle callbacks, and hands control back to Tk once FRAME_BUDGET
+# seconds of inserting have passed, so input and repaints are never held up
+# by a long answer
+INSERT_CHUNK = 2000
+FRAME_BUDGET = 0.008
+
+# Bubble look per sender: colors, font, left indent and gap below the bubble
+BUBBLE_STYLES = {
+    "User": {"bg": "#4A90E2", "fg": "#fff", "font": ("Segoe UI", 10, "bold"), "indent": 5, "gap": 4},
+    "Bot": {"bg": "#444", "fg": "#fff", "font": ("Consolas", 10), "indent": 30, "gap": 8},
+}
+
+# Every themed color lives here. "roles" are widget options per kind of
+# widget, "tags" style the classic transcript per sender, "bubbles" the
+# bubble view.
+THEMES = {
+    "dark": {
+        "roles": {
+            "window": {"bg": "#2E2E2E"},
+            "text": {"bg": "#1E1E1E", "fg": "#FFFFFF", "insertbackground": "#FFFFFF"},
+            "input": {"bg": "#333333", "fg": "#FFFFFF", "insertbackground": "#FFFFFF"},
+        },
+        "tags": {
+            "User": {"foreground": "#7FB2EE"}, "Bot": {"foreground": "#FFFFFF"},
+            "code": {"background": "#2A2A2A"},
+            "code_keyword": {"foreground": "#569CD6"}, "code_builtin": {"foreground": "#4EC9B0"},
+            "code_string": {"foreground": "#CE9178"}, "code_comment": {"foreground": "#6A9955"},
+            "code_number": {"foreground": "#B5CEA8"},
+        },
+        "bubbles": BUBBLE_STYLES,
+    },
+    "light": {
+        "roles": {
+            "window": {"bg": "#F2F2F2"},
+            "text": {"bg": "#FFFFFF", "fg": "#000000", "insertbackground": "#000000"},
+            "input": {"bg": "#FFFFFF", "fg": "#000000", "insertbackground": "#000000"},
+        },
+        "tags": {
+            "User": {"foreground": "#1F5FAF"}, "Bot": {"foreground": "#000000"},
+            "code": {"background": "#F3F3F3"},
+            "code_keyword": {"foreground": "#0000FF"}, "code_builtin": {"foreground": "#267F99"},
+            "code_string": {"foreground": "#A31515"}, "code_comment": {"foreground": "#008000"},
+            "code_number": {"foreground": "#098658"},
+        },
+        "bubbles": {
+            "User": dict(BUBBLE_STYLES["User"], bg="#A3C8F2", fg="#000"),
+            "Bot": dict(BUBBLE_STYLES["Bot"], bg="#E0E0E0", fg="#000"),
+        },
+    },
+}
+
+
+class StyleRegistry:
+    """Applies the current theme to registered widgets.
+
+    Widgets register once with a role; a theme switch reconfigures each of
+    them once. Transcript messages are styled through Text tags and bubbles
+    through the pooled labels, so the cost does not grow with the history,
+    and messages added later pick up the current theme by themselves.
+    """
+
+    def __init__(self, themes=None, theme="dark"):
+        self.themes = themes or THEMES
+        self.theme_name = theme
+        self._widgets = []
+
+    @property
+    def theme(self):
+        return self.themes[self.theme_name]
+
+    def register(self, widget, role):
+        """role is a key of theme["roles"], "tags" for a Text transcript or "bubbles" """
+        self._widgets.append((widget, role))
+        self._apply_to(widget, role)
+        return widget
+
+    def apply(self, name):
+        self.theme_name = name
+        for widget, role in self._widgets:
+            self._apply_to(widget, role)
+
+    def _apply_to(self, widget, role):
+        theme = self.theme
+        if role == "tags":
+            for tag, options in theme["tags"].items():
+                widget.tag_configure(tag, **options)
+        elif role == "bubbles":
+            widget.set_styles(theme["bubbles"], bg=theme["roles"]["window"]["bg"])
+        else:
+            widget.config(**theme["roles"][role])
+
+
+class _HeightIndex:
+    """Fenwick tree over message heights: prefix sums and offset lookups in O(log n)"""
+
+    def __init__(self):
+        self._values = []
+        self._tree = [0]
+
+    def __len__(self):
+        return len(self._values)
+
+    def append(self, value):
+        # Node i covers (i - lowbit(i), i], so its sum can be built from prefixes
+        i = len(self._values) + 1
+        self._values.append(value)
+        self._tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def set(self, index, value):
+        delta = value - self._values[index]
+        if not delta:
+            return
+        self._values[index] = value
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def get(self, index):
+        return self._values[index]
+
+    def prefix(self, index):
+        """Sum of the first index heights, i.e. the y offset of message index"""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def total(self):
+        return self.prefix(len(self._values))
+
+    def find(self, y):
+        """Index of the message covering offset y"""
+        index, remaining = 0, y
+        step = 1 << len(self._tree).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= remaining:
+                index = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return min(index, max(len(self._values) - 1, 0))
+
+    def clear(self):
+        self._values = []
+        self._tree = [0]
+
+
+class VirtualBubbleList(tk.Frame):
+    """Scrollable chat bubbles that only creates widgets for what is on screen.
+
+    Messages are plain data; Labels come from a small pool and are bound to
+    whichever messages are visible. Heights start as estimates and are
+    replaced by measured values (cached per width) once a bubble is shown.
+    """
+
+    OVERSCAN = 200  # pixels rendered above and below the viewport
+    MARGIN = 20
+
+    def __init__(self, master, bg, styles=None):
+        super().__init__(master, bg=bg)
+        self.styles = dict(styles or BUBBLE_STYLES)
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self._messages = []       # [sender, text], or None once removed
+        self._heights = _HeightIndex()
+        self._measured = {}       # index -> width its height was measured at
+        self._active = {}         # index -> (label, canvas window id)
+        self._pool = []
+        self._width = 1
+        self._render_pending = False
+        self._metrics = {}
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        self._bind_wheel(self.canvas)
+
+    # Public API
+
+    def set_messages(self, messages):
+        """Replace the content with [(sender, text), ...]; no widgets are created here"""
+        self._release_all()
+        self._messages = [[sender, text] for sender, text in messages]
+        self._heights.clear()
+        self._measured.clear()
+        for sender, text in self._messages:
+            self._heights.append(self._estimate(sender, text))
+        self._update_scrollregion()
+        self.scroll_to_end()
+
+    def append(self, sender, text):
+        """Add a message at the bottom and return its index"""
+        follow = self._at_bottom()
+        self._messages.append([sender, text])
+        self._heights.append(self._estimate(sender, text))
+        self._update_scrollregion()
+        if follow:
+            self.scroll_to_end()
+        else:
+            self._schedule_render()
+        return len(self._messages) - 1
+
+    def update_message(self, index, text):
+        message = self._messages[index]
+        if message is None:
+            return
+        follow = self._at_bottom()
+        message[1] = text
+        self._measured.pop(index, None)
+        self._heights.set(index, self._estimate(message[0], text))
+        active = self._active.get(index)
+        if active is not None:
+            active[0].config(text=text)
+        self._update_scrollregion()
+        if follow:
+            self.scroll_to_end()
+        else:
+            self._schedule_render()
+
+    def remove(self, index):
+        """Drop a message; its slot keeps zero height so later indexes stay valid"""
+        if self._messages[index] is None:
+            return
+        self._messages[index] = None
+        self._heights.set(index, 0)
+        self._release(index)
+        self._update_scrollregion()
+        self._schedule_render()
+
+    def clear(self):
+        self.set_messages([])
+
+    def last_text(self, sender):
+        for message in reversed(self._messages):
+            if message is not None and message[0] == sender:
+                return message[1]
+        return None
+
+    def __len__(self):
+        return len(self._messages)
+
+    def scroll_to_end(self):
+        self.canvas.yview_moveto(1.0)
+        self._schedule_render()
+
+    def set_styles(self, styles, bg=None):
+        """Restyle the view; only the pooled widgets need reconfiguring"""
+        self.styles = dict(styles)
+        if bg is not None:
+            self.config(bg=bg)
+            self.canvas.config(bg=bg)
+        for index, (label, _) in self._active.items():
+            self._style_label(label, self._messages[index][0])
+
+    # Layout
+
+    def _font_metrics(self, sender):
+        font = self.styles[sender]["font"]
+        metrics = self._metrics.get(font)
+        if metrics is None:
+            tk_font = tkfont.Font(root=self, font=font)
+            metrics = self._metrics[font] = (max(tk_font.measure("0"), 1), tk_font.metrics("linespace"))
+        return metrics
+
+    def _wrap_width(self, sender):
+        return max(self._width - self.styles[sender]["indent"] - self.MARGIN, 50)
+
+    def _estimate(self, sender, text):
+        char_width, line_height = self._font_metrics(sender)
+        per_line = max(self._wrap_width(sender) // char_width, 1)
+        lines = sum(len(line) // per_line + 1 for line in text.split("\n"))
+        return lines * line_height + 10 + self.styles[sender]["gap"]
+
+    def _update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, self._width, max(self._heights.total(), 1)))
+
+    def _at_bottom(self):
+        return self.canvas.yview()[1] >= 0.999
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._render_pending = False
+        if not self._messages:
+            return
+        top = self.canvas.canvasy(0) - self.OVERSCAN
+        bottom = self.canvas.canvasy(0) + self.canvas.winfo_height() + self.OVERSCAN
+        follow = self._at_bottom()
+        visible = set()
+        changed = False
+        index = self._heights.find(max(top, 0))
+        y = self._heights.prefix(index)
+        while index < len(self._messages) and y < bottom:
+            if self._messages[index] is not None:
+                visible.add(index)
+                changed |= self._show(index, y)
+            y = self._heights.prefix(index + 1)
+            index += 1
+        for index in list(self._active):
+            if index not in visible:
+                self._release(index)
+        if changed:
+            # Measured heights replaced estimates: fix positions once more
+            self._update_scrollregion()
+            if follow:
+                self.canvas.yview_moveto(1.0)
+            self._schedule_render()
+
+    def _show(self, index, y):
+        """Bind a pooled label to a message; returns True if its height changed"""
+        sender, text = self._messages[index]
+        style = self.styles[sender]
+        active = self._active.get(index)
+        if active is None:
+            label = self._pool.pop() if self._pool else self._new_label()
+            self._style_label(label, sender)
+            label.config(text=text)
+            window = self.canvas.create_window(style["indent"], y, window=label, anchor="nw")
+            active = self._active[index] = (label, window)
+        label, window = active
+        wrap = self._wrap_width(sender)
+        label.config(wraplength=wrap - 20)
+        self.canvas.coords(window, style["indent"], y)
+        self.canvas.itemconfigure(window, width=wrap)
+        if self._measured.get(index) == self._width:
+            return False
+        self._measured[index] = self._width
+        height = label.winfo_reqheight() + style["gap"]
+        if height != self._heights.get(index):
+            self._heights.set(index, height)
+            return True
+        return False
+
+    def _new_label(self):
+        label = tk.Label(self.canvas, anchor="w", justify="left", padx=10, pady=5)
+        self._bind_wheel(label)
+        return label
+
+    def _style_label(self, label, sender):
+        style = self.styles[sender]
+        label.config(bg=style["bg"], fg=style["fg"], font=style["font"])
+
+    def _release(self, index):
+        active = self._active.pop(index, None)
+        if active is not None:
+            label, window = active
+            self.canvas.delete(window)
+            self._pool.append(label)
+
+    def _release_all(self):
+        for index in list(self._active):
+            self._release(index)
+
+    # Events
+
+    def _on_configure(self, event):
+        if event.width == self._width:
+            self._schedule_render()
+            return
+        self._width = event.width
+        # Measurements belong to the old width: fall back to estimates
+        self._measured.clear()
+        for index, message in enumerate(self._messages):
+            if message is not None:
+                self._heights.set(index, self._estimate(*message))
+        self._update_scrollregion()
+        self._schedule_render()
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self._schedule_render()
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", lambda e: self._scroll_units(-3))
+        widget.bind("<Button-5>", lambda e: self._scroll_units(3))
+
+    def _on_wheel(self, event):
+        self._scroll_units(-1 if event.delta > 0 else 1)
+
+    def _scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self._schedule_render()
+
+
+def _slices(text, tags, chunk):
+    for start in range(0, len(text), chunk):
+        yield text[start:start + chunk], tags
+
+
+def message_pieces(sender, message, highlighter=None, chunk=INSERT_CHUNK):
+    """Yield the (text, tags) pieces that make up a message, at most chunk characters each.
+
+    Nothing happens until the first piece is asked for; then every code
+    block is handed to highlighter (code_highlight.Highlighter) to be
+    tokenized on its thread. When a block's tokens are not ready yet the
+    block's Future is yielded instead of a piece, until it is done.
+    """
+    blocks = []
+    for start, end, language in code_spans(message):
+        future = highlighter.submit(message[start:end], language) if highlighter else None
+        blocks.append((start, end, future))
+    plain, code = (sender,), (sender, "code")
+    position = 0
+    for start, end, future in blocks:
+        yield from _slices(message[position:start], plain, chunk)
+        tokens = ()
+        if future is not None:
+            while not future.done():
+                yield future
+            tokens = future.result()
+        offset = start
+        for token_start, token_end, kind in tokens:
+            yield from _slices(message[offset:start + token_start], code, chunk)
+            yield from _slices(message[start + token_start:start + token_end], code + ("code_" + kind,), chunk)
+            offset = start + token_end
+        yield from _slices(message[offset:end], code, chunk)
+        position = end
+    yield from _slices(message[position:], plain, chunk)
+
+
+class ClassicTranscript:
+    """Per-message index over the classic Text widget.
+
+    Every message gets a start mark and a node in a doubly linked list, so
+    replacing, deleting or copying one message never scans the transcript.
+    Marks keep Tk's default right gravity, so each one is set after its own
+    text is inserted and text inserted at a message boundary moves the
+    following message's mark along with it.
+
+    A message is laid down as "Sender: " and a newline straight away; its
+    text follows in chunks from idle callbacks (see message_pieces), newest
+    message first. Each chunk goes in just before the message's newline, so
+    messages fill in independently and the transcript is complete once
+    pending reaches 0.
+    """
+
+    def __init__(self, text, highlighter=None, chunk=INSERT_CHUNK, budget=FRAME_BUDGET):
+        self.text = text
+        self.highlighter = highlighter
+        self.chunk = chunk
+        self.budget = budget
+        self._messages = {}   # id -> [sender, text, prev id, next id]
+        self._first = None
+        self._last = None
+        self._next_id = 0
+        self._pending = {}    # id -> pieces still to insert, oldest message first
+        self._pump_scheduled = False
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, msg_id):
+        return msg_id in self._messages
+
+    @property
+    def pending(self):
+        """Number of messages whose text is not fully inserted yet"""
+        return len(self._pending)
+
+    def _mark(self, msg_id):
+        return f"msg{msg_id}"
+
+    def _end(self, msg_id):
+        following = self._messages[msg_id][3]
+        return self._mark(following) if following is not None else "end-1c"
+
+    def append(self, sender, message):
+        """Add a message at the bottom and return its id"""
+        self.text.config(state='normal')
+        msg_id = self._append(sender, message)
+        self.text.config(state='disabled')
+        self.text.see("end")
+        return msg_id
+
+    def _append(self, sender, message):
+        msg_id = self._next_id
+        self._next_id += 1
+        self._messages[msg_id] = [sender, message, self._last, None]
+        if self._last is not None:
+            self._messages[self._last][3] = msg_id
+        else:
+            self._first = msg_id
+        self._last = msg_id
+        start = self.text.index("end-1c")
+        self.text.insert("end", f"{sender}: \n", sender)
+        self.text.mark_set(self._mark(msg_id), start)
+        self._queue(msg_id)
+        return msg_id
+
+    def _queue(self, msg_id):
+        sender, message = self._messages[msg_id][:2]
+        # Re-queued messages move to the end, where the pump starts
+        self._pending.pop(msg_id, None)
+        self._pending[msg_id] = message_pieces(sender, message, self.highlighter, self.chunk)
+        self._schedule_pump()
+
+    def replace(self, msg_id, message):
+        record = self._messages[msg_id]
+        record[1] = message
+        self.text.config(state='normal')
+        start = self.text.index(self._mark(msg_id))
+        self.text.delete(start, self._end(msg_id))
+        self.text.insert(start, f"{record[0]}: \n", record[0])
+        # The insert pushed this message's own mark past the new text
+        self.text.mark_set(self._mark(msg_id), start)
+        self.text.config(state='disabled')
+        self._queue(msg_id)
+
+    def extend(self, msg_id, suffix):
+        """Add suffix to the end of a message as plain text (a streamed answer growing).
+
+        Nothing already shown is touched; replace() the message once it is
+        complete to get its code highlighted.
+        """
+        record = self._messages[msg_id]
+        record[1] += suffix
+        pieces = _slices(suffix, (record[0],), self.chunk)
+        if msg_id in self._pending:
+            # Still filling in: the suffix goes after what is queued
+            pieces = itertools.chain(self._pending[msg_id], pieces)
+        self._pending[msg_id] = pieces
+        self._schedule_pump()
+
+    def remove(self, msg_id):
+        sender, _, prev_id, next_id = self._messages[msg_id]
+        self._pending.pop(msg_id, None)
+        self.text.config(state='normal')
+        self.text.delete(self._mark(msg_id), self._end(msg_id))
+        self.text.config(state='disabled')
+        self.text.mark_unset(self._mark(msg_id))
+        del self._messages[msg_id]
+        if prev_id is not None:
+            self._messages[prev_id][3] = next_id
+        else:
+            self._first = next_id
+        if next_id is not None:
+            self._messages[next_id][2] = prev_id
+        else:
+            self._last = prev_id
+
+    def message(self, msg_id):
+        """Full text of a message, without the "Sender: " prefix"""
+        return self._messages[msg_id][1]
+
+    def last_id(self, sender=None):
+        msg_id = self._last
+        while msg_id is not None and sender is not None and self._messages[msg_id][0] != sender:
+            msg_id = self._messages[msg_id][2]
+        return msg_id
+
+    def clear(self):
+        self._pending.clear()
+        self.text.config(state='normal')
+        self.text.delete("1.0", "end")
+        self.text.config(state='disabled')
+        for msg_id in self._messages:
+            self.text.mark_unset(self._mark(msg_id))
+        self._messages.clear()
+        self._first = self._last = None
+
+    def set_messages(self, messages):
+        """Replace the content with [(sender, text), ...]"""
+        self.clear()
+        self.text.config(state='normal')
+        for sender, message in messages:
+            self._append(sender, message)
+        self.text.config(state='disabled')
+        self.text.see("end")
+
+    # Chunked insertion
+
+    def _schedule_pump(self, delay=None):
+        if self._pump_scheduled:
+            return
+        self._pump_scheduled = True
+        if delay is None:
+            self.text.after_idle(self._pump)
+        else:
+            self.text.after(delay, self._pump)
+
+    def _pump(self):
+        self._pump_scheduled = False
+        if self._pending:
+            waiting = self._insert(time.perf_counter() + self.budget)
+            if self._pending:
+                # Out of time (None): let Tk repaint and handle input first.
+                # Only waiting for the highlighter: check back a frame later
+                self._schedule_pump(1 if waiting is None else 16)
+
+    def flush(self):
+        """Insert everything that is still pending, waiting for the highlighter if needed"""
+        while self._pending:
+            for future in self._insert(None, wait=True):
+                future.result()
+
+    def _insert(self, deadline, wait=False):
+        # Insert pieces, newest message first, until deadline. Returns None
+        # when the deadline passed, else the highlighter Futures that held up
+        # messages (with wait, as soon as there is one)
+        follow = self.text.yview()[1] >= 0.999
+        waiting = []
+        self.text.config(state='normal')
+        try:
+            for msg_id in reversed(list(self._pending)):
+                pieces = self._pending[msg_id]
+                while True:
+                    args, size, blocked, finished = [], 0, None, True
+                    for piece in pieces:
+                        if isinstance(piece, Future):
+                            blocked, finished = piece, False
+                            break
+                        args += piece
+                        size += len(piece[0])
+                        if size >= self.chunk:
+                            finished = False
+                            break
+                    if args:
+                        self.text.insert(f"{self._end(msg_id)}-1c", *args)
+                    if finished:
+                        del self._pending[msg_id]
+                        break
+                    if blocked is not None:
+                        waiting.append(blocked)
+                        break
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return None
+                if wait and waiting:
+                    return waiting
+        finally:
+            self.text.config(state='disabled')
+            if follow:
+                self.text.see("end")
+        return waiting
@@ -0,0 +1,209 @@
+#  Code block detection and syntax highlighting for the chat transcript
+#  code_spans() finds the fenced (``` / ~~~) and indented code blocks of an
+#  answer, tokenize() splits a block into highlight tokens with one regular
+#  expression per language family. Highlighter runs tokenize() on a worker
+#  thread and remembers the tokens of every snippet, so an answer that is
+#  shown again (history refresh, streaming model output) is not tokenized twice.
+#  No Tk here: chat_views turns the tokens into Text tags.
+
+import builtins
+import hashlib
+import keyword
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w+#-]*)[^\n]*$")
+
+# Token kinds; chat_views styles them as Text tags named "code_<kind>"
+KEYWORD = "keyword"
+BUILTIN = "builtin"
+STRING = "string"
+COMMENT = "comment"
+NUMBER = "number"
+
+CACHE_SIZE = 256
+
+_NUMBER = r"\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\b"
+_QUOTED = r"\"(?:[^\"\\\n]|\\.)*\"?|'(?:[^'\\\n]|\\.)*'?"
+
+_FAMILIES = {
+    "python": (
+        r"(?P<comment>#[^\n]*)"
+        r"|(?P<string>[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?(?:\"\"\"|$)|'''[\s\S]*?(?:'''|$)|" + _QUOTED + "))"
+        r"|(?P<number>" + _NUMBER + r")|(?P<word>[A-Za-z_]\w*)",
+        set(keyword.kwlist) | {"match", "case"},
+        {name for name in dir(builtins) if not name.startswith("_")} | {"self", "cls"},
+    ),
+    "c": (
+        r"(?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|$))"
+        r"|(?P<string>`(?:[^`\\]|\\.)*`?|" + _QUOTED + ")"
+        r"|(?P<number>" + _NUMBER + r")|(?P<word>[A-Za-z_$][\w$]*)",
+        set("""
+            async await break case catch class const continue default delete do else enum export
+            extends false finally for function if import in instanceof interface let new null of
+            return static super switch this throw true try typeof undefined var void while yield
+            public private protected abstract final implements package boolean char double float
+            int long short byte struct unsigned signed sizeof include define namespace template
+            typename using type readonly
+        """.split()),
+        set("""
+            console document window Math JSON Object Array String Number Promise Map Set Date
+            Error parseInt parseFloat setTimeout setInterval fetch require module exports
+            System printf scanf malloc free std cout cin endl
+        """.split()),
+    ),
+    "shell": (
+        r"(?P<comment>(?<![\w$])#[^\n]*)|(?P<string>" + _QUOTED + ")"
+        r"|(?P<number>" + _NUMBER + r")|(?P<word>[A-Za-z_][\w-]*)",
+        set("if then else elif fi for while until do done case esac in function return export local".split()),
+        set("echo cd ls cat grep sed awk pip python git npm node sudo mkdir rm cp mv chmod source".split()),
+    ),
+    "sql": (
+        r"(?P<comment>--[^\n]*|/\*[\s\S]*?(?:\*/|$))|(?P<string>" + _QUOTED + ")"
+        r"|(?P<number>" + _NUMBER + r")|(?P<word>[A-Za-z_]\w*)",
+        set("""
+            select from where insert into values update set delete create table drop alter index
+            join left right inner outer on group by order having limit and or not null as primary
+            key foreign references distinct union all like in is between
+        """.split()),
+        set("count sum avg min max coalesce now".split()),
+    ),
+    "html": (
+        r"(?P<comment><!--[\s\S]*?(?:-->|$))|(?P<string>" + _QUOTED + ")"
+        r"|(?P<keyword></?[A-Za-z][\w-]*|/?>)",
+        set(),
+        set(),
+    ),
+}
+_FAMILIES = {name: (re.compile(pattern), keywords, names) for name, (pattern, keywords, names) in _FAMILIES.items()}
+
+_LANGUAGES = {
+    "python": "python", "py": "python", "python3": "python",
+    "javascript": "c", "js": "c", "typescript": "c", "ts": "c", "java": "c", "c": "c",
+    "cpp": "c", "c++": "c", "cs": "c", "csharp": "c", "css": "c", "json": "c", "go": "c",
+    "bash": "shell", "sh": "shell", "shell": "shell", "zsh": "shell", "console": "shell",
+    "sql": "sql", "html": "html", "xml": "html",
+}
+
+
+def code_spans(text):
+    """[(start, end, language)] character ranges of the code block bodies of text"""
+    lines = []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        content = (line.splitlines() or [""])[0]
+        lines.append((offset, content))
+        offset += len(line)
+    spans = []
+    i = 0
+    previous_blank = True
+    while i < len(lines):
+        start, line = lines[i]
+        fence = FENCE_RE.match(line)
+        if fence:
+            marker, language = fence.group(1), fence.group(2).lower()
+            i += 1
+            first = i
+            # The closing fence uses the same character, at least as long
+            while i < len(lines) and not (lines[i][1].strip().startswith(marker)
+                                          and set(lines[i][1].strip()) == {marker[0]}):
+                i += 1
+            if i > first:
+                spans.append((lines[first][0], lines[i - 1][0] + len(lines[i - 1][1]), language))
+            i += 1
+            previous_blank = True
+            continue
+        if previous_blank and (line.startswith("    ") or line.startswith("\t")) and line.strip():
+            first = i
+            while i < len(lines) and (not lines[i][1].strip() or lines[i][1].startswith(("    ", "\t"))):
+                i += 1
+            spans.append((start, lines[i - 1][0] + len(lines[i - 1][1]), ""))
+            previous_blank = False
+            continue
+        previous_blank = not line.strip()
+        i += 1
+    return spans
+
+
+def guess_language(code):
+    """Language family for a block without a language name"""
+    if re.search(r"^\s*(def|class|import|from)\s|^\s*print\(|:\s*$", code, re.M):
+        return "python"
+    if re.search(r"^\s*<[A-Za-z!]", code):
+        return "html"
+    if re.search(r"\b(function|const|let|var)\b|=>|;\s*$|[{}]\s*$", code, re.M):
+        return "c"
+    if re.search(r"^\s*(\$ |pip |git |npm |cd |ls |echo )", code, re.M):
+        return "shell"
+    return "python"
+
+
+def tokenize(code, language=""):
+    """[(start, end, kind)] highlight tokens of code; plain text gets no token"""
+    family = _LANGUAGES.get(language.lower()) or guess_language(code)
+    pattern, keywords, names = _FAMILIES[family]
+    fold = family == "sql"
+    tokens = []
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        if kind == "word":
+            word = match.group().lower() if fold else match.group()
+            if word in keywords:
+                kind = KEYWORD
+            elif word in names:
+                kind = BUILTIN
+            else:
+                continue
+        tokens.append((match.start(), match.end(), kind))
+    return tokens
+
+
+class Highlighter:
+    """Tokenizes snippets on a worker thread and keeps the last CACHE_SIZE results"""
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # (language, sha1 of code) -> tokens
+        self._running = {}            # same key -> Future of a tokenization in progress
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _key(self, code, language):
+        return language, hashlib.sha1(code.encode("utf-8")).digest()
+
+    def submit(self, code, language=""):
+        """Future of the tokens of code; already done when they are cached"""
+        key = self._key(code, language)
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(tokens)
+                return future
+            future = self._running.get(key)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(1, thread_name_prefix="highlight")
+                future = self._running[key] = self._executor.submit(self._tokenize, key, code, language)
+            return future
+
+    def _tokenize(self, key, code, language):
+        try:
+            tokens = tokenize(code, language)
+        except Exception as e:
+            print("Error highlighting code:", e)
+            tokens = []
+        with self._lock:
+            self._running.pop(key, None)
+            self._cache[key] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
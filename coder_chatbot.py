@@ -1,500 +1,543 @@
 #  bash: python coder_chatbot.py
 #  Friendly and human-like chatbot for code questions - INSTANT RESPONSE VERSION
-# No AI model loading - only smart response system
+# Rules answer instantly; an optional local model (--model) loads in the background
 
-import tkinter as tk
-from tkinter import messagebox
+# tkinter is imported inside run_gui() so the headless modes never load it
 import json
+import argparse
+import atexit
 import os
+import sys
 import threading
+from collections import deque
 import time
 import re
 
-# Try to import pyperclip for clipboard support
-try:
-    import pyperclip
-    _pyperclip_available = True
-except ImportError:
-    _pyperclip_available = False
+from history_store import HistoryArchive, HistoryJournal, search_turns
+from knowledge_pack import KnowledgePack, KnowledgePackError
+from metrics import DISABLED as METRICS_DISABLED
+from response_cache import ResponseCache
+
+# Optional modules are imported on first use to keep start-up fast
+_pyperclip = None
+
+def _get_pyperclip():
+    """Return the pyperclip module for clipboard support, or None if it is not installed"""
+    global _pyperclip
+    if _pyperclip is None:
+        try:
+            import pyperclip
+            _pyperclip = pyperclip
+        except ImportError:
+            _pyperclip = False
+    return _pyperclip or None
+
+# History is an append-only journal; an old chat_history.json is imported once if present
+HISTORY_FILE = "chat_history.jsonl"
+
+# The GUI starts with the most recent turns and pages older ones in on demand
+HISTORY_PAGE_SIZE = 200
+
+# Turns kept in memory by long-running modes; older ones live in compressed
+# archive segments next to the journal (chat_history.archive/)
+HISTORY_WINDOW = 1000
+
+# "journal": chat_history.jsonl; "sqlite": chat_history.db with a full-text
+# index (sqlite_history.py), which imports the journal the first time
+HISTORY_BACKENDS = ("journal", "sqlite")
+
+# Saved turns listed per history search
+SEARCH_LIMIT = 20
+
+# BM25 fallback when no rule matches: answer above RETRIEVAL_MIN_SCORE,
+# otherwise list topics above SUGGESTION_MIN_SCORE under the default answer
+RETRIEVAL_MIN_SCORE = 3.0
+SUGGESTION_MIN_SCORE = 1.5
+# Conversational rules are never offered as retrieval results
+NOT_SEARCHABLE = ("default", "short_message", "greeting")
+# Answers every pack must have, checked before a reloaded pack goes live
+REQUIRED_ANSWERS = ("default", "short_message")
+
+# Seconds between checks of knowledge/ for edited rules and answers
+RELOAD_INTERVAL = 1.0
+
+# rule_id reported for answers written by the optional local model
+MODEL_RULE = "model"
+
+THINKING_MESSAGE = "🤖 Thinking..."
 
 # Daily tip (in English)
 DAILY_TIP = "💡 Tip: Use f-strings in Python instead of concatenation to improve readability!"
 
 class FriendlyCodeChatbot:
-    def __init__(self):
-        self.history = []
-        self.history_file = "chat_history.json"
-        self.load_history()
+    def __init__(self, history_file=HISTORY_FILE, durability="batch",
+                 cache_size=256, cache_ttl=None, cache_file=None,
+                 history_limit=None, defer_history=False, metrics=None, model=None,
+                 history_window=None, archive_compression="gzip", history_backend="journal"):
+        if history_backend not in HISTORY_BACKENDS:
+            raise ValueError(f"Unknown history backend {history_backend!r}")
+        # history_window bounds self.history (a deque then) and rotates older
+        # turns out of the journal into compressed archive segments
+        self.history_window = history_window
+        # The GUI's history writer thread changes self.history while the Tk thread
+        # reads it: both go through this lock, and readers loop over history_snapshot()
+        self._history_lock = threading.RLock()
+        self.history = self._new_history([])
+        self.history_file = history_file
+        # history_limit keeps only the newest turns in memory at start-up
+        self.history_limit = history_limit
+        self._history_cursor = None
+        self.journal = None
+        # Loaded before the history: both backends store its answers as references
+        self.pack = KnowledgePack.load()
+        # history_file=None keeps the history in memory only (batch workers)
+        if history_file and history_backend == "sqlite":
+            from sqlite_history import SqliteHistory
+            base = os.path.splitext(history_file)[0]
+            # Same interface as the journal; a long history needs no archive rotation here
+            self.journal = SqliteHistory(base + ".db", legacy_path=base + ".jsonl",
+                                         durability=durability, answer_source=lambda: self.pack)
+        elif history_file:
+            base = os.path.splitext(history_file)[0]
+            archive = HistoryArchive(base + ".archive", archive_compression) if history_window else None
+            # Knowledge pack answers are journaled as references, not copies
+            self.journal = HistoryJournal(history_file, legacy_path=base + ".json",
+                                          durability=durability, archive=archive,
+                                          keep_turns=history_window,
+                                          answer_source=lambda: self.pack)
+        self.cache = ResponseCache(cache_size, ttl=cache_ttl, path=cache_file)
+        if cache_file:
+            atexit.register(self.save_cache)
+        self.metrics = metrics or METRICS_DISABLED
+        # (pack, index, {rule_id: document key}), built on the first unmatched question
+        # and updated in place when the pack is reloaded
+        self._retriever = None
+        self._retriever_lock = threading.RLock()
+        # Optional model_backend.LazyModel; answers what rules and retrieval cannot
+        self.model = model
+        self._declare_metrics()
+        # defer_history lets the GUI paint first and call load_history() when idle
+        if not defer_history:
+            self.load_history()
+
+    def _new_history(self, turns):
+        if self.history_window:
+            return deque(turns, maxlen=self.history_window)
+        return list(turns)
 
     def load_history(self):
+        self._history_cursor = None
+        limits = [limit for limit in (self.history_limit, self.history_window) if limit]
         try:
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                self.history = json.load(f)
+            if self.journal is None:
+                turns = []
+            elif not limits:
+                turns = self.journal.load()
+            else:
+                turns, self._history_cursor = self.journal.load_tail(min(limits))
         except Exception:
-            self.history = []
+            turns = []
+        with self._history_lock:
+            self.history = self._new_history(turns)
+
+    def history_snapshot(self):
+        """The in-memory history as a list, safe to loop over while turns are being recorded"""
+        with self._history_lock:
+            return list(self.history)
+
+    def iter_history(self):
+        """Stream every saved turn, archived ones included, oldest first"""
+        if self.journal is None:
+            return iter(self.history_snapshot())
+        return self.journal.iter_all()
+
+    def _declare_metrics(self):
+        """Register the gauges; called once, they read self.cache and the counters, not the pack"""
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+        self._declare_rules(self.pack)
+        metrics.gauge("fallback_ratio", self._fallback_ratio)
+        metrics.gauge("cache_hit_ratio", lambda: self.cache.stats()["hit_rate"])
+
+    def _declare_rules(self, pack):
+        # Every rule gets a series up front, so rules that never fire are visible;
+        # declaring a series that exists already leaves its count alone
+        for rule in pack.rules:
+            if not rule.fallthrough:
+                self.metrics.declare("rule_hits_total", rule=rule.rule_id)
+
+    def use_pack(self, pack):
+        """Answer new questions from pack; questions already being answered finish on the old one"""
+        for rule_id in REQUIRED_ANSWERS:
+            if not pack.has_answer(rule_id):
+                raise KnowledgePackError(f"Pack has no answer for {rule_id!r}")
+        # Build (and so validate) the matcher before any question can reach it
+        pack.matcher
+        # _respond() reads self.pack once, so this single assignment is the swap
+        self.pack = pack
+        # Only rules added by the edit need a series; the gauges stay as registered
+        self._declare_rules(pack)
+
+    def _fallback_ratio(self):
+        total = self.metrics.counter("responses_total")
+        return self.metrics.counter("rule_hits_total", rule="default") / total if total else 0.0
+
+    def _history_room(self):
+        if not self.history_window:
+            return None
+        return self.history_window - len(self.history)
+
+    def has_older_history(self):
+        with self._history_lock:
+            return self._history_cursor is not None and self._history_room() != 0
+
+    def load_older_history(self, limit=HISTORY_PAGE_SIZE):
+        """Page older turns in front of the history; returns the turns added"""
+        with self._history_lock:
+            room = self._history_room()
+            newer = len(self.history)
+        if self._history_cursor is None or room == 0:
+            return []
+        if room is not None:
+            limit = min(limit, room)
+        try:
+            older, self._history_cursor = self.journal.load_before(self._history_cursor, limit, newer=newer)
+        except Exception as e:
+            print("Error loading history:", e)
+            return []
+        with self._history_lock:
+            # Turns recorded while the page was read took some of the room; on a
+            # full deque extendleft() would push the newest turns out instead
+            room = self._history_room()
+            if room is not None:
+                older = older[max(len(older) - room, 0):] if room > 0 else []
+                self.history.extendleft(reversed(older))
+            else:
+                self.history[:0] = older
+        return older
 
     def save_history(self):
+        # ask() already appended every turn to the journal. Compacting instead
+        # of rewriting self.history keeps turns other processes appended (and
+        # rotates old turns into the archive when a window is set)
+        if self.journal is None:
+            return
         try:
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.history, f, ensure_ascii=False)
+            with self.metrics.timer("history_write_seconds", op="compact"):
+                self.journal.compact()
         except Exception as e:
             print("Error saving history:", e)
 
-    def get_smart_response(self, user_question):
-        """Enhanced simple response system with comprehensive programming knowledge"""
-        question_lower = user_question.lower()
-        
+    def record(self, turns):
+        """Add (question, answer) turns to the history with one journal write"""
+        with self._history_lock:
+            self.history.extend(turns)
+        if self.journal is None:
+            return
+        try:
+            with self.metrics.timer("history_write_seconds", op="append"):
+                self.journal.extend(turns)
+        except Exception as e:
+            print("Error saving history:", e)
+
+    def clear_history(self):
+        with self._history_lock:
+            self.history.clear()
+            self._history_cursor = None
+        if self.journal is None:
+            return
+        try:
+            with self.metrics.timer("history_write_seconds", op="clear"):
+                self.journal.clear()
+        except Exception as e:
+            print("Error saving history:", e)
+
+    def search_history(self, query, limit=SEARCH_LIMIT, before=None, session=None):
+        """Return (results, cursor) for saved turns containing every word of query.
+
+        Results are dicts (id, time, session, question, answer), newest first;
+        cursor is passed back as before for the next page and is None at the end.
+        """
+        if self.journal is None:
+            return search_turns(self.history_snapshot(), query, limit, before)
+        try:
+            with self.metrics.timer("history_search_seconds"):
+                return self.journal.search(query, limit, before, session)
+        except Exception as e:
+            print("Error searching history:", e)
+            return [], None
+
+    def save_cache(self):
+        try:
+            self.cache.save()
+        except Exception as e:
+            print("Error saving response cache:", e)
+
+    def respond(self, user_question, stream=False):
+        """Return (answer, rule_id) for a question without touching the history.
+
+        With stream=True a model-written answer is returned as an iterator of
+        text pieces instead of a string.
+        """
+        metrics = self.metrics
+        if not metrics.enabled:
+            return self._respond(user_question, stream)
+        start = time.perf_counter()
+        result = self._respond(user_question, stream)
+        metrics.observe("match_seconds", time.perf_counter() - start)
+        metrics.inc("responses_total")
+        metrics.inc("rule_hits_total", rule=result[1])
+        return result
+
+    def explain(self, user_question):
+        """Answer like respond() and report every stage of the decision.
+
+        Returns a JSON-friendly dict: the answering rule, the answer, the
+        total time and one entry per stage tried (short message check, cache,
+        keyword rules with every rule considered, retrieval, model). The
+        cache is reported but never short-circuits the trace, and nothing is
+        added to the history.
+        """
+        trace = {"question": user_question, "stages": []}
+        start = time.perf_counter()
+        trace["answer"], trace["rule"] = self._respond(user_question, trace=trace)
+        trace["seconds"] = time.perf_counter() - start
+        return trace
+
+    def _respond(self, user_question, stream=False, trace=None):
+        pack = self.pack
         # Handle very short or unclear inputs
         if len(user_question.strip()) <= 2:
-            return ("I see you sent a short message! I'm here to help with programming questions. 😊\n\n"
-                   "Try asking me about:\n"
-                   "• Python programming\n"
-                   "• JavaScript and web development\n"
-                   "• HTML/CSS\n"
-                   "• Programming concepts like loops, functions, classes\n"
-                   "• Debugging and problem solving\n"
-                   "• Git and version control\n\n"
-                   "What would you like to learn about?")
-        
-        # Greetings
-        if any(word in question_lower for word in ["hello", "hi", "hey", "greetings"]) and len(question_lower.split()) <= 2:
-            return "Hello! I'm your friendly code chatbot. How can I help you with programming today? 😊"
-        
-        # Python specific
-        if "python" in question_lower:
-            if "list" in question_lower or "array" in question_lower:
-                return ("Python Lists are powerful! Here's a quick example:\n\n"
-                       "```python\n"
-                       "numbers = [1, 2, 3, 4, 5]\n"
-                       "squares = [x**2 for x in numbers]  # List comprehension\n"
-                       "print(squares)  # [1, 4, 9, 16, 25]\n"
-                       "```\n\n"
-                       "Lists are mutable, ordered, and can contain mixed types!")
-            
-            if "dictionary" in question_lower or "dict" in question_lower:
-                return ("Python Dictionaries are key-value stores:\n\n"
-                       "```python\n"
-                       "person = {\n"
-                       "    'name': 'Alice',\n"
-                       "    'age': 30,\n"
-                       "    'city': 'New York'\n"
-                       "}\n"
-                       "print(person['name'])  # Alice\n"
-                       "person['job'] = 'Developer'  # Add new key\n"
-                       "```")
-            
-            if "function" in question_lower or "def" in question_lower:
-                return ("Python Functions are defined with 'def':\n\n"
-                       "```python\n"
-                       "def greet(name, greeting='Hello'):\n"
-                       "    return f'{greeting}, {name}!'\n"
-                       "\n"
-                       "result = greet('World')\n"
-                       "print(result)  # Hello, World!\n"
-                       "```")
-            
-            if "class" in question_lower or "oop" in question_lower:
-                return ("Python Classes and OOP:\n\n"
-                       "```python\n"
-                       "class Person:\n"
-                       "    def __init__(self, name, age):\n"
-                       "        self.name = name\n"
-                       "        self.age = age\n"
-                       "    \n"
-                       "    def greet(self):\n"
-                       "        return f'Hello, I am {self.name}'\n"
-                       "\n"
-                       "person = Person('Alice', 30)\n"
-                       "print(person.greet())  # Hello, I am Alice\n"
-                       "```")
-            
-            return ("Python is amazing! Key concepts:\n\n"
-                   "• **Variables**: `name = 'Python'`\n"
-                   "• **Functions**: `def my_func():`\n"
-                   "• **Lists**: `items = [1, 2, 3]`\n"
-                   "• **Dictionaries**: `data = {'key': 'value'}`\n"
-                   "• **F-strings**: `f'Hello {name}'`\n"
-                   "• **Classes**: `class MyClass:`\n\n"
-                   "What specific Python topic do you want to learn?")
-        
-        # String operations (capital letters, case conversion)
-        if any(word in question_lower for word in ["capital", "uppercase", "lowercase", "case", "letter"]):
-            return ("Python String Case Operations:\n\n"
-                   "```python\n"
-                   "text = 'hello world'\n"
-                   "\n"
-                   "# Convert to uppercase\n"
-                   "upper_text = text.upper()\n"
-                   "print(upper_text)  # HELLO WORLD\n"
-                   "\n"
-                   "# Convert to lowercase\n"
-                   "lower_text = text.lower()\n"
-                   "print(lower_text)  # hello world\n"
-                   "\n"
-                   "# Capitalize first letter\n"
-                   "cap_text = text.capitalize()\n"
-                   "print(cap_text)  # Hello world\n"
-                   "\n"
-                   "# Title case (capitalize each word)\n"
-                   "title_text = text.title()\n"
-                   "print(title_text)  # Hello World\n"
-                   "```")
-        
-        # Mathematical operations (sum, addition)
-        if any(word in question_lower for word in ["sum", "add", "addition", "math", "calculate", "number"]):
-            return ("Python Mathematical Operations:\n\n"
-                   "```python\n"
-                   "# Basic addition\n"
-                   "a = 5\n"
-                   "b = 3\n"
-                   "sum_result = a + b\n"
-                   "print(sum_result)  # 8\n"
-                   "\n"
-                   "# Sum of a list\n"
-                   "numbers = [1, 2, 3, 4, 5]\n"
-                   "total = sum(numbers)\n"
-                   "print(total)  # 15\n"
-                   "\n"
-                   "# Using sum() with range\n"
-                   "range_sum = sum(range(1, 6))  # 1+2+3+4+5\n"
-                   "print(range_sum)  # 15\n"
-                   "\n"
-                   "# Sum with list comprehension\n"
-                   "squares_sum = sum([x**2 for x in range(1, 6)])\n"
-                   "print(squares_sum)  # 55 (1+4+9+16+25)\n"
-                   "```")
-        
-        # JavaScript specific
-        if "javascript" in question_lower or "js" in question_lower:
-            if "function" in question_lower:
-                return ("JavaScript Functions:\n\n"
-                       "```javascript\n"
-                       "// Regular function\n"
-                       "function greet(name) {\n"
-                       "    return `Hello, ${name}!`;\n"
-                       "}\n"
-                       "\n"
-                       "// Arrow function\n"
-                       "const greetArrow = (name) => `Hello, ${name}!`;\n"
-                       "```")
-            
-            if "array" in question_lower:
-                return ("JavaScript Arrays:\n\n"
-                       "```javascript\n"
-                       "const numbers = [1, 2, 3, 4, 5];\n"
-                       "const doubled = numbers.map(x => x * 2);\n"
-                       "const filtered = numbers.filter(x => x > 2);\n"
-                       "console.log(doubled);  // [2, 4, 6, 8, 10]\n"
-                       "```")
-            
-            if "async" in question_lower or "promise" in question_lower:
-                return ("JavaScript Async/Await:\n\n"
-                       "```javascript\n"
-                       "async function fetchData() {\n"
-                       "    try {\n"
-                       "        const response = await fetch('https://api.example.com/data');\n"
-                       "        const data = await response.json();\n"
-                       "        return data;\n"
-                       "    } catch (error) {\n"
-                       "        console.error('Error:', error);\n"
-                       "    }\n"
-                       "}\n"
-                       "```")
-            
-            return ("JavaScript for web development:\n\n"
-                   "• **Variables**: `let`, `const`, `var`\n"
-                   "• **Functions**: Regular and arrow functions\n"
-                   "• **Arrays**: `map()`, `filter()`, `reduce()`\n"
-                   "• **Objects**: Key-value pairs\n"
-                   "• **Template literals**: `` `Hello ${name}` ``\n"
-                   "• **Async/Await**: Promise handling\n\n"
-                   "What JavaScript topic interests you?")
-        
-        # HTML/CSS
-        if "html" in question_lower:
-            return ("HTML Structure:\n\n"
-                   "```html\n"
-                   "<!DOCTYPE html>\n"
-                   "<html>\n"
-                   "<head>\n"
-                   "    <title>My Page</title>\n"
-                   "</head>\n"
-                   "<body>\n"
-                   "    <header>\n"
-                   "        <h1>Welcome</h1>\n"
-                   "    </header>\n"
-                   "    <main>\n"
-                   "        <p>Content here</p>\n"
-                   "    </main>\n"
-                   "</body>\n"
-                   "</html>\n"
-                   "```\n\n"
-                   "Use semantic tags for better accessibility!")
-        
-        if "css" in question_lower:
-            return ("CSS Styling:\n\n"
-                   "```css\n"
-                   ".container {\n"
-                   "    display: flex;\n"
-                   "    justify-content: center;\n"
-                   "    align-items: center;\n"
-                   "    background-color: #f0f0f0;\n"
-                   "    padding: 20px;\n"
-                   "}\n"
-                   "\n"
-                   "/* Responsive design */\n"
-                   "@media (max-width: 768px) {\n"
-                   "    .container {\n"
-                   "        flex-direction: column;\n"
-                   "    }\n"
-                   "}\n"
-                   "```")
-        
-        # General programming concepts
-        if "loop" in question_lower:
-            return ("Loops in different languages:\n\n"
-                   "**Python:**\n"
-                   "```python\n"
-                   "for i in range(5):\n"
-                   "    print(i)\n"
-                   "```\n\n"
-                   "**JavaScript:**\n"
-                   "```javascript\n"
-                   "for (let i = 0; i < 5; i++) {\n"
-                   "    console.log(i);\n"
-                   "}\n"
-                   "```")
-        
-        if "error" in question_lower or "debug" in question_lower:
-            return ("Debugging Tips:\n\n"
-                   "1. **Read the error message** - it tells you what's wrong\n"
-                   "2. **Check line numbers** - errors point to specific lines\n"
-                   "3. **Use print statements** - see what your code is doing\n"
-                   "4. **Break it down** - test small parts separately\n"
-                   "5. **Google the error** - someone else probably had the same issue\n\n"
-                   "What specific error are you seeing?")
-        
-        if "git" in question_lower:
-            return ("Git Basics:\n\n"
-                   "```bash\n"
-                   "git init                    # Start new repository\n"
-                   "git add .                   # Stage all changes\n"
-                   "git commit -m 'message'     # Save changes\n"
-                   "git push origin main        # Upload to remote\n"
-                   "git pull                    # Download changes\n"
-                   "```\n\n"
-                   "Always commit frequently with clear messages!")
-        
-        if "api" in question_lower or "rest" in question_lower:
-            return ("REST API Basics:\n\n"
-                   "```javascript\n"
-                   "// GET request\n"
-                   "fetch('https://api.example.com/users')\n"
-                   "    .then(response => response.json())\n"
-                   "    .then(data => console.log(data));\n"
-                   "\n"
-                   "// POST request\n"
-                   "fetch('https://api.example.com/users', {\n"
-                   "    method: 'POST',\n"
-                   "    headers: {'Content-Type': 'application/json'},\n"
-                   "    body: JSON.stringify({name: 'John', age: 30})\n"
-                   "});\n"
-                   "```")
-        
-        # AI/ML and Computer Vision topics
-        if any(word in question_lower for word in ["deepfake", "deep fake", "fake video", "video analysis", "computer vision", "ai", "machine learning", "ml"]):
-            if "deepfake" in question_lower or "fake video" in question_lower:
-                return ("Deepfake Detection and Analysis! 🤖\n\n"
-                       "**Python Example using OpenCV and MediaPipe:**\n"
-                       "```python\n"
-                       "import cv2\n"
-                       "import mediapipe as mp\n"
-                       "import numpy as np\n"
-                       "\n"
-                       "def analyze_video_for_deepfake(video_path):\n"
-                       "    # Initialize MediaPipe Face Detection\n"
-                       "    mp_face_detection = mp.solutions.face_detection\n"
-                       "    face_detection = mp_face_detection.FaceDetection()\n"
-                       "    \n"
-                       "    cap = cv2.VideoCapture(video_path)\n"
-                       "    \n"
-                       "    while cap.isOpened():\n"
-                       "        ret, frame = cap.read()\n"
-                       "        if not ret:\n"
-                       "            break\n"
-                       "        \n"
-                       "        # Convert to RGB for MediaPipe\n"
-                       "        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)\n"
-                       "        results = face_detection.process(rgb_frame)\n"
-                       "        \n"
-                       "        if results.detections:\n"
-                       "            for detection in results.detections:\n"
-                       "                # Analyze face landmarks for inconsistencies\n"
-                       "                bbox = detection.location_data.relative_bounding_box\n"
-                       "                # Add your deepfake detection logic here\n"
-                       "        \n"
-                       "    cap.release()\n"
-                       "    return 'Analysis complete'\n"
-                       "```\n\n"
-                       "**Key Deepfake Detection Methods:**\n"
-                       "• **Face Landmark Analysis**: Check for unnatural facial movements\n"
-                       "• **Blinking Patterns**: Deepfakes often have irregular blinking\n"
-                       "• **Lighting Inconsistencies**: Look for shadows that don't match\n"
-                       "• **Audio-Visual Sync**: Check if lip movements match audio\n"
-                       "• **Metadata Analysis**: Examine video file properties\n\n"
-                       "**Libraries to use:**\n"
-                       "• OpenCV (cv2) - Video processing\n"
-                       "• MediaPipe - Face detection and landmarks\n"
-                       "• TensorFlow/PyTorch - Deep learning models\n"
-                       "• scikit-learn - Traditional ML algorithms")
-            
-            if "computer vision" in question_lower:
-                return ("Computer Vision with Python! 👁️\n\n"
-                       "**Basic Image Processing Example:**\n"
-                       "```python\n"
-                       "import cv2\n"
-                       "import numpy as np\n"
-                       "\n"
-                       "def process_image(image_path):\n"
-                       "    # Read image\n"
-                       "    img = cv2.imread(image_path)\n"
-                       "    \n"
-                       "    # Convert to grayscale\n"
-                       "    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)\n"
-                       "    \n"
-                       "    # Edge detection\n"
-                       "    edges = cv2.Canny(gray, 50, 150)\n"
-                       "    \n"
-                       "    # Face detection\n"
-                       "    face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')\n"
-                       "    faces = face_cascade.detectMultiScale(gray, 1.1, 4)\n"
-                       "    \n"
-                       "    return faces\n"
-                       "```\n\n"
-                       "**Popular Computer Vision Libraries:**\n"
-                       "• **OpenCV**: Image and video processing\n"
-                       "• **MediaPipe**: Face, hand, and pose detection\n"
-                       "• **Pillow (PIL)**: Image manipulation\n"
-                       "• **scikit-image**: Scientific image processing")
-            
-            return ("AI and Machine Learning Basics! 🤖\n\n"
-                   "**Simple ML Example with scikit-learn:**\n"
-                   "```python\n"
-                   "from sklearn.model_selection import train_test_split\n"
-                   "from sklearn.ensemble import RandomForestClassifier\n"
-                   "import pandas as pd\n"
-                   "\n"
-                   "# Load data\n"
-                   "data = pd.read_csv('your_data.csv')\n"
-                   "X = data.drop('target', axis=1)\n"
-                   "y = data['target']\n"
-                   "\n"
-                   "# Split data\n"
-                   "X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)\n"
-                   "\n"
-                   "# Train model\n"
-                   "model = RandomForestClassifier()\n"
-                   "model.fit(X_train, y_train)\n"
-                   "\n"
-                   "# Make predictions\n"
-                   "predictions = model.predict(X_test)\n"
-                   "```\n\n"
-                   "**Popular AI/ML Libraries:**\n"
-                   "• **TensorFlow**: Deep learning framework\n"
-                   "• **PyTorch**: Research-focused deep learning\n"
-                   "• **scikit-learn**: Traditional machine learning\n"
-                   "• **Keras**: High-level neural network API")
-        
-        # General programming questions
-        if any(word in question_lower for word in ["what is", "explain", "how to", "how do", "what are", "tell me"]):
-            if "programming" in question_lower or "code" in question_lower:
-                return ("Programming is the art of giving instructions to computers! 🖥️\n\n"
-                       "**Key Concepts:**\n"
-                       "• **Variables**: Store data (like `name = 'John'`)\n"
-                       "• **Functions**: Reusable blocks of code\n"
-                       "• **Loops**: Repeat actions (for, while)\n"
-                       "• **Conditions**: Make decisions (if/else)\n"
-                       "• **Data Structures**: Organize data (lists, dictionaries)\n\n"
-                       "**Popular Languages:**\n"
-                       "• **Python**: Great for beginners, data science, web apps\n"
-                       "• **JavaScript**: Web development, frontend and backend\n"
-                       "• **Java**: Enterprise applications, Android apps\n"
-                       "• **C++**: System programming, games, performance\n\n"
-                       "What specific aspect of programming interests you?")
-            
-            if "variable" in question_lower:
-                return ("Variables are containers that store data in programming! 📦\n\n"
-                       "**Python Example:**\n"
-                       "```python\n"
-                       "name = 'Alice'          # String variable\n"
-                       "age = 25               # Integer variable\n"
-                       "height = 1.75          # Float variable\n"
-                       "is_student = True      # Boolean variable\n"
-                       "```\n\n"
-                       "**JavaScript Example:**\n"
-                       "```javascript\n"
-                       "let name = 'Alice';    // String variable\n"
-                       "const age = 25;        // Constant (can't change)\n"
-                       "var height = 1.75;     // Old way (avoid)\n"
-                       "```\n\n"
-                       "Variables can store different types of data and can be changed during program execution!")
-            
-            if "function" in question_lower:
-                return ("Functions are reusable blocks of code that perform specific tasks! 🔧\n\n"
-                       "**Python Example:**\n"
-                       "```python\n"
-                       "def greet(name):\n"
-                       "    return f'Hello, {name}!'\n"
-                       "\n"
-                       "result = greet('World')\n"
-                       "print(result)  # Hello, World!\n"
-                       "```\n\n"
-                       "**JavaScript Example:**\n"
-                       "```javascript\n"
-                       "function greet(name) {\n"
-                       "    return `Hello, ${name}!`;\n"
-                       "}\n"
-                       "\n"
-                       "const result = greet('World');\n"
-                       "console.log(result);  // Hello, World!\n"
-                       "```\n\n"
-                       "Functions help organize code and avoid repetition!")
-        
+            if trace is not None:
+                trace["stages"].append({"stage": "short_message", "matched": True})
+            return pack.answer("short_message"), "short_message"
+
+        # The cache is dropped automatically whenever the knowledge pack changes.
+        # A trace only looks: it neither counts, reorders nor fills the cache
+        if trace is not None:
+            trace["stages"].append({"stage": "cache",
+                                    "hit": self.cache.peek(user_question, namespace=pack.fingerprint) is not None})
+        else:
+            cached = self.cache.get(user_question, namespace=pack.fingerprint)
+            if cached is not None:
+                return cached
+
+        if trace is None:
+            rule = pack.matcher.match(user_question)
+        else:
+            rules_trace = pack.matcher.explain(user_question)
+            trace["stages"].append(dict(stage="rules", **rules_trace))
+            rule = pack.matcher.rules.get(rules_trace["winner"])
+        if rule is not None:
+            result = (pack.answer(rule.rule_id), rule.rule_id)
+        else:
+            result = self._retrieve(pack, user_question, trace)
+            if result[1] == "default" and self.model is not None:
+                if trace is not None:
+                    trace["stages"].append({"stage": "model", "model": self.model.name,
+                                            "state": self.model.state})
+                if not self.model.ready:
+                    # Not cached: the model may answer this once it has loaded
+                    return result
+                chunks = self._generate(pack, user_question, cache=trace is None)
+                return (chunks if stream else "".join(chunks)), MODEL_RULE
+        if trace is None:
+            self.cache.put(user_question, result, namespace=pack.fingerprint)
+        return result
+
+    def _generate(self, pack, user_question, cache=True):
+        start = time.perf_counter()
+        pieces = []
+        for piece in self.model.generate(user_question):
+            pieces.append(piece)
+            yield piece
+        self.metrics.observe("generate_seconds", time.perf_counter() - start)
+        if cache:
+            self.cache.put(user_question, ("".join(pieces), MODEL_RULE), namespace=pack.fingerprint)
+
+    def retriever(self, pack=None):
+        """BM25 index over the answers of pack (the current one by default)"""
+        pack = pack or self.pack
+        with self._retriever_lock:
+            cached = self._retriever
+            if cached is not None and cached[0] is pack:
+                return cached[1]
+            if cached is None:
+                from retrieval import BM25Index
+                index, keys = BM25Index(), {}
+            else:
+                # A reload: only new and changed answers are tokenized again
+                _, index, keys = cached
+            current = {}
+            for rule in pack.rules:
+                if rule.rule_id not in NOT_SEARCHABLE and pack.has_answer(rule.rule_id):
+                    key = current[rule.rule_id] = (tuple(rule.keywords), pack.answer_digest(rule.rule_id))
+                    if keys.get(rule.rule_id) != key:
+                        index.add_document(rule.rule_id, " ".join(rule.keywords) + "\n" + pack.answer(rule.rule_id))
+            for rule_id in keys.keys() - current.keys():
+                index.remove_document(rule_id)
+            self._retriever = (pack, index, current)
+            return index
+
+    def _retrieve(self, pack, user_question, trace=None):
+        start = time.perf_counter()
+        with self._retriever_lock:
+            # A reload may be updating the index in place on another thread
+            hits = self.retriever(pack).search(user_question, k=3)
+        if trace is not None:
+            trace["stages"].append({
+                "stage": "retrieval", "hits": [[rule_id, score] for rule_id, score in hits],
+                "answer_min_score": RETRIEVAL_MIN_SCORE, "suggestion_min_score": SUGGESTION_MIN_SCORE,
+                "seconds": time.perf_counter() - start,
+            })
+        if hits and hits[0][1] >= RETRIEVAL_MIN_SCORE:
+            self.metrics.inc("retrieval_total", outcome="answer")
+            return pack.answer(hits[0][0]), hits[0][0]
         # Default response with programming topics
-        return ("I'm here to help with programming! Here are some topics I can assist with:\n\n"
-               "🔹 **Languages**: Python, JavaScript, HTML/CSS, Java, C++\n"
-               "🔹 **Concepts**: Functions, loops, data structures, OOP\n"
-               "🔹 **Tools**: Git, debugging, testing, IDEs\n"
-               "🔹 **Web Dev**: Frontend, backend, APIs, databases\n"
-               "🔹 **Best Practices**: Clean code, documentation, performance\n\n"
-               "💡 **Try asking me specific questions like:**\n"
-               "• \"How do I create a function in Python?\"\n"
-               "• \"What are JavaScript arrays?\"\n"
-               "• \"How do I debug my code?\"\n"
-               "• \"Explain loops in programming\"\n"
-               "• \"What is Git?\"\n\n"
-               "Just ask me anything programming-related! 🚀")
+        answer = pack.answer("default")
+        suggestions = [_topic_title(pack.answer(rule_id)) for rule_id, score in hits
+                       if score >= SUGGESTION_MIN_SCORE]
+        if suggestions:
+            self.metrics.inc("retrieval_total", outcome="suggest")
+            answer += "\n\n🔎 **Related topics:** " + " · ".join(suggestions)
+        else:
+            self.metrics.inc("retrieval_total", outcome="none")
+        return answer, "default"
+
+    def get_smart_response(self, user_question):
+        """Enhanced simple response system with comprehensive programming knowledge"""
+        return self.respond(user_question)[0]
 
     def ask(self, user_question):
         # Use smart response system for instant answers
-        answer = self.get_smart_response(user_question)
-        self.history.append((user_question, answer))
-        self.save_history()
+        with self.metrics.timer("ask_seconds"):
+            answer = self.get_smart_response(user_question)
+            self.record([(user_question, answer)])
         return answer
 
+    def stream_response(self, user_question):
+        """Return (rule_id, chunks) where chunks yields the answer piece by piece"""
+        answer, rule_id = self.respond(user_question, stream=True)
+        if isinstance(answer, str):
+            return rule_id, iter(answer.splitlines(keepends=True))
+        return rule_id, answer
+
+    def iter_responses(self, questions, workers=None, chunksize=256):
+        """Yield (question, answer, rule_id) for each question, in input order.
+
+        Questions are consumed lazily in chunks. Anything longer than one chunk
+        is fanned out over a process pool with a bounded number of chunks in
+        flight, so arbitrarily large inputs run in constant memory.
+        """
+        chunks = _iter_chunks(questions, chunksize)
+        first = next(chunks, None)
+        if first is None:
+            return
+        second = next(chunks, None)
+        # A local model lives in this process only, so it keeps the work here
+        if second is None or (workers is not None and workers <= 1) or self.model is not None:
+            for chunk in _prepend([first, second], chunks):
+                for question in chunk:
+                    answer, rule_id = self.respond(question)
+                    yield question, answer, rule_id
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers, initializer=_init_batch_worker) as pool:
+            in_flight = deque()
+            for chunk in _prepend([first, second], chunks):
+                in_flight.append((chunk, pool.submit(_answer_chunk, chunk)))
+                if len(in_flight) >= workers * 2:
+                    chunk, future = in_flight.popleft()
+                    for question, (answer, rule_id) in zip(chunk, future.result()):
+                        yield question, answer, rule_id
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                for question, (answer, rule_id) in zip(chunk, future.result()):
+                    yield question, answer, rule_id
+
+    def ask_many(self, questions, workers=None, chunksize=256):
+        """Answer many questions and append them to the history in one write"""
+        turns = [(question, answer) for question, answer, _ in
+                 self.iter_responses(questions, workers, chunksize)]
+        self.record(turns)
+        return [answer for _, answer in turns]
+
+
+def _topic_title(answer):
+    """Short topic name from the first line of an answer ("Git Basics:" -> "Git Basics")"""
+    return re.split(r"[!:]", answer.split("\n", 1)[0], 1)[0].strip()
+
+
+def format_search_results(query, results, more=False):
+    """Transcript message listing history search results, one question and answer line each"""
+    if not results:
+        return f"🔍 No saved answer contains {query.strip()!r}"
+    lines = [f"🔍 Saved answers for {query.strip()!r}, newest first:", ""]
+    for result in results:
+        first_line = result["answer"].strip().split("\n", 1)[0]
+        if len(first_line) > 80:
+            first_line = first_line[:77] + "..."
+        lines.append(f"• {result['question']}")
+        lines.append(f"    {first_line}")
+    if more:
+        lines += ["", f"Showing the newest {len(results)}; add words to narrow the search."]
+    return "\n".join(lines)
+
+
+def _iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _prepend(head, rest):
+    for chunk in head:
+        if chunk is not None:
+            yield chunk
+    yield from rest
+
+
+# Batch workers build their own history-less bot once per process
+_batch_bot = None
+
+def _init_batch_worker():
+    global _batch_bot
+    _batch_bot = FriendlyCodeChatbot(history_file=None)
+
+def _answer_chunk(questions):
+    return [_batch_bot.respond(question) for question in questions]
+
 # Classic/Bubble view mode flag
 show_classic_mode = False
 
-def run_gui():
+def run_gui(metrics=None, model=None, history_window=HISTORY_WINDOW, reload=True,
+            history_backend="journal"):
     global show_classic_mode
+    import tkinter as tk
+    from tkinter import messagebox
+    from ask_dispatcher import AskDispatcher
+    from chat_views import ClassicTranscript, StyleRegistry, VirtualBubbleList
+    from code_highlight import Highlighter
+    from snippet_store import SnippetStore
     print("Starting GUI...")
-    bot = FriendlyCodeChatbot()
-    bg_color = "#2E2E2E"
-    text_color = "#FFFFFF"
+    # History is loaded once the window has been painted (see load_initial_history)
+    bot = FriendlyCodeChatbot(history_limit=HISTORY_PAGE_SIZE, defer_history=True,
+                              metrics=metrics, model=model, history_window=history_window,
+                              history_backend=history_backend)
+    # Every themed widget registers here; see chat_views.THEMES
+    styles = StyleRegistry(theme="dark")
 
     root = tk.Tk()
     root.title("Friendly Code Chatbot (Free LLMs)")
-    root.configure(bg=bg_color)
+    styles.register(root, "window")
 
     # Ensure window appears and is focused
     root.lift()
@@ -506,81 +549,97 @@ def run_gui():
     print("GUI window created")
 
     # Daily tip label
-    tip_label = tk.Label(root, text=DAILY_TIP, bg=bg_color, fg="#FFD700", font=("Segoe UI", 9, "italic"))
+    tip_label = tk.Label(root, text=DAILY_TIP, fg="#FFD700", font=("Segoe UI", 9, "italic"))
+    styles.register(tip_label, "window")
     tip_label.pack(pady=(5, 0))
     
     # Status label
-    status_label = tk.Label(root, text="Instant Mode Ready! ⚡", bg=bg_color, fg="#00FF00", font=("Segoe UI", 9))
+    status_label = tk.Label(root, text="Instant Mode Ready! ⚡", fg="#00FF00", font=("Segoe UI", 9))
+    styles.register(status_label, "window")
     status_label.pack(pady=(2, 0))
 
+    def show_model_state(loaded_model):
+        if loaded_model.ready:
+            status_label.config(text=f"Instant Mode Ready! ⚡  Model {loaded_model.name} ready 🧠")
+        else:
+            status_label.config(text=f"Instant Mode Ready! ⚡  Model {loaded_model.name} unavailable")
+
+    if model is not None:
+        # Rules answer right away; the model takes over unmatched questions once loaded
+        status_label.config(text=f"Instant Mode Ready! ⚡  Loading model {model.name}...")
+        model.on_loaded(lambda loaded: root.after(0, show_model_state, loaded))
+        model.start()
+
+    def show_reload(pack):
+        status_label.config(text=f"Instant Mode Ready! ⚡  Knowledge reloaded (version {pack.version}) 🔄")
+
+    def show_reload_error(error):
+        status_label.config(text="Instant Mode Ready! ⚡  Knowledge edit not loaded, see the console")
+
+    # Edits to knowledge/ go live without a restart; the window and history stay as they are
+    watcher = None
+    if reload:
+        from knowledge_watcher import KnowledgeWatcher
+        watcher = KnowledgeWatcher(bot, RELOAD_INTERVAL,
+                                   on_reload=lambda pack: root.after(0, show_reload, pack),
+                                   on_error=lambda error: root.after(0, show_reload_error, error)).start()
+
     # Classic chat area (Text widget)
     chat_area = tk.Text(
-        root, wrap=tk.WORD, width=80, height=25, font=("Consolas", 11),
-        bg="#1E1E1E", fg="#FFFFFF", state='disabled'
+        root, wrap=tk.WORD, width=80, height=25, font=("Consolas", 11), state='disabled'
     )
+    styles.register(chat_area, "text")
+    styles.register(chat_area, "tags")
     chat_area.pack(padx=10, pady=10)
-
-    # Bubble chat area (Frame)
-    bubbles_frame = tk.Frame(root, bg=bg_color)
+    # Answers are inserted in chunks from idle callbacks; code blocks are
+    # tokenized on the highlighter's thread and styled through Text tags
+    highlighter = Highlighter()
+    transcript = ClassicTranscript(chat_area, highlighter)
+
+    # Bubble chat area (virtualized: only visible bubbles get widgets)
+    bubbles_view = VirtualBubbleList(root, bg=styles.theme["roles"]["window"]["bg"])
+    styles.register(bubbles_view, "bubbles")
     # Not shown by default
 
     def show_classic():
         chat_area.pack(padx=10, pady=10)
-        bubbles_frame.pack_forget()
+        bubbles_view.pack_forget()
         refresh_classic_chat()
 
     def show_bubbles():
         chat_area.pack_forget()
-        bubbles_frame.pack(padx=10, pady=10, fill="both", expand=True)
+        bubbles_view.pack(padx=10, pady=10, fill="both", expand=True)
         refresh_bubbles_chat()
 
     def refresh_classic_chat():
-        chat_area.config(state='normal')
-        chat_area.delete(1.0, tk.END)
-        for user, bot_msg in bot.history:
-            chat_area.insert(tk.END, f"User: {user}\n")
-            chat_area.insert(tk.END, f"Bot: {bot_msg}\n")
-        chat_area.config(state='disabled')
-        chat_area.see(tk.END)
+        pending_placeholders.clear()
+        shown_partials.clear()
+        messages = []
+        for user, bot_msg in bot.history_snapshot():
+            messages.append(("User", user))
+            messages.append(("Bot", bot_msg))
+        transcript.set_messages(messages)
 
     def refresh_bubbles_chat():
-        for widget in bubbles_frame.winfo_children():
-            widget.destroy()
-        for user, bot_msg in bot.history:
-            user_bubble = tk.Label(
-                bubbles_frame, text=user, bg="#4A90E2", fg="#fff", anchor="w",
-                font=("Segoe UI", 10, "bold"), padx=10, pady=5, wraplength=600, justify="left"
-            )
-            user_bubble.pack(anchor="w", pady=2, padx=5, fill="x")
-            bot_bubble = tk.Label(
-                bubbles_frame, text=bot_msg, bg="#444", fg="#fff", anchor="w",
-                font=("Consolas", 10), padx=10, pady=5, wraplength=600, justify="left"
-            )
-            bot_bubble.pack(anchor="w", pady=(0, 8), padx=30, fill="x")
-        bubbles_frame.update_idletasks()
-        # Dummy yview for compatibility
-        bubbles_frame.yview = lambda *a, **k: None
+        pending_placeholders.clear()
+        shown_partials.clear()
+        messages = []
+        for user, bot_msg in bot.history_snapshot():
+            messages.append(("User", user))
+            messages.append(("Bot", bot_msg))
+        bubbles_view.set_messages(messages)
 
     def add_to_classic_chat(sender, message):
-        chat_area.config(state='normal')
-        chat_area.insert(tk.END, f"{sender}: {message}\n")
-        chat_area.config(state='disabled')
-        chat_area.see(tk.END)
+        return transcript.append(sender, message)
 
     def add_to_bubbles(sender, message):
-        if sender == "User":
-            user_bubble = tk.Label(
-                bubbles_frame, text=message, bg="#4A90E2", fg="#fff", anchor="w",
-                font=("Segoe UI", 10, "bold"), padx=10, pady=5, wraplength=600, justify="left"
-            )
-            user_bubble.pack(anchor="w", pady=2, padx=5, fill="x")
-        else:
-            bot_bubble = tk.Label(
-                bubbles_frame, text=message, bg="#444", fg="#fff", anchor="w",
-                font=("Consolas", 10), padx=10, pady=5, wraplength=600, justify="left"
-            )
-            bot_bubble.pack(anchor="w", pady=(0, 8), padx=30, fill="x")
-        bubbles_frame.update_idletasks()
+        return bubbles_view.append(sender, message)
+
+    # "Thinking..." placeholders waiting for their answer, by dispatcher ticket:
+    # the transcript message id in classic mode, the bubble index in bubble mode
+    pending_placeholders = {}
+    # Characters of each streamed answer already on screen, by ticket
+    shown_partials = {}
 
     def send_question():
         user_question = user_input.get()
@@ -588,124 +647,144 @@ def run_gui():
             return
         user_input.delete(0, tk.END)
         
-        # Show user message and typing indicator
+        # Show user message and typing indicator; Tk paints them once this handler returns
         if show_classic_mode:
             add_to_bubbles("User", user_question)
-            add_to_bubbles("Bot", "🤖 Thinking...")
-            root.update()
+            placeholder = add_to_bubbles("Bot", THINKING_MESSAGE)
         else:
             add_to_classic_chat("User", user_question)
-            add_to_classic_chat("Bot", "🤖 Thinking...")
-            root.update()
-        
-        # Process the question in a separate thread to avoid blocking GUI
-        def process_question():
-            try:
-                answer = bot.ask(user_question)
-                
-                # Update GUI in main thread
-                root.after(0, lambda: update_chat_with_answer(answer))
-            except Exception as e:
-                error_msg = f"Sorry, I encountered an error: {str(e)}"
-                root.after(0, lambda: update_chat_with_answer(error_msg))
-        
-        thread = threading.Thread(target=process_question, daemon=True)
-        thread.start()
+            placeholder = add_to_classic_chat("Bot", THINKING_MESSAGE)
+
+        # Answered on the dispatcher's worker pool to avoid blocking the GUI
+        ticket = dispatcher.submit(user_question)
+        pending_placeholders[ticket] = placeholder
+
+    def deliver_answer(ticket, answer):
+        # Called from a worker thread, in submission order
+        root.after(0, update_chat_with_answer, ticket, answer)
+
+    def deliver_partial(ticket, text):
+        # Called from a worker thread while a model answer is being written
+        root.after(0, show_partial_answer, ticket, text)
+
+    def show_partial_answer(ticket, text):
+        placeholder = pending_placeholders.get(ticket)
+        if placeholder is None:
+            return
+        if show_classic_mode:
+            if isinstance(placeholder, int) and placeholder < len(bubbles_view):
+                bubbles_view.update_message(placeholder, text)
+        elif placeholder in transcript:
+            shown = shown_partials.get(ticket)
+            if shown is None:
+                # First piece: the "Thinking..." text goes
+                transcript.replace(placeholder, "")
+                shown = 0
+            # Only the new text is inserted; show_answer highlights the whole answer once
+            transcript.extend(placeholder, text[shown:])
+        shown_partials[ticket] = len(text)
+
+    dispatcher = AskDispatcher(bot, deliver_answer, workers=2, on_partial=deliver_partial)
     
-    def update_chat_with_answer(answer):
+    def update_chat_with_answer(ticket, answer):
+        with bot.metrics.timer("gui_update_seconds"):
+            show_answer(ticket, answer)
+
+    def show_answer(ticket, answer):
+        placeholder = pending_placeholders.pop(ticket, None)
+        shown_partials.pop(ticket, None)
         if show_classic_mode:
-            # Remove the "Thinking..." bubble (last widget)
-            children = bubbles_frame.winfo_children()
-            if children and children[-1].cget("text") == "🤖 Thinking...":
-                children[-1].destroy()
-            add_to_bubbles("Bot", answer)
-            refresh_bubbles_chat()
+            # Replace the "Thinking..." bubble in place so answers stay in order
+            if isinstance(placeholder, int) and placeholder < len(bubbles_view):
+                if answer is None:
+                    bubbles_view.remove(placeholder)
+                else:
+                    bubbles_view.update_message(placeholder, answer)
+            elif answer is not None:
+                add_to_bubbles("Bot", answer)
         else:
-            # Remove the "Thinking..." line (last line)
-            chat_area.config(state='normal')
-            lines = chat_area.get("1.0", tk.END).splitlines()
-            if lines and lines[-1].strip() == "Bot: 🤖 Thinking...":
-                chat_area.delete(f"{len(lines)}.0", tk.END)
-            chat_area.config(state='disabled')
-            add_to_classic_chat("Bot", answer)
-        save_code_if_present(answer)
+            # Replace the "Thinking..." line this answer belongs to
+            if placeholder is not None and placeholder in transcript:
+                if answer is None:
+                    transcript.remove(placeholder)
+                else:
+                    transcript.replace(placeholder, answer)
+            elif answer is not None:
+                add_to_classic_chat("Bot", answer)
+        if answer is not None:
+            save_code_if_present(answer)
 
     def clear_chat():
-        bot.history.clear()
-        bot.save_history()
+        # Drops queued questions too; the history writer applies the clear in order
+        dispatcher.clear_history()
+        pending_placeholders.clear()
+        shown_partials.clear()
+        older_button.config(state='disabled')
         if show_classic_mode:
-            for widget in bubbles_frame.winfo_children():
-                widget.destroy()
+            bubbles_view.clear()
             add_to_bubbles("Bot", "✅ Chat cleared")
         else:
-            chat_area.config(state='normal')
-            chat_area.delete(1.0, tk.END)
-            chat_area.config(state='disabled')
+            transcript.clear()
             add_to_classic_chat("Bot", "✅ Chat cleared")
 
     def copy_last_bot_answer():
-        if not _pyperclip_available:
+        pyperclip = _get_pyperclip()
+        if pyperclip is None:
             messagebox.showerror("Error", "pyperclip module is not installed.")
             return
         if show_classic_mode:
             # Find last bot bubble
-            children = bubbles_frame.winfo_children()
-            for widget in reversed(children):
-                if isinstance(widget, tk.Label) and widget.cget("bg") == "#444":
-                    text = widget.cget("text")
-                    pyperclip.copy(text)
-                    messagebox.showinfo("Copied", "Last bot answer copied to clipboard!")
-                    return
+            text = bubbles_view.last_text("Bot")
+            if text is not None:
+                pyperclip.copy(text)
+                messagebox.showinfo("Copied", "Last bot answer copied to clipboard!")
+                return
         else:
-            # Find last "Bot: ..." line
-            lines = chat_area.get(1.0, tk.END).strip().split('\n')
-            for line in reversed(lines):
-                if line.startswith("Bot:"):
-                    text = line[len("Bot:"):].strip()
-                    pyperclip.copy(text)
-                    messagebox.showinfo("Copied", "Last bot answer copied to clipboard!")
-                    return
+            # Last bot message, all of its lines
+            msg_id = transcript.last_id("Bot")
+            if msg_id is not None:
+                pyperclip.copy(transcript.message(msg_id))
+                messagebox.showinfo("Copied", "Last bot answer copied to clipboard!")
+                return
+
+    # Code blocks of answers are kept once each in snippets/, written off the GUI thread
+    snippets = SnippetStore()
 
     def save_code_if_present(answer):
-        # Save code if answer looks like it contains code (simple heuristic)
-        code_keywords = ["def ", "print(", "{", "}"]
-        if any(keyword in answer.lower() for keyword in code_keywords):
-            try:
-                with open("code_sample.py", "w", encoding="utf-8") as f:
-                    f.write(answer)
-                print("⚙️ Example code saved to code_sample.py")
-            except Exception as e:
-                print("Error saving code:", e)
+        snippets.save_async(answer, lambda paths: print("⚙️ Example code saved to", ", ".join(paths)))
+
+    def search_saved_answers():
+        query = user_input.get()
+        if not query.strip():
+            return
+        # A journal is searched by a full scan, so keep it off the Tk thread
+        def search():
+            results, cursor = bot.search_history(query)
+            root.after(0, show_search_results, query, results, cursor)
+        threading.Thread(target=search, name="history-search", daemon=True).start()
+
+    def show_search_results(query, results, cursor):
+        message = format_search_results(query, results, more=cursor is not None)
+        if show_classic_mode:
+            add_to_bubbles("Bot", message)
+        else:
+            add_to_classic_chat("Bot", message)
 
     def toggle_theme():
-        nonlocal bg_color, text_color
-        if root["bg"] == "#2E2E2E":
-            bg_color = "#F2F2F2"
-            text_color = "#000000"
+        if styles.theme_name == "dark":
+            styles.apply("light")
             theme_button.config(text="🌙 Night Mode")
-            chat_area.config(bg="#FFFFFF", fg="#000000", insertbackground="#000000")
-            user_input.config(bg="#FFFFFF", fg="#000000", insertbackground="#000000")
-            bubbles_frame.config(bg=bg_color)
-            for widget in bubbles_frame.winfo_children():
-                if widget.cget("bg") == "#4A90E2":
-                    widget.config(bg="#A3C8F2", fg="#000")
-                elif widget.cget("bg") == "#444":
-                    widget.config(bg="#E0E0E0", fg="#000")
         else:
-            bg_color = "#2E2E2E"
-            text_color = "#FFFFFF"
+            styles.apply("dark")
             theme_button.config(text="☀️ Day Mode")
-            chat_area.config(bg="#1E1E1E", fg="#FFFFFF", insertbackground="#FFFFFF")
-            user_input.config(bg="#333333", fg="#FFFFFF", insertbackground="#FFFFFF")
-            bubbles_frame.config(bg=bg_color)
-            for widget in bubbles_frame.winfo_children():
-                if widget.cget("bg") == "#A3C8F2":
-                    widget.config(bg="#4A90E2", fg="#fff")
-                elif widget.cget("bg") == "#E0E0E0":
-                    widget.config(bg="#444", fg="#fff")
-        root.configure(bg=bg_color)
-        tip_label.configure(bg=bg_color)
-        status_label.configure(bg=bg_color)
+
+    def load_older_history():
+        if bot.load_older_history():
+            if show_classic_mode:
+                refresh_bubbles_chat()
+            else:
+                refresh_classic_chat()
+        older_button.config(state='normal' if bot.has_older_history() else 'disabled')
 
     def toggle_chat_style():
         global show_classic_mode
@@ -718,19 +797,23 @@ def run_gui():
             show_classic()
 
     # Input area and buttons
-    input_frame = tk.Frame(root, bg=bg_color)
+    input_frame = tk.Frame(root)
+    styles.register(input_frame, "window")
     input_frame.pack(fill="x", padx=10, pady=(0, 10))
 
     user_input = tk.Entry(
-        input_frame, font=("Consolas", 11),
-        bg="#333333", fg="#FFFFFF", insertbackground="white"
+        input_frame, font=("Consolas", 11)
     )
+    styles.register(user_input, "input")
     user_input.pack(side=tk.LEFT, padx=(0, 5), fill=tk.X, expand=True)
     user_input.bind("<Return>", lambda e: send_question())
 
     send_button = tk.Button(input_frame, text="Send", command=send_question)
     send_button.pack(side=tk.LEFT, padx=5)
 
+    search_button = tk.Button(input_frame, text="🔍 Search", command=search_saved_answers)
+    search_button.pack(side=tk.LEFT, padx=5)
+
     clear_button = tk.Button(input_frame, text="Clear", command=clear_chat)
     clear_button.pack(side=tk.LEFT, padx=5)
 
@@ -743,22 +826,166 @@ def run_gui():
     chat_style_button = tk.Button(input_frame, text="📋 Text Mode", command=toggle_chat_style)
     chat_style_button.pack(side=tk.LEFT, padx=5)
 
-    # AI functionality removed for instant responses
+    older_button = tk.Button(input_frame, text="⬆ Older", command=load_older_history, state='disabled')
+    older_button.pack(side=tk.LEFT, padx=5)
+
+    # Local model answers (--model) stream in through deliver_partial
+
+    def load_initial_history():
+        # Only the newest page is read; older turns come in through "Older"
+        bot.load_history()
+        older_button.config(state='normal' if bot.has_older_history() else 'disabled')
+        # Welcome message
+        if show_classic_mode:
+            show_bubbles()
+            add_to_bubbles("Bot", "Welcome! I'm a friendly code chatbot. Ask me any programming question 😃")
+        else:
+            show_classic()
+            add_to_classic_chat("Bot", "Welcome! I'm a friendly code chatbot. Ask me any programming question 😃")
+
+    # Paint the (empty) window first and read the history right after
+    root.after_idle(root.after, 1, load_initial_history)
+
+    def on_close():
+        # Let queued history writes finish before the window goes away
+        dispatcher.shutdown(timeout=2)
+        snippets.close()
+        highlighter.close()
+        if watcher is not None:
+            watcher.stop()
+        root.destroy()
 
-    # Welcome message
-    if show_classic_mode:
-        show_bubbles()
-        add_to_bubbles("Bot", "Welcome! I'm a friendly code chatbot. Ask me any programming question 😃")
-    else:
-        show_classic()
-        add_to_classic_chat("Bot", "Welcome! I'm a friendly code chatbot. Ask me any programming question 😃")
+    root.protocol("WM_DELETE_WINDOW", on_close)
 
     print("Starting mainloop...")
     root.mainloop()
     print("GUI closed")
 
-def main():
-    run_gui()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Friendly Code Chatbot")
+    parser.add_argument("--serve-stdio", action="store_true",
+                        help="answer line-delimited questions from stdin, streaming JSONL events to stdout")
+    parser.add_argument("--serve-http", action="store_true",
+                        help="serve the chatbot as a local HTTP/JSON service")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve-http")
+    parser.add_argument("--port", type=int, default=8765, help="port for --serve-http")
+    parser.add_argument("--http-workers", type=int, default=4,
+                        help="threads answering --serve-http questions")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="questions --serve-http may queue before answering 503")
+    parser.add_argument("--batch", metavar="IN",
+                        help="answer the questions of a JSONL file ('-' for stdin) instead of opening the GUI")
+    parser.add_argument("--output", "-o", metavar="OUT", default="-",
+                        help="where to write the JSONL answers (default: stdout)")
+    parser.add_argument("--field", default="question",
+                        help="JSON field holding the question (default: question)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --batch (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=256,
+                        help="questions per work unit and per history append")
+    parser.add_argument("--explain", metavar="QUESTION",
+                        help="print how QUESTION is answered (every rule considered, timings) as JSON and exit")
+    parser.add_argument("--trace", action="store_true",
+                        help="with --serve-stdio or --batch, report the rules considered for every answer")
+    parser.add_argument("--no-history", action="store_true",
+                        help="do not append headless questions to the chat history")
+    parser.add_argument("--no-reload", action="store_true",
+                        help="do not reload edited rules and answers from knowledge/ while running")
+    parser.add_argument("--history-backend", choices=HISTORY_BACKENDS, default="journal",
+                        help="where the history is kept: chat_history.jsonl, or chat_history.db with "
+                             "full-text search (imports the journal the first time)")
+    parser.add_argument("--search", metavar="QUERY",
+                        help="print the newest saved turns containing every word of QUERY as JSON and exit")
+    parser.add_argument("--history-window", type=int, default=HISTORY_WINDOW,
+                        help="turns kept in memory; older ones are rotated into compressed "
+                             "archive segments (0 keeps everything in memory)")
+    parser.add_argument("--model", metavar="NAME",
+                        help="answer unmatched questions with a local model: a Hugging Face model "
+                             "already in the local cache, or 'stand-in' for a deterministic fake")
+    parser.add_argument("--metrics", action="store_true",
+                        help="collect rule hit counts and latency histograms (GET /metrics with --serve-http)")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="also dump the metrics in Prometheus text format to PATH (implies --metrics)")
+    parser.add_argument("--metrics-interval", type=float, default=60.0,
+                        help="seconds between --metrics-file dumps")
+    return parser.parse_args(argv)
+
+def make_metrics(args):
+    if not (args.metrics or args.metrics_file):
+        return None
+    from metrics import Metrics
+    metrics = Metrics()
+    if args.metrics_file:
+        metrics.start_dump(args.metrics_file, args.metrics_interval)
+    return metrics
+
+def make_model(args):
+    if not args.model:
+        return None
+    from model_backend import LazyModel, make_backend
+    return LazyModel(make_backend(args.model))
+
+def start_watcher(bot, args):
+    """Reload edited rules and answers in the long-running modes unless --no-reload"""
+    if args.no_reload:
+        return None
+    from knowledge_watcher import KnowledgeWatcher
+    return KnowledgeWatcher(bot, RELOAD_INTERVAL).start()
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics = make_metrics(args)
+    model = make_model(args)
+    if model is not None and not args.batch:
+        # Load in the background; rules answer until the model is ready
+        model.start()
+    history_file = None if args.no_history else HISTORY_FILE
+    if args.explain is not None:
+        if model is not None:
+            model.wait()
+        bot = FriendlyCodeChatbot(history_file=None, model=model)
+        print(json.dumps(bot.explain(args.explain), indent=2, ensure_ascii=False))
+        return
+    if args.search is not None:
+        # The window attaches the journal's archive, so archived turns are searched too
+        bot = FriendlyCodeChatbot(history_file=HISTORY_FILE, defer_history=True,
+                                  history_window=args.history_window,
+                                  history_backend=args.history_backend)
+        results, _ = bot.search_history(args.search)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    if args.serve_stdio:
+        from stdio_server import serve_stdio
+        bot = FriendlyCodeChatbot(history_file=history_file, metrics=metrics, model=model,
+                                  history_window=args.history_window,
+                                  history_backend=args.history_backend)
+        start_watcher(bot, args)
+        serve_stdio(bot, sys.stdin, sys.stdout, trace=args.trace)
+        return
+    if args.serve_http:
+        from http_server import serve_http
+        bot = FriendlyCodeChatbot(history_file=history_file, metrics=metrics, model=model,
+                                  history_window=args.history_window,
+                                  history_backend=args.history_backend)
+        start_watcher(bot, args)
+        serve_http(bot, args.host, args.port, workers=args.http_workers, queue_size=args.queue_size)
+        return
+    if args.batch:
+        from batch import open_input, open_output, run_batch
+        if model is not None:
+            # Every question should see the model, so wait for it here
+            model.start().wait()
+        bot = FriendlyCodeChatbot(history_file=history_file, metrics=metrics, model=model,
+                                  history_window=args.history_window,
+                                  history_backend=args.history_backend)
+        with open_input(args.batch) as input_file, open_output(args.output) as output_file:
+            count = run_batch(bot, input_file, output_file, field=args.field, workers=args.workers,
+                              chunksize=args.chunksize, record_history=not args.no_history,
+                              trace=args.trace)
+        print(f"Answered {count} questions", file=sys.stderr)
+        return
+    run_gui(metrics, model, args.history_window, reload=not args.no_reload,
+            history_backend=args.history_backend)
 
 if __name__ == "__main__":
     main()
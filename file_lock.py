@@ -0,0 +1,114 @@
+#  Advisory inter-process lock on a side file
+#  Several chatbot processes (one per workstation on a shared home directory)
+#  write the same history journal. They serialize on "<file>.lock" with
+#  fcntl.flock on POSIX and msvcrt.locking on Windows. The operating system
+#  drops the lock when its holder exits, so a crashed process never leaves a
+#  stale lock behind.
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+    _fcntl_available = True
+except ImportError:
+    _fcntl_available = False
+    import msvcrt
+
+
+class FileLock:
+    """Re-entrant advisory lock; shared (read) locks are only honoured on POSIX"""
+
+    def __init__(self, path, timeout=None, poll_interval=0.005):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._depth = 0
+        self._owner = threading.RLock()
+
+    @property
+    def locked(self):
+        return self._depth > 0
+
+    def acquire(self, shared=False):
+        """Block until the lock is held; raises TimeoutError after timeout seconds"""
+        self._owner.acquire()
+        if self._depth:
+            # Already held by this thread: a nested shared request keeps the outer mode
+            self._depth += 1
+            return self
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            while not self._try_lock(shared, blocking=deadline is None):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Could not lock {self.path} within {self.timeout}s")
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self._owner.release()
+            raise
+        self._depth = 1
+        return self
+
+    def _try_lock(self, shared, blocking):
+        if _fcntl_available:
+            flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(self._fd, flags if blocking else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        # msvcrt locks byte ranges from the current position: always byte 0.
+        # Its blocking mode gives up after ten seconds, so acquire() polls instead
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def release(self):
+        if not self._depth:
+            raise RuntimeError(f"{self.path} is not locked")
+        self._depth -= 1
+        if not self._depth:
+            if _fcntl_available:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        self._owner.release()
+
+    def shared(self):
+        """Context manager holding the lock in shared mode"""
+        return _SharedHold(self)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def close(self):
+        with self._owner:
+            if self._fd is not None and not self._depth:
+                os.close(self._fd)
+                self._fd = None
+
+
+class _SharedHold:
+    __slots__ = ("lock",)
+
+    def __init__(self, lock):
+        self.lock = lock
+
+    def __enter__(self):
+        return self.lock.acquire(shared=True)
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
@@ -0,0 +1,109 @@
+#  Typo-tolerant lookup of question words in the rule vocabulary
+#  SymSpell-style deletion index: every vocabulary word is stored under all the
+#  strings left after deleting up to max_edits(word) of its letters. A typed
+#  word is looked up the same way, so "pyhton" and "python" meet at "pyton"
+#  without comparing the word against the whole vocabulary. The few candidates
+#  that share a deletion are then checked with the real edit distance
+#  (optimal string alignment: a swap of two neighbouring letters is one edit).
+#
+#  Allowed edits grow with the length of the vocabulary word, so short
+#  keywords never match fuzzily:
+#      up to 4 letters   exact only   ("base" must not become "case")
+#      5 to 8 letters    1 edit       pyhton, fucntion, aray
+#      9 or more         2 edits      javscript, dictinary
+
+from itertools import combinations
+
+# (shortest length, allowed edits), longest first
+EDIT_LIMITS = ((9, 2), (5, 1))
+# Lookups remembered per index; the cache is simply emptied when it fills up
+LOOKUP_CACHE_SIZE = 4096
+
+
+def max_edits(word):
+    return _edits_for_length(len(word))
+
+
+def _edits_for_length(length):
+    for shortest, edits in EDIT_LIMITS:
+        if length >= shortest:
+            return edits
+    return 0
+
+
+def deletions(word, edits):
+    """All strings left after deleting up to edits letters of word, word itself included"""
+    found = {word}
+    for count in range(1, min(edits, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), count):
+            found.add("".join(c for i, c in enumerate(word) if i not in positions))
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class DeletionIndex:
+    """Maps a misspelled word to the closest vocabulary word within its edit limit"""
+
+    def __init__(self, vocabulary):
+        self.words = frozenset(vocabulary)
+        self._deletes = {}
+        self._cache = {}
+        for word in sorted(self.words):
+            for key in deletions(word, max_edits(word)):
+                self._deletes.setdefault(key, []).append(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, token):
+        """Closest vocabulary word to token within that word's edit limit, or None.
+
+        Ties go to the word with the smaller length difference, then
+        alphabetically, so the result never depends on dictionary order.
+        """
+        if token in self.words:
+            return token
+        # Deep enough for any word the token could be a misspelling of
+        edits = _edits_for_length(len(token) + EDIT_LIMITS[0][1])
+        if not edits:
+            return None
+        try:
+            return self._cache[token]
+        except KeyError:
+            pass
+        candidates = set()
+        for key in deletions(token, edits):
+            candidates.update(self._deletes.get(key, ()))
+        best = None
+        for word in candidates:
+            limit = max_edits(word)
+            if not limit:
+                continue
+            distance = edit_distance(token, word, limit)
+            if distance > limit:
+                continue
+            candidate = (distance, abs(len(word) - len(token)), word)
+            if best is None or candidate < best:
+                best = candidate
+        if len(self._cache) >= LOOKUP_CACHE_SIZE:
+            self._cache.clear()
+        word = self._cache[token] = best[2] if best else None
+        return word
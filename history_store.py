@@ -0,0 +1,714 @@
+#  Append-only chat history journal
+#  Each (question, answer) turn is one JSON line, so saving a turn costs one
+#  small write instead of re-serializing the whole history. A background
+#  compactor rewrites the file and swaps it in atomically once it has grown
+#  past a threshold. With an archive attached, compaction keeps only the
+#  newest keep_turns turns in the journal and spills the rest into rotated,
+#  compressed segments next to it.
+#
+#  Several processes may share one journal. Every write and every swap holds
+#  an advisory lock on "<journal>.lock"; a process notices that another one
+#  compacted (the path names a new file) and reopens before its next append,
+#  and compaction copies records other processes appended meanwhile.
+#
+#  Answers that are exactly a knowledge pack answer are not copied into every
+#  turn. The turn records a reference instead, and the text is stored once per
+#  file in a definition record ahead of the first reference:
+#      {"op": "answer", "r": "python_list", "v": "<pack fingerprint>", "a": "..."}
+#      {"q": "what is a list", "r": "python_list", "v": "<pack fingerprint>"}
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import weakref
+from collections import deque
+
+from file_lock import FileLock
+
+try:
+    import lzma
+    _lzma_available = True
+except ImportError:
+    _lzma_available = False
+
+DURABILITY_NONE = "none"    # leave records in the write buffer, the OS flushes eventually
+DURABILITY_BATCH = "batch"  # group commit: flush + fsync every batch_size records or flush_interval seconds
+DURABILITY_FSYNC = "fsync"  # flush + fsync after every record
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_BATCH, DURABILITY_FSYNC)
+
+# Journals still open at exit get closed (buffers flushed and synced). A weak
+# set, so a journal nobody closes can still be garbage collected before that
+_open_journals = weakref.WeakSet()
+
+
+def _close_open_journals():
+    for journal in list(_open_journals):
+        journal.close()
+
+
+atexit.register(_close_open_journals)
+
+# Windows cannot replace a file another process holds open, so there the
+# append handle is closed after every write (and batch commits become fsyncs)
+_KEEP_APPEND_HANDLE = os.name != "nt"
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+_CLEAR = {"op": "clear"}
+
+
+def _identity(stat):
+    return stat.st_dev, stat.st_ino
+
+
+def _turn(question, answer, session=None):
+    record = {"q": question, "a": answer}
+    if session is not None:
+        record["s"] = session
+    return record
+
+
+def _reference(question, key, session=None):
+    record = {"q": question, "r": key[0], "v": key[1]}
+    if session is not None:
+        record["s"] = session
+    return record
+
+
+def _definition(key, text):
+    return {"op": "answer", "r": key[0], "v": key[1], "a": text}
+
+
+def _encode_entries(entries):
+    """Encode parsed turns; references stay references"""
+    return b"".join(_encode(_turn(entry[0], entry[1]) if len(entry) == 2 else _reference(entry[0], entry[2]))
+                    for entry in entries)
+
+
+def _reference_keys(entries):
+    return [entry[2] for entry in entries if len(entry) == 3]
+
+
+def _encode_definitions(definitions, keys):
+    return b"".join(_encode(_definition(key, definitions[key])) for key in dict.fromkeys(keys)
+                    if key in definitions)
+
+
+def _entry(record):
+    if "r" in record:
+        return record["q"], None, (record["r"], record.get("v"))
+    return record["q"], record.get("a", "")
+
+
+def _decode_records(data):
+    """JSON records of journal bytes; returns (records, unreadable_lines)"""
+    body = data.strip()
+    if not body:
+        return [], 0
+    try:
+        # One parse of the whole file as an array is several times faster than
+        # a loads() per line; JSON strings never contain a raw newline
+        return json.loads(b"[" + body.replace(b"\n", b",") + b"]"), 0
+    except ValueError:
+        pass
+    records = []
+    garbage = 0
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A torn write from a crash only ever affects the line it was writing
+            garbage += 1
+    return records, garbage
+
+
+def _parse_lines(data):
+    """Replay journal bytes; returns (turns, definitions, garbage_lines).
+
+    A turn is a (question, answer) pair, or (question, None, key) when the
+    answer is a reference to definitions[key] or to the knowledge pack.
+    """
+    turns = []
+    definitions = {}
+    records, garbage = _decode_records(data)
+    append = turns.append
+    for record in records:
+        if not isinstance(record, dict):
+            garbage += 1
+            continue
+        # Turns first: they are nearly every record (this is _entry(), inlined)
+        if "q" in record:
+            if "r" in record:
+                append((record["q"], None, (record["r"], record.get("v"))))
+            else:
+                append((record["q"], record.get("a", "")))
+            continue
+        op = record.get("op")
+        if op == "clear":
+            garbage += len(turns) + 1
+            turns = []
+            append = turns.append
+        elif op == "answer":
+            definitions[(record.get("r"), record.get("v"))] = record.get("a", "")
+        else:
+            garbage += 1
+    return turns, definitions, garbage
+
+
+def search_words(query):
+    """Lower-case words of a search query"""
+    # Letters and digits only: the FTS5 tokenizer splits words at underscores too
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+def search_turns(turns, query, limit=20, before=None):
+    """(results, cursor) for a full scan of turns, like SqliteHistory.search().
+
+    Turn ids are positions in turns, counted from 1.
+    """
+    words = search_words(query)
+    if not words or limit <= 0:
+        return [], None
+    found = deque(maxlen=limit + 1)
+    for turn_id, (question, answer) in enumerate(turns, 1):
+        if before is not None and turn_id >= before:
+            break
+        text = f"{question}\n{answer}".lower()
+        if all(word in text for word in words):
+            found.append((turn_id, question, answer))
+    more = len(found) > limit
+    results = [{"id": turn_id, "time": None, "session": None, "question": question, "answer": answer}
+               for turn_id, question, answer in reversed(found)][:limit]
+    return results, results[-1]["id"] if more else None
+
+
+def load_legacy_history(path):
+    """Read the old chat_history.json format (one JSON array of pairs)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [tuple(pair) for pair in json.load(f)]
+
+
+def _lines_backwards(f, end, block_size=64 * 1024):
+    """Yield (offset, line) for the lines of f that lie before offset end, last first"""
+    pos = end
+    partial = b""  # start of the line being assembled; it begins further back
+    while pos > 0:
+        start = max(pos - block_size, 0)
+        f.seek(start)
+        parts = (f.read(pos - start) + partial).split(b"\n")
+        pos = start
+        partial = parts.pop(0)
+        offset = start + len(partial) + 1
+        offsets = []
+        for line in parts:
+            offsets.append(offset)
+            offset += len(line) + 1
+        for offset, line in zip(reversed(offsets), reversed(parts)):
+            yield offset, line
+    yield 0, partial
+
+
+class HistoryArchive:
+    """Numbered, compressed JSONL segments of turns spilled out of the journal"""
+
+    _SEGMENT_RE = re.compile(r"segment-(\d+)\.jsonl\.(gz|xz)$")
+
+    def __init__(self, directory, compression="gzip"):
+        if compression not in ("gzip", "lzma"):
+            raise ValueError(f"Unknown compression {compression!r}")
+        if compression == "lzma" and not _lzma_available:
+            raise ValueError("This Python was built without lzma support")
+        self.directory = directory
+        self.compression = compression
+
+    def segments(self):
+        """Segment paths, oldest first"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.jsonl.*")):
+            match = self._SEGMENT_RE.search(os.path.basename(path))
+            if match:
+                found.append((int(match.group(1)), path))
+        return [path for _, path in sorted(found)]
+
+    def compress(self, data):
+        if self.compression == "lzma":
+            return lzma.compress(data)
+        return gzip.compress(data)
+
+    def write_segment(self, compressed):
+        """Store already compressed segment bytes as the newest segment"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        number = int(self._SEGMENT_RE.search(segments[-1]).group(1)) + 1 if segments else 1
+        extension = "xz" if self.compression == "lzma" else "gz"
+        path = os.path.join(self.directory, f"segment-{number:06d}.jsonl.{extension}")
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def iter_turns(self, resolve=None):
+        """Stream the archived turns, oldest first, one segment open at a time.
+
+        Each segment carries the definitions of its references; resolve(key,
+        definitions) may look further (see HistoryJournal._answer_text).
+        """
+        for path in self.segments():
+            opener = lzma.open if path.endswith(".xz") else gzip.open
+            definitions = {}
+            with opener(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(record, dict):
+                        continue
+                    if record.get("op") == "answer":
+                        definitions[(record.get("r"), record.get("v"))] = record.get("a", "")
+                    elif "q" in record:
+                        entry = _entry(record)
+                        if len(entry) == 3:
+                            key = entry[2]
+                            entry = (entry[0], resolve(key, definitions) if resolve
+                                     else definitions.get(key, ""))
+                        yield entry
+
+    def clear(self):
+        for path in self.segments():
+            os.remove(path)
+
+
+class HistoryJournal:
+    """Append-only JSONL history file with configurable durability"""
+
+    # Session ids are written but never read back (see SqliteHistory)
+    sessions_indexed = False
+
+    def __init__(self, path, legacy_path=None, durability=DURABILITY_BATCH,
+                 batch_size=32, flush_interval=1.0, compact_threshold=1024 * 1024,
+                 archive=None, keep_turns=None, lock_timeout=10.0, answer_source=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode {durability!r}")
+        self.path = path
+        self.legacy_path = legacy_path
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        # HistoryArchive receiving everything but the newest keep_turns at compaction
+        self.archive = archive
+        self.keep_turns = keep_turns
+        # Callable returning the current KnowledgePack; its answers are stored as references
+        self.answer_source = answer_source
+        self._texts = {}          # (rule_id, version) -> answer text, one string per answer
+        self._defined = set()     # keys with a definition in the file our handle points at
+        self._defined_for = None  # identity of that file
+        self._lock = threading.Lock()
+        # Always taken inside self._lock, never the other way round
+        self._file_lock = FileLock(path + ".lock", timeout=lock_timeout)
+        self._file = None
+        self._pending = 0
+        self._appended_bytes = 0
+        self._compactor = None
+        self._flusher = None
+        self._generation = 0
+        _open_journals.add(self)
+
+    # Reading
+
+    def load(self):
+        """Return all turns, converting a legacy JSON history on first use"""
+        with self._lock:
+            self._flush_locked()
+            with self._file_lock.shared():
+                data = self._read_bytes()
+        if data is None:
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                return self._import_legacy(load_legacy_history(self.legacy_path))
+            return []
+        if data.lstrip()[:1] == b"[":
+            # The journal file itself still holds the legacy JSON array
+            return self._import_legacy([tuple(pair) for pair in json.loads(data.decode("utf-8"))])
+        turns, definitions, _ = _parse_lines(data)
+        return self._resolve(turns, definitions)
+
+    def _import_legacy(self, turns):
+        """Write converted legacy turns, unless another process converted them first"""
+        data, definitions = self._encode_turns(turns)
+        with self._lock:
+            with self._file_lock:
+                current = self._read_bytes()
+                if current is None or current.lstrip()[:1] == b"[":
+                    self._swap_locked(_encode_definitions(definitions, definitions) + data, definitions)
+                    return turns
+        turns, definitions, _ = _parse_lines(current)
+        return self._resolve(turns, definitions)
+
+    def iter_all(self):
+        """Every turn, archived segments first; only one segment is decompressed at a time"""
+        if self.archive is not None:
+            yield from self.archive.iter_turns(self._answer_text)
+        yield from self.load()
+
+    def search(self, query, limit=20, before=None, session=None):
+        """Newest turns containing every word of query; a full scan (SqliteHistory has an index)"""
+        if session is not None:
+            return [], None  # sessions are not read back from the journal
+        return search_turns(self.iter_all(), query, limit, before)
+
+    def _resolve(self, entries, definitions):
+        """(question, answer) pairs for parsed entries; turns with the same answer share its string"""
+        texts = {}
+        resolved = []
+        append = resolved.append
+        for entry in entries:
+            if len(entry) == 2:
+                append(entry)
+                continue
+            text = texts.get(entry[2])
+            if text is None:
+                text = texts[entry[2]] = self._answer_text(entry[2], definitions)
+            append((entry[0], text))
+        return resolved
+
+    def _answer_text(self, key, definitions=None):
+        text = self._texts.get(key)
+        if text is not None:
+            return text
+        text = definitions.get(key) if definitions else None
+        if text is None:
+            pack = self.answer_source() if self.answer_source is not None else None
+            if pack is not None and pack.fingerprint == key[1] and pack.has_answer(key[0]):
+                text = pack.answer(key[0])
+        if text is None:
+            # A tail page that starts after the definition: look it up once
+            text = self._scan_definitions().get(key)
+        if text is None:
+            return f"[The {key[0]} answer of knowledge version {key[1]} is no longer available]"
+        self._texts[key] = text
+        return text
+
+    def _scan_definitions(self):
+        with self._lock:
+            self._flush_locked()
+            with self._file_lock.shared():
+                data = self._read_bytes() or b""
+        definitions = {}
+        for line in data.splitlines():
+            if line.startswith(b'{"op": "answer"'):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                definitions[(record.get("r"), record.get("v"))] = record.get("a", "")
+        return definitions
+
+    def load_tail(self, limit):
+        """Return (turns, cursor) for the last limit turns.
+
+        Only the end of the file is read, so the cost depends on limit rather
+        than on the length of the history. cursor pages further back with
+        load_before() and is None once there is nothing older.
+        """
+        f, version, size = self._open_current_file()
+        if f is None:
+            return self.load()[-limit:], None
+        with f:
+            first = f.read(64).lstrip()[:1]
+            if first == b"[":
+                # Still the legacy JSON array: load() converts it
+                return self.load()[-limit:], None
+            return self._read_back(f, version, size, limit)
+
+    def load_before(self, cursor, limit, newer=0):
+        """Return (turns, cursor) for up to limit turns older than cursor.
+
+        A rewrite or compaction since the cursor was handed out (by any
+        process) moves every offset; the older turns are then found by
+        counting back past the newer turns the caller already holds.
+        """
+        if cursor is None:
+            return [], None
+        version, offset = cursor
+        f, current, _ = self._open_current_file()
+        if f is None or version != current:
+            if f is not None:
+                f.close()
+            turns = self.load()
+            return turns[:max(len(turns) - newer, 0)], None
+        with f:
+            return self._read_back(f, version, offset, limit)
+
+    def _open_current_file(self, exclusive=False):
+        """Return (file, version, size) for the journal as it is now, or (None, None, 0).
+
+        Nothing below size changes while the file is open: appends only add
+        to the end, and a swap puts a new file at the path instead.
+        """
+        with self._lock:
+            self._flush_locked()
+            with (self._file_lock if exclusive else self._file_lock.shared()):
+                try:
+                    f = open(self.path, "rb")
+                except FileNotFoundError:
+                    return None, None, 0
+                stat = os.fstat(f.fileno())
+                return f, (self._generation, _identity(stat)), stat.st_size
+
+    def _read_back(self, f, version, end, limit):
+        turns = []
+        definitions = {}
+        cursor = None
+        if limit <= 0:
+            return turns, (version, end)
+        for offset, line in _lines_backwards(f, end):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            op = record.get("op")
+            if op == "clear":
+                # Nothing before a clear marker belongs to the history any more
+                break
+            if op == "answer":
+                definitions[(record.get("r"), record.get("v"))] = record.get("a", "")
+            elif "q" in record:
+                turns.append(_entry(record))
+                if len(turns) == limit:
+                    cursor = (version, offset) if offset > 0 else None
+                    break
+        turns.reverse()
+        return self._resolve(turns, definitions), cursor
+
+    def _read_bytes(self):
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    # Writing
+
+    def append(self, question, answer):
+        self.extend([(question, answer)])
+
+    def extend(self, turns, session=None):
+        """Append several turns with a single write, optionally tagged with a session id"""
+        data, definitions = self._encode_turns(turns, session)
+        if data:
+            self._write(data, len(turns), definitions=definitions)
+
+    def _encode_turns(self, turns, session=None):
+        """Encode turns, knowledge pack answers as references; returns (data, {key: text})"""
+        pack = self.answer_source() if self.answer_source is not None else None
+        records = []
+        definitions = {}
+        for question, answer in turns:
+            rule_id = pack.rule_for_answer(answer) if pack is not None else None
+            if rule_id is None:
+                records.append(_encode(_turn(question, answer, session)))
+            else:
+                key = (rule_id, pack.fingerprint)
+                definitions[key] = answer
+                records.append(_encode(_reference(question, key, session)))
+        return b"".join(records), definitions
+
+    def clear(self):
+        """Record that the history was cleared; old turns are dropped at compaction"""
+        self._write(_encode(_CLEAR), 1, clear_archive=self.archive is not None)
+
+    def _write(self, data, records, clear_archive=False, definitions=None):
+        with self._lock:
+            with self._file_lock:
+                self._open_current()
+                missing = [key for key in definitions or () if key not in self._defined]
+                if missing:
+                    # Definitions go in the same write as the first turns referring to them
+                    data = _encode_definitions(definitions, missing) + data
+                    self._defined.update(missing)
+                self._file.write(data)
+                self._pending += records
+                self._appended_bytes += len(data)
+                if self.durability == DURABILITY_FSYNC or not _KEEP_APPEND_HANDLE:
+                    self._flush_locked()
+                else:
+                    # Out of our buffer while the lock is held: another process may compact next
+                    self._file.flush()
+                if not _KEEP_APPEND_HANDLE:
+                    self._file.close()
+                    self._file = None
+                if clear_archive:
+                    self.archive.clear()
+                    # A compaction already under way must not spill pre-clear turns
+                    self._generation += 1
+            if self.durability == DURABILITY_BATCH and self._pending:
+                if self._pending >= self.batch_size:
+                    self._flush_locked()
+                else:
+                    self._start_flusher()
+            should_compact = self._appended_bytes >= self.compact_threshold
+        if should_compact:
+            self.compact_in_background()
+
+    def _open_current(self):
+        """Make sure the append handle points at the file now at self.path; file lock held"""
+        if self._file is not None:
+            try:
+                current = _identity(os.stat(self.path))
+            except FileNotFoundError:
+                current = None
+            if current == _identity(os.fstat(self._file.fileno())):
+                return
+            # Another process swapped in a compacted file, which already holds
+            # everything we wrote (our buffer is flushed before the lock is released)
+            self._file.close()
+            self._file = None
+            self._pending = 0
+        self._open_for_append()
+        identity = _identity(os.fstat(self._file.fileno()))
+        if identity != self._defined_for:
+            self._defined = set()
+            self._defined_for = identity
+
+    def _open_for_append(self):
+        self._file = open(self.path, "ab")
+        # Terminate a line torn by a crash so the next record stays readable
+        if self._file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.durability != DURABILITY_NONE and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def _start_flusher(self):
+        # One timer thread per batch window makes sure stragglers get committed
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Timer(self.flush_interval, self.flush)
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def rewrite(self, turns):
+        """Atomically replace the journal with exactly these turns.
+
+        Turns other processes appended are dropped; compact() keeps them.
+        """
+        data, definitions = self._encode_turns(turns)
+        with self._lock:
+            with self._file_lock:
+                self._swap_locked(_encode_definitions(definitions, definitions) + data, definitions)
+
+    def _swap_locked(self, data, defined=()):
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Close our handle first: Windows cannot replace a file that is open
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(tmp_path, self.path)
+        self._defined = set(defined)
+        self._defined_for = _identity(os.stat(self.path))
+        self._generation += 1
+        self._pending = 0
+        self._appended_bytes = 0
+
+    # Compaction
+
+    def compact(self):
+        """Rewrite the journal without cleared turns or torn lines"""
+        # The size is read with the writer lock held, so no append (from any
+        # process) is halfway through; later appends are copied over verbatim below
+        f, version, size = self._open_current_file(exclusive=True)
+        if f is None:
+            return
+        # The bulk of the work happens without the locks
+        with f:
+            snapshot = f.read(size)
+        turns, definitions, _ = _parse_lines(snapshot)
+        spilled = None
+        if self.archive is not None and self.keep_turns is not None and len(turns) > self.keep_turns:
+            cut = len(turns) - self.keep_turns
+            # Every segment carries the definitions its references need
+            spilled = self.archive.compress(_encode_definitions(definitions, _reference_keys(turns[:cut]))
+                                            + _encode_entries(turns[:cut]))
+            turns = turns[cut:]
+        compacted = _encode_entries(turns)
+        with self._lock:
+            with self._file_lock:
+                try:
+                    current = (self._generation, _identity(os.stat(self.path)))
+                except FileNotFoundError:
+                    return
+                if current != version:
+                    return  # the file was rewritten in the meantime
+                with open(self.path, "rb") as f:
+                    f.seek(size)
+                    tail = f.read()
+                if _encode(_CLEAR).rstrip() in tail.splitlines():
+                    # Another process cleared the history: nothing before the marker survives
+                    turns, compacted, spilled = [], b"", None
+                if spilled is not None:
+                    # Segment first: a crash in between duplicates turns instead of losing them
+                    self.archive.write_segment(spilled)
+                # Definitions for the references kept and for those appended meanwhile
+                keys = _reference_keys(turns) + _reference_keys(_parse_lines(tail)[0])
+                self._swap_locked(_encode_definitions(definitions, keys) + compacted + tail, keys)
+
+    def compact_in_background(self):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._compact_quietly, daemon=True)
+            self._compactor.start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print("Error compacting history:", e)
+
+    def wait_for_compaction(self, timeout=None):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join(timeout)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked()
+                self._file.close()
+                self._file = None
+            self._file_lock.close()
+        _open_journals.discard(self)
+        if self._flusher is not None:
+            self._flusher.cancel()
@@ -0,0 +1,309 @@
+#  Local HTTP/JSON service for the chatbot (asyncio, standard library only)
+#  bash: python -m coder_chatbot --serve-http --port 8765
+#
+#  POST /ask      {"question": "...", "session": "optional id"}
+#                 -> {"answer": "...", "rule": "...", "session": "..."}
+#  GET  /history?session=ID&limit=N            (&before=ID to page back with the SQLite backend)
+#  GET  /search?q=WORDS&limit=N&before=ID&session=ID
+#                 -> {"results": [{"id", "time", "session", "question", "answer"}, ...], "next": ID}
+#                 newest saved turns containing every word; "next" is the before= of the next page
+#  GET  /health
+#  GET  /metrics  Prometheus text (start with --metrics to collect anything)
+#
+#  Connections are kept alive between requests. Questions wait in a bounded
+#  queue served by a fixed number of workers; when the queue is full the
+#  server answers 503 right away. Identical questions that are already being
+#  answered share one computation, and every session keeps its own history.
+
+import asyncio
+import json
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from response_cache import normalize_question
+
+MAX_BODY_SIZE = 64 * 1024
+IDLE_TIMEOUT = 30.0
+# Most turns or search results one /history or /search page returns
+MAX_PAGE_SIZE = 200
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class SessionStore:
+    """Per-session history windows, least recently used sessions dropped first"""
+
+    def __init__(self, max_sessions=1000, max_turns=200):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        turns = self._sessions.get(session_id)
+        if turns is None:
+            turns = self._sessions[session_id] = deque(maxlen=self.max_turns)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return turns
+
+    def peek(self, session_id):
+        return self._sessions.get(session_id, ())
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class ChatServer:
+    def __init__(self, bot, host="127.0.0.1", port=8765, workers=4, queue_size=64,
+                 max_sessions=1000):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.workers = workers
+        # asyncio treats maxsize 0 as unbounded, so always keep a real bound
+        self.queue_size = max(1, queue_size)
+        self.sessions = SessionStore(max_sessions)
+        self._queue = None
+        self._in_flight = {}
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="chat-worker")
+        self._server = None
+        self._worker_tasks = []
+
+    # Lifecycle
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving on http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    # Answering
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            question, future = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(self._executor, self.bot.respond, question)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def answer(self, question):
+        """Return (answer, rule_id), sharing work with identical in-flight questions"""
+        # Very short inputs get their own answer, so keep them apart
+        key = (normalize_question(question), len(question.strip()) <= 2)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self._queue.put_nowait((question, future))
+            except asyncio.QueueFull:
+                raise HttpError(503, "Server busy, try again later", {"Retry-After": "1"})
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _record(self, session_id, question, answer):
+        self.sessions.get(session_id).append((question, answer))
+        journal = self.bot.journal
+        if journal is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, journal.extend, [(question, answer)], session_id)
+
+    # HTTP plumbing
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HttpError as e:
+                    await self._send(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = self._keep_alive(headers)
+                try:
+                    status, payload, extra = await self._route(method, target, headers, body)
+                except HttpError as e:
+                    status, payload, extra = e.status, {"error": str(e)}, e.headers
+                except Exception as e:
+                    status, payload, extra = 500, {"error": f"Sorry, I encountered an error: {e}"}, {}
+                await self._send(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {"_version": version}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    def _keep_alive(headers):
+        connection = headers.get("connection", "").lower()
+        if headers["_version"] == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def _send(self, writer, status, payload, keep_alive, extra_headers=None):
+        # A str payload is sent as plain text, anything else as JSON
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        headers = {
+            "Content-Type": content_type,
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        headers.update(extra_headers or {})
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _route(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == "/health":
+            return 200, {"status": "ok", "queued": self._queue.qsize(),
+                         "in_flight": len(self._in_flight), "sessions": len(self.sessions)}, {}
+        if url.path == "/metrics":
+            return 200, self.bot.metrics.render_prometheus(), {}
+        if url.path == "/ask":
+            if method != "POST":
+                raise HttpError(405, "Use POST /ask", {"Allow": "POST"})
+            try:
+                request = json.loads(body.decode("utf-8") or "{}")
+            except ValueError:
+                raise HttpError(400, "Body must be JSON")
+            question = request.get("question") if isinstance(request, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                raise HttpError(400, "Missing 'question'")
+            session_id = str(request.get("session") or headers.get("x-session-id") or uuid.uuid4().hex)
+            answer, rule_id = await self.answer(question)
+            await self._record(session_id, question, answer)
+            return 200, {"answer": answer, "rule": rule_id, "session": session_id}, {}
+        if url.path == "/history":
+            session_id = (query.get("session") or [headers.get("x-session-id")])[0]
+            if not session_id:
+                raise HttpError(400, "Missing 'session'")
+            try:
+                limit = min(int((query.get("limit") or ["50"])[0]), MAX_PAGE_SIZE)
+            except ValueError:
+                raise HttpError(400, "'limit' must be a number")
+            before = (query.get("before") or [None])[0]
+            journal = self.bot.journal
+            if journal is not None and journal.sessions_indexed:
+                # Saved sessions outlive the server; page back with before=<next>
+                try:
+                    before = int(before) if before else None
+                except ValueError:
+                    raise HttpError(400, "'before' must be a number")
+                loop = asyncio.get_running_loop()
+                if before is None:
+                    turns, cursor = await loop.run_in_executor(
+                        self._executor, lambda: journal.load_tail(limit, session=session_id))
+                else:
+                    turns, cursor = await loop.run_in_executor(
+                        self._executor, lambda: journal.load_before(before, limit, session=session_id))
+            else:
+                turns = list(self.sessions.peek(session_id))[-limit:] if limit > 0 else []
+                cursor = None
+            return 200, {"session": session_id, "next": cursor,
+                         "history": [{"question": q, "answer": a} for q, a in turns]}, {}
+        if url.path == "/search":
+            words = (query.get("q") or [""])[0]
+            if not words.strip():
+                raise HttpError(400, "Missing 'q'")
+            try:
+                limit = min(int((query.get("limit") or ["20"])[0]), MAX_PAGE_SIZE)
+                before = int(query["before"][0]) if query.get("before") else None
+            except ValueError:
+                raise HttpError(400, "'limit' and 'before' must be numbers")
+            session_id = (query.get("session") or [None])[0]
+            # Off the event loop: a journal is searched by a full scan
+            loop = asyncio.get_running_loop()
+            results, cursor = await loop.run_in_executor(
+                self._executor, self.bot.search_history, words, limit, before, session_id)
+            return 200, {"results": results, "next": cursor}, {}
+        raise HttpError(404, f"No route for {url.path}")
+
+
+def serve_http(bot, host="127.0.0.1", port=8765, workers=4, queue_size=64):
+    server = ChatServer(bot, host, port, workers=workers, queue_size=queue_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if bot.journal is not None:
+            bot.journal.flush()
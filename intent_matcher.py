@@ -0,0 +1,251 @@
+#  Compiled keyword matcher for the smart response rules
+#  Questions are tokenized once and walked through a word-level trie, so the
+#  cost of matching grows with the question length instead of the rule count.
+#  explain() runs the same decision and reports every rule it considered.
+#  When no rule matches, or only a parent whose children might have been
+#  misspelled, unknown words are corrected against the keyword vocabulary
+#  (fuzzy_match.DeletionIndex) and the question is matched again, provided a
+#  correction can reach a different rule.
+
+import re
+import time
+
+from fuzzy_match import DeletionIndex
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens (punctuation is ignored)"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _variants(token):
+    # Exact token first, then naive singular forms so "loops" hits "loop"
+    yield token
+    if len(token) > 3 and token.endswith("es"):
+        yield token[:-2]
+    if len(token) > 2 and token.endswith("s"):
+        yield token[:-1]
+
+
+class Rule:
+    """A single response rule.
+
+    Top-level rules are tried by ascending priority. When a rule has children,
+    the first matching child (by priority) wins; otherwise the rule itself wins,
+    unless it is a fallthrough rule, in which case matching moves on.
+    """
+
+    def __init__(self, rule_id, keywords, priority=0, parent=None,
+                 max_words=None, fallthrough=False):
+        self.rule_id = rule_id
+        self.keywords = list(keywords)
+        self.priority = priority
+        self.parent = parent
+        self.max_words = max_words
+        self.fallthrough = fallthrough
+
+    def __repr__(self):
+        return f"Rule({self.rule_id!r}, priority={self.priority})"
+
+
+def _step(rule, keyword, outcome, reason):
+    return {"rule": rule.rule_id, "priority": rule.priority, "parent": rule.parent,
+            "keyword": keyword, "outcome": outcome, "reason": reason}
+
+
+class IntentMatcher:
+    """Matches a question against a set of rules in a single pass"""
+
+    _END = object()
+
+    def __init__(self, rules, fuzzy=True):
+        self.rules = {}
+        self.children = {}
+        self.vocabulary = set()
+        self._trie = {}
+        for rule in rules:
+            self.rules[rule.rule_id] = rule
+        for rule in self.rules.values():
+            if rule.parent is not None:
+                if rule.parent not in self.rules:
+                    raise ValueError(f"Rule {rule.rule_id!r} has unknown parent {rule.parent!r}")
+                self.children.setdefault(rule.parent, []).append(rule)
+            for keyword in rule.keywords:
+                self._add_keyword(keyword, rule)
+        # Words of the children's keywords, by parent: all a correction can still add once the parent matched
+        self._child_words = {}
+        for parent, siblings in self.children.items():
+            siblings.sort(key=lambda r: r.priority)
+            self._child_words[parent] = frozenset(
+                token for child in siblings for keyword in child.keywords for token in tokenize(keyword))
+        self._fuzzy = DeletionIndex(self.vocabulary) if fuzzy else None
+
+    def _add_keyword(self, keyword, rule):
+        node = self._trie
+        for token in tokenize(keyword):
+            self.vocabulary.add(token)
+            node = node.setdefault(token, {})
+        node.setdefault(self._END, []).append((keyword, rule))
+
+    def scan(self, tokens):
+        """Return {rule_id: keyword} for every rule whose keyword occurs in tokens"""
+        hits = {}
+        end = self._END
+        for start in range(len(tokens)):
+            nodes = [self._trie]
+            for token in tokens[start:]:
+                next_nodes = []
+                for node in nodes:
+                    for variant in _variants(token):
+                        child = node.get(variant)
+                        if child is not None:
+                            next_nodes.append(child)
+                            for keyword, rule in child.get(end, ()):
+                                hits.setdefault(rule.rule_id, keyword)
+                if not next_nodes:
+                    break
+                nodes = next_nodes
+        return hits
+
+    def correct(self, tokens, targets=None):
+        """Replace misspelled tokens by the closest keyword word; returns (tokens, {typo: word}).
+
+        Only words outside the vocabulary are looked up; with targets, only
+        corrections to one of those words are made.
+        """
+        corrections = {}
+        if self._fuzzy is None:
+            return tokens, corrections
+        corrected = []
+        for token in tokens:
+            word = None
+            if not any(variant in self.vocabulary for variant in _variants(token)):
+                for variant in _variants(token):
+                    word = self._fuzzy.lookup(variant)
+                    if word is not None:
+                        break
+            if word is not None and (targets is None or word in targets):
+                corrections[token] = word
+                token = word
+            corrected.append(token)
+        return corrected, corrections
+
+    def match(self, question):
+        """Return the winning Rule for a question, or None"""
+        tokens = tokenize(question)
+        rule = self.match_tokens(tokens, self.scan(tokens))
+        # Questions that found their specific rule never pay for the typo lookup
+        if self._needs_correction(rule):
+            corrected = self._match_corrected(tokens, rule)
+            if corrected is not None:
+                rule = corrected[0]
+        return rule
+
+    def _needs_correction(self, rule):
+        return self._fuzzy is not None and (rule is None or rule.rule_id in self.children)
+
+    def _match_corrected(self, tokens, rule, trace=None):
+        # (rule, tokens, hits, corrections) after typo correction, or None if that changes nothing.
+        # An exact match may only be narrowed down to one of its children, never replaced,
+        # so only words of its children's keywords are worth correcting to
+        targets = None if rule is None else self._child_words[rule.rule_id]
+        corrected, corrections = self.correct(tokens, targets)
+        if not corrections:
+            return None
+        hits = self.scan(corrected)
+        better = self.match_tokens(corrected, hits, trace)
+        if better is None or (rule is not None and better.parent != rule.rule_id):
+            return None
+        return better, corrected, hits, corrections
+
+    def match_tokens(self, tokens, hits, trace=None):
+        """Pick the winner among the rules scan() hit; trace collects one step per rule considered"""
+        word_count = len(tokens)
+        roots = sorted(
+            (self._root(rule_id) for rule_id in hits),
+            key=lambda r: r.priority,
+        )
+        seen = set()
+        for rule in roots:
+            if rule.rule_id in seen:
+                continue
+            seen.add(rule.rule_id)
+            if rule.rule_id not in hits:
+                if trace is not None:
+                    trace.append(_step(rule, None, "skipped", "only keywords of its children matched"))
+                continue
+            if rule.max_words is not None and word_count > rule.max_words:
+                if trace is not None:
+                    trace.append(_step(rule, hits[rule.rule_id], "skipped",
+                                       f"{word_count} words, at most {rule.max_words} allowed"))
+                continue
+            for child in self.children.get(rule.rule_id, ()):
+                if child.rule_id in hits:
+                    if trace is not None:
+                        trace.append(_step(rule, hits[rule.rule_id], "matched", "a child narrows it down"))
+                        trace.append(_step(child, hits[child.rule_id], "won",
+                                           f"first matching child of {rule.rule_id!r}"))
+                    return child
+            if not rule.fallthrough:
+                if trace is not None:
+                    trace.append(_step(rule, hits[rule.rule_id], "won", "lowest priority value among the matches"))
+                return rule
+            if trace is not None:
+                trace.append(_step(rule, hits[rule.rule_id], "fell through", "no child matched"))
+        return None
+
+    def explain(self, question):
+        """Match a question and report how the winner was chosen.
+
+        Returns a JSON-friendly dict: the tokens, every rule whose keyword
+        occurs ("hits"), one step per rule in the order it was considered
+        (matching rules that a higher-priority winner kept from being
+        reached are "shadowed"), the winner and the time spent scanning and
+        deciding. When the question only matched after typo correction,
+        tokens, hits and steps describe the corrected question and
+        "corrections" maps each misspelled word to its replacement.
+        """
+        start = time.perf_counter()
+        tokens = tokenize(question)
+        hits = self.scan(tokens)
+        scanned = time.perf_counter()
+        steps = []
+        rule = self.match_tokens(tokens, hits, steps)
+        decided = time.perf_counter()
+        corrections = {}
+        if self._needs_correction(rule):
+            corrected_steps = []
+            corrected = self._match_corrected(tokens, rule, corrected_steps)
+            if corrected is not None:
+                rule, tokens, hits, corrections = corrected
+                steps = corrected_steps
+        fuzzy = time.perf_counter()
+        outcomes = {step["rule"]: step["outcome"] for step in steps}
+        # Matches the decision never reached, in the order it would have tried them
+        unreached = sorted((rule_id for rule_id in hits if rule_id not in outcomes),
+                           key=lambda rule_id: (self._root(rule_id).priority, self.rules[rule_id].priority))
+        for rule_id in unreached:
+            keyword = hits[rule_id]
+            parent = self.rules[rule_id].parent
+            if parent is not None and parent not in hits:
+                steps.append(_step(self.rules[rule_id], keyword, "skipped", f"its parent {parent!r} did not match"))
+            elif parent is not None and outcomes.get(parent) == "skipped":
+                steps.append(_step(self.rules[rule_id], keyword, "skipped", f"its parent {parent!r} was skipped"))
+            else:
+                steps.append(_step(self.rules[rule_id], keyword, "shadowed", f"{rule.rule_id!r} won first"))
+        return {
+            "tokens": tokens,
+            "corrections": corrections,
+            "hits": hits,
+            "steps": steps,
+            "winner": rule.rule_id if rule else None,
+            "seconds": {"scan": scanned - start, "decide": decided - scanned, "fuzzy": fuzzy - decided},
+        }
+
+    def _root(self, rule_id):
+        rule = self.rules[rule_id]
+        while rule.parent is not None:
+            rule = self.rules[rule.parent]
+        return rule
@@ -0,0 +1,285 @@
+#  Knowledge pack: the rules and canned answers behind get_smart_response
+#
+#  Source layout (editable):
+#      knowledge/pack.json        rule metadata (keywords, priority, parent, answer path)
+#      knowledge/answers/*.md     one answer body per rule
+#
+#  Compiled layout (knowledge/pack.bin, rebuilt automatically when stale):
+#      [answer bodies, utf-8, back to back][marshal header][trailer]
+#  The trailer holds the header offset, so only the small header is decoded at
+#  load time and answer bodies are sliced out of an mmap when a rule fires.
+#  The header also records the size and mtime of every answer file, so a
+#  recompile only reads the files that changed and copies the rest from the
+#  previous pack.
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+
+from intent_matcher import IntentMatcher, Rule
+
+PACK_FORMAT = 1
+DEFAULT_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
+COMPILED_NAME = "pack.bin"
+
+_MAGIC = b"FCKP"
+_TRAILER = struct.Struct("<4sIQ")
+
+
+class KnowledgePackError(Exception):
+    """Raised when a knowledge pack cannot be read or compiled"""
+
+
+def _file_stamp(st):
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _path_stamp(path):
+    try:
+        return _file_stamp(os.stat(path))
+    except OSError:
+        return None
+
+
+def source_files(source_dir):
+    """{relative path: "size:mtime"} for pack.json and the answer files, in a stable order"""
+    files = {}
+    try:
+        files["pack.json"] = _file_stamp(os.stat(os.path.join(source_dir, "pack.json")))
+    except OSError:
+        pass
+    answers_dir = os.path.join(source_dir, "answers")
+    try:
+        entries = sorted(os.scandir(answers_dir), key=lambda e: e.name)
+    except OSError:
+        entries = []
+    for entry in entries:
+        try:
+            if entry.is_file():
+                files[f"answers/{entry.name}"] = _file_stamp(entry.stat())
+        except OSError:
+            continue
+    return files
+
+
+def source_stamp(source_dir, files=None):
+    """Cheap change detector for a source pack (names, sizes and mtimes only)"""
+    if files is None:
+        files = source_files(source_dir)
+    digest = hashlib.sha1()
+    for path, stamp in files.items():
+        digest.update(f"{path}:{stamp};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_answer(source_dir, relative_path):
+    with open(os.path.join(source_dir, relative_path), "r", encoding="utf-8") as f:
+        text = f.read()
+    # Answer files end with a newline that is not part of the answer
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text
+
+
+def compile_pack(source_dir=DEFAULT_PACK_DIR, previous=None):
+    """Compile a source pack into the binary format and return it as bytes.
+
+    Answer files whose size and mtime match those recorded in previous (an
+    earlier KnowledgePack of the same sources) are copied from it instead of
+    being read again.
+    """
+    reusable = previous.answer_files if previous is not None else {}
+    try:
+        with open(os.path.join(source_dir, "pack.json"), "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise KnowledgePackError(f"Cannot read pack.json in {source_dir}: {e}") from e
+    if spec.get("format") != PACK_FORMAT:
+        raise KnowledgePackError(f"Unsupported pack format {spec.get('format')!r}")
+
+    files = source_files(source_dir)
+    pack_stamp = source_stamp(source_dir, files)
+    body = bytearray()
+    rules = []
+    answer_files = {}
+    fingerprint = hashlib.sha1()
+    for entry in spec.get("rules", []):
+        rule_id = entry["id"]
+        offset, length = -1, 0
+        relative_path = entry.get("answer")
+        if relative_path:
+            try:
+                stamp = files.get(relative_path) or _file_stamp(os.stat(os.path.join(source_dir, relative_path)))
+                known = reusable.get(relative_path)
+                if known is not None and known[0] == stamp:
+                    data = previous.answer_bytes(known[1], known[2])
+                else:
+                    data = _read_answer(source_dir, relative_path).encode("utf-8")
+            except OSError as e:
+                raise KnowledgePackError(f"Missing answer for rule {rule_id!r}: {e}") from e
+            offset, length = len(body), len(data)
+            answer_files[relative_path] = (stamp, offset, length)
+            body += data
+            fingerprint.update(data)
+        rules.append((
+            rule_id, list(entry.get("keywords", [])), entry.get("priority", 0),
+            entry.get("parent"), entry.get("max_words"), offset, length,
+        ))
+    fingerprint.update(marshal.dumps(rules))
+    header = marshal.dumps({
+        "format": PACK_FORMAT,
+        "name": spec.get("name", ""),
+        "version": spec.get("version", 0),
+        "fingerprint": fingerprint.hexdigest()[:16],
+        "source_stamp": pack_stamp,
+        "answer_files": answer_files,
+        "rules": rules,
+    })
+    return bytes(body) + header + _TRAILER.pack(_MAGIC, PACK_FORMAT, len(body))
+
+
+def write_compiled(data, path):
+    """Atomically replace the compiled pack at path"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _rule_shape(rules):
+    # Everything the matcher depends on; answer offsets only matter to answer()
+    return [(rule_id, keywords, priority, parent, max_words, offset < 0)
+            for rule_id, keywords, priority, parent, max_words, offset, _ in rules]
+
+
+class KnowledgePack:
+    """A loaded knowledge pack; answer bodies are decoded only on request"""
+
+    def __init__(self, data, source_dir=None):
+        if len(data) < _TRAILER.size:
+            raise KnowledgePackError("Compiled pack is truncated")
+        magic, fmt, header_offset = _TRAILER.unpack(data[-_TRAILER.size:])
+        if magic != _MAGIC or fmt != PACK_FORMAT:
+            raise KnowledgePackError("Not a compiled knowledge pack")
+        header = marshal.loads(data[header_offset:len(data) - _TRAILER.size])
+        self._data = data
+        self.source_dir = source_dir
+        # Size and mtime of the compiled file this pack was read from, if any
+        self.compiled_stamp = None
+        self.name = header["name"]
+        self.version = header["version"]
+        self.fingerprint = header["fingerprint"]
+        self.source_stamp = header["source_stamp"]
+        # {answer path: (file stamp, offset, length)}; missing in packs compiled before it existed
+        self.answer_files = header.get("answer_files", {})
+        self._rule_spec = header["rules"]
+        self._offsets = {}
+        self.rules = []
+        for rule_id, keywords, priority, parent, max_words, offset, length in header["rules"]:
+            self._offsets[rule_id] = (offset, length)
+            self.rules.append(Rule(rule_id, keywords, priority, parent, max_words,
+                                   fallthrough=offset < 0))
+        self._matcher = None
+        self._answers = {}
+        self._answer_rules = None
+
+    @classmethod
+    def load(cls, source_dir=DEFAULT_PACK_DIR, compiled_path=None, previous=None):
+        """Load the compiled pack, recompiling it first if the sources changed.
+
+        A recompile reuses the unchanged answers of the stale compiled pack,
+        or of previous (the pack currently in use) when given, and keeps
+        previous's matcher if the rules themselves did not change.
+        """
+        if compiled_path is None:
+            compiled_path = os.path.join(source_dir, COMPILED_NAME)
+        has_source = os.path.exists(os.path.join(source_dir, "pack.json"))
+        pack = None
+        if previous is not None and previous.compiled_stamp is not None \
+                and previous.compiled_stamp == _path_stamp(compiled_path):
+            # The compiled file is still the one previous was read from
+            pack = previous
+        else:
+            try:
+                pack = cls.from_file(compiled_path, source_dir)
+            except (OSError, ValueError, EOFError, KnowledgePackError):
+                if not has_source:
+                    raise
+        if pack is not None and (not has_source or pack.source_stamp == source_stamp(source_dir)):
+            return pack if pack is previous else pack._inherit(previous)
+        try:
+            data = compile_pack(source_dir, previous if previous is not None else pack)
+        finally:
+            # The stale compiled pack was only needed for its unchanged answers
+            if pack is not None and pack is not previous:
+                pack.close()
+        try:
+            write_compiled(data, compiled_path)
+        except OSError:
+            # Read-only install: keep the freshly compiled pack in memory
+            return cls(data, source_dir)._inherit(previous)
+        return cls.from_file(compiled_path, source_dir)._inherit(previous)
+
+    @classmethod
+    def from_file(cls, compiled_path, source_dir=None):
+        with open(compiled_path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stamp = _file_stamp(os.fstat(f.fileno()))
+        try:
+            pack = cls(data, source_dir)
+        except Exception:
+            data.close()
+            raise
+        pack.compiled_stamp = stamp
+        return pack
+
+    def _inherit(self, previous):
+        # Same rules as the pack in use: share its trie and typo index instead of rebuilding them
+        if (previous is not None and previous._matcher is not None
+                and _rule_shape(previous._rule_spec) == _rule_shape(self._rule_spec)):
+            self._matcher = previous._matcher
+        return self
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = IntentMatcher(self.rules)
+        return self._matcher
+
+    def answer_bytes(self, offset, length):
+        return self._data[offset:offset + length]
+
+    def answer_digest(self, rule_id):
+        """Hash of a rule's answer bytes: tells changed answers apart without decoding them"""
+        offset, length = self._offsets.get(rule_id, (-1, 0))
+        if offset < 0:
+            raise KeyError(rule_id)
+        return hashlib.sha1(self._data[offset:offset + length]).digest()
+
+    def has_answer(self, rule_id):
+        return self._offsets.get(rule_id, (-1, 0))[0] >= 0
+
+    def answer(self, rule_id):
+        """Return the answer body of a rule, decoding it from the pack on demand"""
+        text = self._answers.get(rule_id)
+        if text is None:
+            offset, length = self._offsets.get(rule_id, (-1, 0))
+            if offset < 0:
+                raise KeyError(rule_id)
+            # Kept, so every turn that got this answer shares one string
+            text = self._answers[rule_id] = self._data[offset:offset + length].decode("utf-8")
+        return text
+
+    def rule_for_answer(self, text):
+        """Rule whose answer body is exactly text, or None for generated answers"""
+        if self._answer_rules is None:
+            self._answer_rules = {self.answer(rule.rule_id): rule.rule_id
+                                  for rule in self.rules if not rule.fallthrough}
+        return self._answer_rules.get(text)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
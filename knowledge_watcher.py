@@ -0,0 +1,77 @@
+#  Hot reload of the knowledge pack while the chatbot keeps running
+#  A background thread polls the pack sources (knowledge/pack.json and
+#  knowledge/answers/*: names, sizes and mtimes only). On a change the pack is
+#  recompiled reading just the edited files, then swapped into the bot with
+#  FriendlyCodeChatbot.use_pack(). Questions already being answered finish on
+#  the pack they started with. A pack that fails to compile or validate is
+#  reported and the previous one stays live until the sources change again.
+
+import threading
+
+from knowledge_pack import KnowledgePack, source_stamp
+
+
+class KnowledgeWatcher:
+    """Polls bot.pack's sources every interval seconds and reloads it when they change.
+
+    on_reload(pack) and on_error(exception) are called on the watcher thread.
+    """
+
+    def __init__(self, bot, interval=1.0, on_reload=None, on_error=None):
+        self.bot = bot
+        self.interval = interval
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.reloads = 0
+        self.errors = 0
+        self._failed_stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+        # check() may run on the watcher thread and from a caller at the same time
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None and self.bot.pack.source_dir:
+            self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Reload now if the sources changed; returns the new pack, or None"""
+        with self._lock:
+            pack = self.bot.pack
+            if not pack.source_dir:
+                return None
+            new_pack = None
+            try:
+                stamp = source_stamp(pack.source_dir)
+                if stamp in (pack.source_stamp, self._failed_stamp):
+                    return None
+                new_pack = KnowledgePack.load(pack.source_dir, previous=pack)
+                self.bot.use_pack(new_pack)
+            except Exception as e:
+                # Remember the broken sources so they are not recompiled every interval
+                self._failed_stamp = stamp
+                self.errors += 1
+                print("Error reloading knowledge pack:", e)
+                if new_pack is not None and new_pack is not pack:
+                    # Rejected by the bot: nothing else holds its mapping open
+                    new_pack.close()
+                if self.on_error is not None:
+                    self.on_error(e)
+                return None
+            self._failed_stamp = None
+            self.reloads += 1
+        if self.on_reload is not None:
+            self.on_reload(new_pack)
+        return new_pack
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,220 @@
+#  Lightweight in-process metrics: counters, gauges and latency histograms
+#  Metrics(enabled=False) turns every call into an immediate return, so the
+#  instrumentation can stay in the hot paths. Snapshots are plain dicts; the
+#  same data renders as Prometheus text for /metrics or a periodic dump file.
+
+import atexit
+import bisect
+import os
+import threading
+import time
+
+# Latency buckets in seconds (upper bounds; +Inf is implied)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return f"{name}{{{body}}}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms"""
+
+    def __init__(self, enabled=True, prefix="chatbot", buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._dumper = None
+        self._stop_dump = threading.Event()
+
+    # Recording
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def declare(self, name, **labels):
+        """Create a counter at zero so series that never fire still show up"""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters.setdefault(key, 0)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def timer(self, name, **labels):
+        """Context manager observing the duration of its block"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def gauge(self, name, func):
+        """Register a value computed by func() whenever a snapshot is taken"""
+        if self.enabled:
+            self._gauges[name] = func
+
+    # Reading
+
+    def counter(self, name, **labels):
+        return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self):
+        """Return {"counters", "gauges", "histograms"} keyed by Prometheus-style series names"""
+        with self._lock:
+            counters = {_series(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {}
+            for (name, labels), histogram in self._histograms.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+                histograms[_series(name, labels)] = {
+                    "count": histogram.count, "sum": histogram.sum, "buckets": buckets,
+                }
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                print("Error reading metric", name, e)
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def render_prometheus(self):
+        """Text exposition format, one # TYPE line per metric family"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count))
+                                for key, h in self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            full = f"{self.prefix}_{name}"
+            if full not in seen:
+                seen.add(full)
+                lines.append(f"# TYPE {full} counter")
+            lines.append(f"{_series(full, labels)} {_format_value(value)}")
+        gauges = self.snapshot()["gauges"] if self._gauges else {}
+        for name, value in sorted(gauges.items()):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} gauge")
+            lines.append(f"{full} {_format_value(value)}")
+        for (name, labels), (counts, total, count) in histograms:
+            full = f"{self.prefix}_{name}"
+            if full not in seen:
+                seen.add(full)
+                lines.append(f"# TYPE {full} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{_series(full + '_bucket', labels, [('le', le)])} {cumulative}")
+            lines.append(f"{_series(full + '_sum', labels)} {_format_value(total)}")
+            lines.append(f"{_series(full + '_count', labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    # Periodic dump
+
+    def write(self, path):
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path, interval=60.0):
+        """Rewrite path with the Prometheus text every interval seconds and at exit"""
+        if not self.enabled or self._dumper is not None:
+            return
+        self._stop_dump.clear()
+        self._dumper = threading.Thread(target=self._dump_loop, args=(path, interval),
+                                        name="metrics-dump", daemon=True)
+        self._dumper.start()
+        atexit.register(self._dump_quietly, path)
+
+    def stop_dump(self):
+        self._stop_dump.set()
+        if self._dumper is not None:
+            self._dumper.join()
+            self._dumper = None
+
+    def _dump_loop(self, path, interval):
+        while not self._stop_dump.wait(interval):
+            self._dump_quietly(path)
+
+    def _dump_quietly(self, path):
+        try:
+            self.write(path)
+        except Exception as e:
+            print("Error writing metrics:", e)
+
+
+# Shared instance for code paths that were not handed one
+DISABLED = Metrics(enabled=False)
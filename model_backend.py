@@ -0,0 +1,187 @@
+#  Optional local language model behind the rule-based answers
+#  The model loads on a background thread; until it is ready (or if it never
+#  gets there) the bot keeps answering from its rules. Generation yields text
+#  piece by piece so the GUI and the stdio mode can stream it.
+#
+#  Backends:
+#      StandInBackend       deterministic fake for tests and demos, no downloads
+#      TransformersBackend  any causal LM already in the local Hugging Face cache
+#                           (pip install -r requirements-llm.txt)
+
+import hashlib
+import threading
+import time
+
+STAND_IN = "stand-in"
+
+MODEL_IDLE = "idle"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+
+
+class ModelBackend:
+    """Interface: load() once, then generate() any number of times"""
+
+    name = "model"
+
+    def load(self):
+        """Do the slow work (imports, weights); runs on a background thread"""
+
+    def generate(self, prompt, max_new_tokens=128):
+        """Yield the answer to prompt as successive text pieces"""
+        raise NotImplementedError
+
+
+class StandInBackend(ModelBackend):
+    """Deterministic stand-in: the same question always streams the same words"""
+
+    name = STAND_IN
+    _OPENINGS = (
+        "Good question!", "Let's think about that.", "Here is how I would approach it.",
+        "That is a common thing to wonder about.",
+    )
+    _ADVICE = (
+        "Start with a tiny example and grow it step by step.",
+        "Read the error message carefully, it usually names the exact line.",
+        "Write a short test first so you know when it works.",
+        "Look up the official documentation for the names involved.",
+        "Print intermediate values to see what the code really does.",
+    )
+
+    def __init__(self, load_delay=0.0, token_delay=0.0):
+        self.load_delay = load_delay
+        self.token_delay = token_delay
+
+    def load(self):
+        if self.load_delay:
+            time.sleep(self.load_delay)
+
+    def generate(self, prompt, max_new_tokens=128):
+        digest = hashlib.sha256(prompt.strip().lower().encode("utf-8")).digest()
+        text = (f"{self._OPENINGS[digest[0] % len(self._OPENINGS)]} "
+                f"(stand-in model) You asked: \"{prompt.strip()}\". "
+                f"{self._ADVICE[digest[1] % len(self._ADVICE)]} "
+                f"{self._ADVICE[(digest[1] + 1 + digest[2] % 3) % len(self._ADVICE)]}")
+        words = text.split(" ")[:max_new_tokens]
+        for i, word in enumerate(words):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+class TransformersBackend(ModelBackend):
+    """Hugging Face causal LM, loaded from the local cache only (no network)"""
+
+    PROMPT = "You are a friendly programming tutor.\nQuestion: {question}\nAnswer:"
+
+    def __init__(self, model_name="distilgpt2", local_files_only=True):
+        self.name = model_name
+        self.local_files_only = local_files_only
+        self._tokenizer = None
+        self._model = None
+
+    def load(self):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        self._tokenizer = AutoTokenizer.from_pretrained(self.name, local_files_only=self.local_files_only)
+        self._model = AutoModelForCausalLM.from_pretrained(self.name, local_files_only=self.local_files_only)
+        self._model.eval()
+
+    def generate(self, prompt, max_new_tokens=128):
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+        inputs = self._tokenizer(self.PROMPT.format(question=prompt), return_tensors="pt")
+        streamer = TextIteratorStreamer(self._tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop = threading.Event()
+        # generate() blocks, so it runs on its own thread while we read the streamer
+        worker = threading.Thread(target=self._model.generate, kwargs=dict(
+            inputs, streamer=streamer, max_new_tokens=max_new_tokens, do_sample=False,
+            pad_token_id=self._tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([_stop_on(stop)])))
+        worker.start()
+        try:
+            for piece in streamer:
+                if piece:
+                    yield piece
+        finally:
+            # Closed early (a cancelled question): the model stops at its next token
+            stop.set()
+            worker.join()
+
+
+def _stop_on(event):
+    """StoppingCriteria that ends generation once event is set"""
+    import torch
+    from transformers import StoppingCriteria
+
+    class StopOnEvent(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return StopOnEvent()
+
+
+def make_backend(name):
+    if name == STAND_IN:
+        return StandInBackend()
+    return TransformersBackend(name)
+
+
+class LazyModel:
+    """Loads a backend on a background thread and reports when it is usable"""
+
+    def __init__(self, backend, max_new_tokens=128):
+        self.backend = backend
+        self.max_new_tokens = max_new_tokens
+        self.state = MODEL_IDLE
+        self.error = None
+        self._loaded = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    @property
+    def ready(self):
+        return self.state == MODEL_READY
+
+    def start(self):
+        """Begin loading in the background; safe to call more than once"""
+        with self._lock:
+            if self.state != MODEL_IDLE:
+                return self
+            self.state = MODEL_LOADING
+        threading.Thread(target=self._load, name="model-loader", daemon=True).start()
+        return self
+
+    def _load(self):
+        try:
+            self.backend.load()
+        except Exception as e:
+            self.error = e
+            self.state = MODEL_FAILED
+            print("Error loading model:", e)
+        else:
+            self.state = MODEL_READY
+        self._loaded.set()
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, None
+        for callback in callbacks:
+            callback(self)
+
+    def on_loaded(self, callback):
+        """Call callback(model) once loading has finished, successfully or not"""
+        with self._lock:
+            if self._callbacks is not None:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    def generate(self, prompt):
+        if not self.ready:
+            raise RuntimeError(f"Model {self.name!r} is not loaded")
+        return self.backend.generate(prompt, self.max_new_tokens)
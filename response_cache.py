@@ -0,0 +1,126 @@
+#  Bounded LRU cache for smart responses
+#  Questions are keyed on their normalized token form, so "What is a variable?"
+#  and "what is a  VARIABLE" share one entry. Entries belong to a namespace
+#  (the knowledge pack fingerprint) and the whole cache is dropped when the
+#  namespace changes.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent_matcher import tokenize
+
+CACHE_FORMAT = 1
+
+
+def normalize_question(question):
+    """Canonical form of a question: lowercase tokens joined by single spaces"""
+    return " ".join(tokenize(question))
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with optional TTL and disk persistence"""
+
+    def __init__(self, max_size=256, ttl=None, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.namespace = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, question, namespace=None):
+        key = normalize_question(question)
+        with self._lock:
+            self._check_namespace(namespace)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, question, namespace=None):
+        """Cached value like get(), without counting it, refreshing its LRU place or dropping anything"""
+        key = normalize_question(question)
+        with self._lock:
+            if namespace != self.namespace:
+                return None
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.time() - entry[1] > self.ttl):
+                return None
+            return entry[0]
+
+    def put(self, question, value, namespace=None):
+        if self.max_size <= 0:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            self._check_namespace(namespace)
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _check_namespace(self, namespace):
+        if namespace != self.namespace:
+            self._entries.clear()
+            self.namespace = namespace
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # Persistence
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("format") != CACHE_FORMAT:
+            return
+        now = time.time()
+        with self._lock:
+            self.namespace = data.get("namespace")
+            for key, value, stamp in data.get("entries", [])[-self.max_size:]:
+                if self.ttl is None or now - stamp <= self.ttl:
+                    self._entries[key] = (tuple(value) if isinstance(value, list) else value, stamp)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "format": CACHE_FORMAT,
+                "namespace": self.namespace,
+                "entries": [[key, value, stamp] for key, (value, stamp) in self._entries.items()],
+            }
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,144 @@
+#  BM25 retrieval over the knowledge pack answers
+#  Used as a ranked fallback when no keyword rule matches. Documents are kept
+#  as a sparse term -> (documents, term frequencies) matrix. Adding or removing
+#  a document only touches the postings of its own terms; everything that
+#  depends on the whole collection (idf, length normalization) is recomputed
+#  lazily once. NumPy vectorizes the scoring when it is installed (see
+#  requirements.txt); otherwise the same formula runs in pure Python.
+
+import math
+from collections import Counter
+
+from intent_matcher import tokenize
+
+try:
+    import numpy as np
+    _numpy_available = True
+except ImportError:
+    _numpy_available = False
+
+# Words that say nothing about the topic of a question
+STOPWORDS = frozenset("""
+a about an and are as at be but by can could do does example for from get give have help
+how i if in into is it its just know like me my need of on or please project question
+quick show so some tell thank thanks that the their them then there these this to today
+use using want was we what when where which who why will with would you your
+""".split())
+
+
+def _terms(text):
+    terms = []
+    for token in tokenize(text):
+        if token in STOPWORDS:
+            continue
+        # Plurals fold to one term; intent_matcher._variants tries several forms instead
+        if len(token) > 4 and token.endswith("es") and not token.endswith("ses"):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a set of documents that can be added and removed one by one"""
+
+    def __init__(self, k1=1.5, b=0.75, use_numpy=None):
+        self.k1 = k1
+        self.b = b
+        self.use_numpy = _numpy_available if use_numpy is None else use_numpy and _numpy_available
+        self.doc_ids = []     # by slot; None where a document was removed
+        self._slots = {}      # doc_id -> slot
+        self._free = []       # slots of removed documents, reused first
+        self._lengths = []
+        self._counts = []     # per slot: Counter of its terms, to find its postings again
+        self._postings = {}   # term -> ([document index], [term frequency])
+        self._arrays = {}     # term -> (indexes, tfs) as arrays, built on first query
+        self._norm = None     # per-document length normalization, None when stale
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slots
+
+    def add_document(self, doc_id, text):
+        """Index text under doc_id, replacing the document already there"""
+        self.remove_document(doc_id)
+        counts = Counter(_terms(text))
+        if self._free:
+            index = self._free.pop()
+            self.doc_ids[index] = doc_id
+            self._lengths[index] = sum(counts.values())
+            self._counts[index] = counts
+        else:
+            index = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self._lengths.append(sum(counts.values()))
+            self._counts.append(counts)
+        self._slots[doc_id] = index
+        for term, tf in counts.items():
+            docs, tfs = self._postings.setdefault(term, ([], []))
+            docs.append(index)
+            tfs.append(tf)
+            self._arrays.pop(term, None)
+        self._norm = None
+
+    def remove_document(self, doc_id):
+        index = self._slots.pop(doc_id, None)
+        if index is None:
+            return
+        for term in self._counts[index]:
+            docs, tfs = self._postings[term]
+            position = docs.index(index)
+            del docs[position], tfs[position]
+            if not docs:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self.doc_ids[index] = None
+        self._lengths[index] = 0
+        self._counts[index] = None
+        self._free.append(index)
+        self._norm = None
+
+    def _normalization(self):
+        if self._norm is None:
+            average = (sum(self._lengths) / (len(self._slots) or 1)) or 1.0
+            norm = [self.k1 * (1 - self.b + self.b * length / average) for length in self._lengths]
+            self._norm = np.array(norm) if self.use_numpy else norm
+        return self._norm
+
+    def _idf(self, term):
+        df = len(self._postings[term][0])
+        return math.log(1 + (len(self._slots) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """Score of every slot of doc_ids for query (0 for removed documents)"""
+        terms = [term for term in set(_terms(query)) if term in self._postings]
+        if not self._slots:
+            return []
+        norm = self._normalization()
+        k1 = self.k1
+        if self.use_numpy:
+            scores = np.zeros(len(self.doc_ids))
+            for term in terms:
+                arrays = self._arrays.get(term)
+                if arrays is None:
+                    docs, tfs = self._postings[term]
+                    arrays = self._arrays[term] = (np.array(docs), np.array(tfs, dtype=float))
+                docs, tfs = arrays
+                scores[docs] += self._idf(term) * tfs * (k1 + 1) / (tfs + norm[docs])
+            return scores.tolist()
+        scores = [0.0] * len(self.doc_ids)
+        for term in terms:
+            idf = self._idf(term)
+            docs, tfs = self._postings[term]
+            for doc, tf in zip(docs, tfs):
+                scores[doc] += idf * tf * (k1 + 1) / (tf + norm[doc])
+        return scores
+
+    def search(self, query, k=5):
+        """Return up to k (doc_id, score) pairs with a positive score, best first"""
+        scores = self.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        return [(self.doc_ids[i], scores[i]) for i in ranked[:k]]
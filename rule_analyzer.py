@@ -0,0 +1,213 @@
+#  Offline analysis of the keyword rules against a question corpus
+#  bash: python rule_analyzer.py                                (generated corpus)
+#  bash: python rule_analyzer.py --corpus questions.jsonl --history --json
+#
+#  Every question goes through IntentMatcher.explain(); the report lists
+#      wins       how often each rule answers, most frequent first (the hot path)
+#      shadowed   rules whose keyword matched while a rule tried earlier won, and by whom
+#      dead       answering rules that never won, and children no question can reach
+#      overlaps   keywords shared by several rules, and rules that often match together
+
+import argparse
+import json
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+
+from intent_matcher import tokenize
+from knowledge_pack import KnowledgePack
+
+HISTORY_FILE = "chat_history.jsonl"
+
+
+def read_questions(lines, field="question"):
+    """Questions from plain text lines or JSONL (objects with field, or bare strings)"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] in "{\"":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line
+                continue
+            if isinstance(record, dict):
+                record = record.get(field)
+            if isinstance(record, str):
+                yield record
+            continue
+        yield line
+
+
+def history_questions(path=HISTORY_FILE):
+    """Questions of a saved chat history, archived turns included; the files are only read"""
+    from history_store import HistoryArchive, HistoryJournal
+    if not os.path.exists(path):
+        return
+    archive_dir = os.path.splitext(path)[0] + ".archive"
+    archive = HistoryArchive(archive_dir) if os.path.isdir(archive_dir) else None
+    journal = HistoryJournal(path, archive=archive)
+    for question, _ in journal.iter_all():
+        yield question
+    journal.close()
+
+
+def generated_questions(pack, per_rule=50, seed=1234):
+    """The benchmark corpus: questions aimed at every rule, plus unmatched filler"""
+    from benchmark import rule_questions
+    corpus = rule_questions(pack, random.Random(seed), per_rule)
+    return [question for questions in corpus.values() for question in questions]
+
+
+def keyword_overlaps(rules):
+    """{keyword: [rule_id, ...]} for keywords that more than one rule listens to"""
+    owners = defaultdict(list)
+    for rule in rules:
+        for keyword in rule.keywords:
+            key = " ".join(tokenize(keyword))
+            if rule.rule_id not in owners[key]:
+                owners[key].append(rule.rule_id)
+    return {keyword: ids for keyword, ids in sorted(owners.items()) if len(ids) > 1}
+
+
+def unreachable_children(matcher):
+    """[(rule_id, sibling_id)] for children whose keywords all belong to a sibling tried first"""
+    found = []
+    for siblings in matcher.children.values():
+        for i, rule in enumerate(siblings):
+            keywords = {" ".join(tokenize(k)) for k in rule.keywords}
+            for earlier in siblings[:i]:
+                if keywords and keywords <= {" ".join(tokenize(k)) for k in earlier.keywords}:
+                    found.append((rule.rule_id, earlier.rule_id))
+                    break
+    return found
+
+
+def _related(matcher, first, second):
+    # A parent always matches together with the child it narrows down to
+    for rule_id, other in ((first, second), (second, first)):
+        rule = matcher.rules[rule_id]
+        while rule.parent is not None:
+            if rule.parent == other:
+                return True
+            rule = matcher.rules[rule.parent]
+    return False
+
+
+def analyze(pack, questions):
+    """Run questions through the matcher and return the report as a dict"""
+    matcher = pack.matcher
+    wins = Counter()
+    matches = Counter()
+    shadowed = defaultdict(Counter)
+    examples = {}
+    pairs = Counter()
+    total = unmatched = 0
+    for question in questions:
+        total += 1
+        trace = matcher.explain(question)
+        winner = trace["winner"]
+        if winner is None:
+            unmatched += 1
+        else:
+            wins[winner] += 1
+        hits = trace["hits"]
+        hit_ids = sorted(hits)
+        matches.update(hit_ids)
+        for step in trace["steps"]:
+            # A fallthrough rule never answers, so losing costs it nothing
+            if step["outcome"] == "shadowed" and not matcher.rules[step["rule"]].fallthrough:
+                shadowed[step["rule"]][winner] += 1
+                examples.setdefault((step["rule"], winner), question)
+        for i, first in enumerate(hit_ids):
+            for second in hit_ids[i + 1:]:
+                # Rules sharing the keyword are already listed as keyword overlaps
+                if hits[first] != hits[second] and not _related(matcher, first, second):
+                    pairs[(first, second)] += 1
+
+    answering = [rule for rule in pack.rules if rule.keywords and not rule.fallthrough]
+    dead = [{"rule": rule.rule_id, "matched": matches[rule.rule_id],
+             "reason": "matched but always lost" if matches[rule.rule_id] else "never matched"}
+            for rule in answering if not wins[rule.rule_id]]
+    for rule_id, sibling in unreachable_children(matcher):
+        dead.append({"rule": rule_id, "matched": matches[rule_id],
+                     "reason": f"every keyword also belongs to {sibling!r}, which is tried first"})
+    return {
+        "questions": total,
+        "unmatched": unmatched,
+        "wins": dict(wins.most_common()),
+        "shadowed": {
+            rule_id: {
+                "count": sum(by.values()),
+                "by": [{"winner": winner, "count": count, "example": examples[(rule_id, winner)]}
+                       for winner, count in by.most_common()],
+            }
+            for rule_id, by in sorted(shadowed.items(), key=lambda item: -sum(item[1].values()))
+        },
+        "dead": dead,
+        "overlaps": {
+            "keywords": keyword_overlaps(pack.rules),
+            "co_matches": [[first, second, count] for (first, second), count in pairs.most_common()],
+        },
+    }
+
+
+def format_report(report, top=10):
+    total = report["questions"] or 1
+    lines = [f"{report['questions']} questions, {report['unmatched']} matched no rule", "", "Wins (hot path):"]
+    for rule_id, count in list(report["wins"].items())[:top]:
+        lines.append(f"  {rule_id:<22} {count:>7}  {count / total:6.1%}")
+    lines += ["", "Shadowed (keyword matched, another rule won first):"]
+    for rule_id, entry in list(report["shadowed"].items())[:top]:
+        lines.append(f"  {rule_id:<22} {entry['count']:>7}")
+        for loss in entry["by"][:3]:
+            winner = loss["winner"] or "(no rule)"
+            lines.append(f"      by {winner:<19} {loss['count']:>7}  e.g. {loss['example']!r}")
+    lines += ["", "Dead:"]
+    for entry in report["dead"] or [{"rule": "(none)", "matched": 0, "reason": ""}]:
+        lines.append(f"  {entry['rule']:<22} {entry['reason']}")
+    lines += ["", "Overlapping keywords:"]
+    for keyword, rule_ids in report["overlaps"]["keywords"].items():
+        lines.append(f"  {keyword!r:<22} {', '.join(rule_ids)}")
+    lines += ["", "Rules matching the same questions through different keywords:"]
+    for first, second, count in report["overlaps"]["co_matches"][:top]:
+        lines.append(f"  {first + ' + ' + second:<45} {count:>7}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report shadowed, dead and overlapping keyword rules")
+    parser.add_argument("--corpus", action="append", metavar="PATH",
+                        help="questions, one per line or JSONL ('-' for stdin); may be repeated")
+    parser.add_argument("--field", default="question", help="JSON field holding the question")
+    parser.add_argument("--history", nargs="?", const=HISTORY_FILE, metavar="PATH",
+                        help=f"also analyze the questions of a saved chat history (default: {HISTORY_FILE})")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--top", type=int, default=10, help="entries per section in the text report")
+    args = parser.parse_args(argv)
+
+    pack = KnowledgePack.load()
+    questions = []
+    for path in args.corpus or ():
+        if path == "-":
+            questions.extend(read_questions(sys.stdin, args.field))
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                questions.extend(read_questions(f, args.field))
+    if args.history:
+        questions.extend(history_questions(args.history))
+    if not args.corpus and not args.history:
+        questions = generated_questions(pack)
+
+    report = analyze(pack, questions)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        sys.stdout.write(format_report(report, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,33 @@
 import tkinter as tk
 from tkinter import messagebox
-import json, os
+import os
+
+from history_store import HistoryJournal
 
 class SimpleCodeChatbot:
-    def __init__(self):
+    def __init__(self, history_file="chat_history.jsonl", history_backend="journal"):
+        # Same locked journal (or SQLite database) as the friendly chatbot, so both can run at once
         self.history = []
-        self.history_file = "chat_history.json"
+        self.history_file = history_file
+        base = os.path.splitext(history_file)[0]
+        if history_backend == "sqlite":
+            from sqlite_history import SqliteHistory
+            self.journal = SqliteHistory(base + ".db", legacy_path=base + ".jsonl")
+        else:
+            self.journal = HistoryJournal(history_file, legacy_path=base + ".json")
         self.load_history()
 
     def load_history(self):
         try:
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                self.history = json.load(f)
-        except:
+            self.history = self.journal.load()
+        except Exception as e:
+            print("Error loading history:", e)
             self.history = []
 
     def save_history(self):
+        # Every turn is appended as it happens; this only tidies the journal up
         try:
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.history, f, ensure_ascii=False)
+            self.journal.compact()
         except Exception as e:
             print("Error saving history:", e)
 
@@ -34,7 +43,10 @@ class SimpleCodeChatbot:
             "5. Keep functions small and focused"
         )
         self.history.append((user_question, response))
-        self.save_history()
+        try:
+            self.journal.append(user_question, response)
+        except Exception as e:
+            print("Error saving history:", e)
         return response
 
 def run_simple_gui():
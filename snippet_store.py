@@ -0,0 +1,121 @@
+#  Content-addressed store for code snippets found in bot answers
+#  Code blocks (``` / ~~~ fences or blocks indented by four spaces) are pulled
+#  out of an answer and saved once under the sha256 of their code:
+#      snippets/index.json          {sha256: {"file", "language", "saved"}}
+#      snippets/<sha256[:12]>.<ext> the code itself
+#  A snippet that is already stored costs one set lookup and no disk write.
+
+import hashlib
+import json
+import os
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from code_highlight import code_spans
+
+SNIPPET_DIR = "snippets"
+INDEX_NAME = "index.json"
+INDEX_FORMAT = 1
+
+_EXTENSIONS = {
+    "python": "py", "py": "py", "javascript": "js", "js": "js", "typescript": "ts",
+    "html": "html", "css": "css", "bash": "sh", "sh": "sh", "shell": "sh",
+    "json": "json", "sql": "sql", "java": "java", "c": "c", "cpp": "cpp",
+}
+
+
+def extract_code_blocks(text):
+    """Return [(language, code)] for the fenced and indented code blocks of text"""
+    blocks = []
+    for start, end, language in code_spans(text):
+        code = textwrap.dedent("\n".join(text[start:end].splitlines())).strip("\n")
+        if code.strip():
+            blocks.append((language, code))
+    return blocks
+
+
+def snippet_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class SnippetStore:
+    """Deduplicated snippet directory; save_async() keeps disk I/O off the caller's thread"""
+
+    def __init__(self, directory=SNIPPET_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._index = None
+        self._executor = None
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index = data["snippets"] if data.get("format") == INDEX_FORMAT else {}
+            except (OSError, ValueError, KeyError):
+                self._index = {}
+        return self._index
+
+    def __contains__(self, digest):
+        with self._lock:
+            return digest in self._load_index()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load_index())
+
+    def path_for(self, digest):
+        with self._lock:
+            entry = self._load_index().get(digest)
+        return os.path.join(self.directory, entry["file"]) if entry else None
+
+    def save(self, text):
+        """Store every new code block of text; returns the paths written"""
+        written = []
+        with self._lock:
+            index = self._load_index()
+            for language, code in extract_code_blocks(text):
+                digest = snippet_hash(code)
+                if digest in index:
+                    continue
+                os.makedirs(self.directory, exist_ok=True)
+                name = f"{digest[:12]}.{_EXTENSIONS.get(language, 'txt')}"
+                path = os.path.join(self.directory, name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(code + "\n")
+                index[digest] = {"file": name, "language": language, "saved": time.time()}
+                written.append(path)
+            if written:
+                self._write_index()
+        return written
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "snippets": self._index}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def save_async(self, text, callback=None):
+        """Queue save(text) on the store's I/O thread; callback(paths) runs there afterwards"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="snippet-store")
+        return self._executor.submit(self._save_quietly, text, callback)
+
+    def _save_quietly(self, text, callback):
+        try:
+            written = self.save(text)
+        except Exception as e:
+            print("Error saving code:", e)
+            return []
+        if callback is not None and written:
+            callback(written)
+        return written
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
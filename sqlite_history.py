@@ -0,0 +1,378 @@
+#  SQLite history backend with full-text search
+#  bash: python sqlite_history.py chat_history.jsonl chat_history.db   (one-shot migration)
+#
+#  A drop-in for HistoryJournal (same load/load_tail/load_before/extend/clear
+#  calls) on the standard library sqlite3 module, for histories too long to
+#  scan. Turns live in one table indexed by session and time; ids only grow,
+#  so they double as paging cursors and a page costs an index range scan
+#  whatever the length of the history. search() goes through an FTS5 index
+#  over questions and answers and never reads a turn that does not match.
+#
+#  The database runs in WAL mode: readers never wait for the writer, and
+#  several chatbot processes can share it (writers queue on SQLite's own lock
+#  for up to lock_timeout seconds). As in the journal, an answer that is
+#  exactly a knowledge pack answer is stored once in the answers table and
+#  the turns refer to it.
+#
+#  Tables:
+#      turns(id, time, session, question, answer, answer_id)   answer is NULL for references
+#      answers(id, rule, version, text)
+#      turns_fts(question, answer)                             contentless FTS5, rowid = turns.id
+#      meta(key, value)                                        "imported": where the history came from
+
+import argparse
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+
+from history_store import (DURABILITY_BATCH, DURABILITY_FSYNC, DURABILITY_MODES, DURABILITY_NONE,
+                           HistoryArchive, HistoryJournal, load_legacy_history, search_words)
+
+SCHEMA_VERSION = 1
+# Turns per transaction when importing a journal
+IMPORT_BATCH = 10000
+
+# Databases still open at exit get closed; a weak set, so unclosed ones can be collected
+_open_histories = weakref.WeakSet()
+
+
+def _close_open_histories():
+    for history in list(_open_histories):
+        history.close()
+
+
+atexit.register(_close_open_histories)
+
+_SYNCHRONOUS = {DURABILITY_NONE: "OFF", DURABILITY_BATCH: "NORMAL", DURABILITY_FSYNC: "FULL"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS answers(
+    id INTEGER PRIMARY KEY,
+    rule TEXT NOT NULL,
+    version TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE(rule, version)
+);
+CREATE TABLE IF NOT EXISTS turns(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL,
+    session TEXT,
+    question TEXT NOT NULL,
+    answer TEXT,
+    answer_id INTEGER REFERENCES answers(id)
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session, id);
+CREATE INDEX IF NOT EXISTS turns_time ON turns(time);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    question, answer, content='', detail=column, tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_SELECT = ("SELECT t.id, t.question, COALESCE(t.answer, a.text) FROM turns t "
+           "LEFT JOIN answers a ON a.id = t.answer_id")
+
+
+def fts_query(query):
+    """FTS5 query matching every word of query; a trailing * makes the last word a prefix.
+
+    Prefixes are opt-in because FTS5 merges the postings of every word
+    starting with one, which for a short prefix is most of the index.
+    """
+    words = search_words(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if query.rstrip().endswith("*"):
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SqliteHistory:
+    """History in a WAL-mode SQLite database; one connection shared by the caller's threads"""
+
+    # load_tail(), load_before() and search() can be limited to one session
+    sessions_indexed = True
+
+    def __init__(self, path, legacy_path=None, durability=DURABILITY_BATCH,
+                 lock_timeout=10.0, answer_source=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode {durability!r}")
+        self.path = path
+        # A journal (or old chat_history.json) imported the first time the database is opened
+        self.legacy_path = legacy_path
+        self.durability = durability
+        # Callable returning the current KnowledgePack; its answers are stored once
+        self.answer_source = answer_source
+        self._answer_ids = {}  # (rule_id, version) -> answers.id
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=lock_timeout, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={_SYNCHRONOUS[durability]}")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        # One transaction, so processes opening a new database at once do not interleave
+        self._db.executescript(f"BEGIN IMMEDIATE;{_SCHEMA}"
+                               f"INSERT OR IGNORE INTO meta VALUES ('schema', '{SCHEMA_VERSION}');COMMIT;")
+        _open_histories.add(self)
+        if legacy_path:
+            self._import_legacy(legacy_path)
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+    # Reading
+
+    def load(self):
+        """Return all turns"""
+        return list(self.iter_all())
+
+    def iter_all(self, batch=IMPORT_BATCH):
+        """Every turn, oldest first, read a batch at a time"""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(f"{_SELECT} WHERE t.id > ? ORDER BY t.id LIMIT ?",
+                                        (last, batch)).fetchall()
+            for _, question, answer in rows:
+                yield question, answer
+            if len(rows) < batch:
+                return
+            last = rows[-1][0]
+
+    def load_tail(self, limit, session=None):
+        """Return (turns, cursor) for the last limit turns, optionally of one session.
+
+        cursor pages further back with load_before() and is None once there
+        is nothing older.
+        """
+        return self._page(None, limit, session)
+
+    def load_before(self, cursor, limit, newer=0, session=None):
+        """Return (turns, cursor) for up to limit turns older than cursor.
+
+        Ids never change, so unlike the journal's cursors these stay valid
+        whatever was written meanwhile; newer is accepted for compatibility.
+        """
+        if cursor is None:
+            return [], None
+        return self._page(cursor, limit, session)
+
+    def _page(self, before, limit, session):
+        if limit <= 0:
+            return [], before
+        conditions, params = [], []
+        if before is not None:
+            conditions.append("t.id < ?")
+            params.append(before)
+        if session is not None:
+            conditions.append("t.session = ?")
+            params.append(session)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(f"{_SELECT}{where} ORDER BY t.id DESC LIMIT ?",
+                                    params + [limit + 1]).fetchall()
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [(question, answer) for _, question, answer in reversed(rows[:limit])], cursor
+
+    def search(self, query, limit=20, before=None, session=None):
+        """Return (results, cursor) for the newest turns containing every word of query.
+
+        Results are dicts with id, time, session, question and answer, newest
+        first; pass cursor as before for the next page (None: no more).
+        """
+        match = fts_query(query)
+        if match is None or limit <= 0:
+            return [], None
+        conditions, params = ["turns_fts MATCH ?"], [match]
+        if before is not None:
+            conditions.append("f.rowid < ?")
+            params.append(before)
+        if session is not None:
+            conditions.append("t.session = ?")
+            params.append(session)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t.id, t.time, t.session, t.question, COALESCE(t.answer, a.text) "
+                "FROM turns_fts f JOIN turns t ON t.id = f.rowid "
+                "LEFT JOIN answers a ON a.id = t.answer_id "
+                f"WHERE {' AND '.join(conditions)} ORDER BY f.rowid DESC LIMIT ?",
+                params + [limit + 1]).fetchall()
+        results = [{"id": row[0], "time": row[1], "session": row[2], "question": row[3], "answer": row[4]}
+                   for row in rows[:limit]]
+        return results, results[-1]["id"] if len(rows) > limit else None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    # Writing
+
+    def append(self, question, answer):
+        self.extend([(question, answer)])
+
+    def extend(self, turns, session=None):
+        """Add several turns in one transaction, optionally tagged with a session id"""
+        self._insert(turns, session, time.time())
+
+    def _insert(self, turns, session, when):
+        if not turns:
+            return
+        pack = self.answer_source() if self.answer_source is not None else None
+        with self._lock, self._transaction():
+            rows = []
+            for question, answer in turns:
+                rule_id = pack.rule_for_answer(answer) if pack is not None else None
+                if rule_id is None:
+                    rows.append((when, session, question, answer, None))
+                else:
+                    answer_id = self._answer_id((rule_id, pack.fingerprint), answer)
+                    rows.append((when, session, question, None, answer_id))
+            # The write lock is held, so every id above the current maximum is one of ours
+            last = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM turns").fetchone()[0]
+            self._db.executemany("INSERT INTO turns(time, session, question, answer, answer_id) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+            # One set-based insert indexes the batch; a per-row trigger is three times slower
+            self._db.execute(f"INSERT INTO turns_fts(rowid, question, answer) {_SELECT} WHERE t.id > ?",
+                             (last,))
+
+    def _answer_id(self, key, text):
+        """Row id of the stored pack answer key, adding it on first use; transaction open"""
+        answer_id = self._answer_ids.get(key)
+        if answer_id is None:
+            self._db.execute("INSERT OR IGNORE INTO answers(rule, version, text) VALUES (?, ?, ?)",
+                             (key[0], key[1], text))
+            answer_id = self._answer_ids[key] = self._db.execute(
+                "SELECT id FROM answers WHERE rule = ? AND version = ?", key).fetchone()[0]
+        return answer_id
+
+    def clear(self):
+        """Delete every turn; ids keep growing, so old cursors find nothing.
+
+        Stored pack answers stay: there are few of them, and other processes
+        sharing the database still hold their ids.
+        """
+        with self._lock, self._transaction():
+            self._db.execute("DELETE FROM turns")
+            self._db.execute("INSERT INTO turns_fts(turns_fts) VALUES ('delete-all')")
+
+    def import_journal(self, path, batch=IMPORT_BATCH):
+        """Copy the turns of a journal or JSON history file; returns the number copied.
+
+        The journal keeps no timestamps, so imported turns have none either.
+        """
+        count = 0
+        chunk = []
+        for turn in legacy_turns(path):
+            chunk.append(turn)
+            if len(chunk) >= batch:
+                self._insert(chunk, None, None)
+                count += len(chunk)
+                chunk = []
+        self._insert(chunk, None, None)
+        count += len(chunk)
+        with self._lock, self._transaction():
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('imported', ?)",
+                             (f"{os.path.abspath(path)} ({count} turns)",))
+        return count
+
+    def _import_legacy(self, path):
+        """Import path once, into a database nothing was written to yet"""
+        with self._lock, self._transaction():
+            # Claimed inside one transaction: of several processes opening the database, one imports
+            if self._db.execute("SELECT EXISTS (SELECT 1 FROM meta WHERE key = 'imported') "
+                                "OR EXISTS (SELECT 1 FROM turns)").fetchone()[0]:
+                return
+            self._db.execute("INSERT INTO meta VALUES ('imported', 'in progress')")
+        self.import_journal(path)
+
+    # Maintenance
+
+    def flush(self):
+        """Every write is already committed; a checkpoint also syncs the WAL to disk"""
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def compact(self):
+        """Fold the WAL back into the database and refresh the query planner statistics"""
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._db.execute("PRAGMA optimize")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        _open_histories.discard(self)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on an exception"""
+    __slots__ = ("db",)
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        # IMMEDIATE takes the write lock up front instead of failing halfway on a busy database
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def legacy_turns(path):
+    """Stream the turns of a history journal (archive included) or old JSON array, oldest first.
+
+    The source is only read: unlike HistoryJournal.load(), an old JSON array
+    is not converted in place. A missing journal falls back to the .json file
+    next to it.
+    """
+    if not os.path.exists(path):
+        path = os.path.splitext(path)[0] + ".json"
+        if not os.path.exists(path):
+            return
+    with open(path, "rb") as f:
+        legacy = f.read(64).lstrip()[:1] == b"["
+    if legacy:
+        yield from load_legacy_history(path)
+        return
+    archive_dir = os.path.splitext(path)[0] + ".archive"
+    archive = HistoryArchive(archive_dir) if os.path.isdir(archive_dir) else None
+    journal = HistoryJournal(path, archive=archive)
+    try:
+        yield from journal.iter_all()
+    finally:
+        journal.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy a chat history journal into a SQLite history database")
+    parser.add_argument("source", help="chat_history.jsonl (its .archive/ is included) or an old chat_history.json")
+    parser.add_argument("database", help="SQLite database to create, e.g. chat_history.db")
+    args = parser.parse_args(argv)
+    history = SqliteHistory(args.database)
+    if len(history):
+        print(f"Error migrating history: {args.database} already holds turns", file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    from knowledge_pack import KnowledgePack
+    pack = KnowledgePack.load()
+    history.answer_source = lambda: pack
+    count = history.import_journal(args.source)
+    history.compact()
+    history.close()
+    print(f"Imported {count} turns into {args.database} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
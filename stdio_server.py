@@ -0,0 +1,94 @@
+#  Headless stdin/stdout mode for embedding the chatbot as a subprocess
+#  bash: python -m coder_chatbot --serve-stdio
+#
+#  Input: one question per line, either plain text or a JSON object
+#  {"id": ..., "question": "..."}. Output: JSON lines, flushed as soon as
+#  they are produced:
+#      {"id": 1, "delta": "first chunk of the answer"}
+#      {"id": 1, "done": true, "rule": "python"}
+#  A request that cannot be parsed gets {"id": ..., "error": "..."}, with its own
+#  "id" when the line was a JSON object and the line number otherwise.
+#
+#  {"id": 2, "search": "python list", "limit": 20, "before": null} searches the
+#  saved history instead and answers with one line:
+#      {"id": 2, "results": [{"id", "time", "session", "question", "answer"}, ...], "next": 812}
+#  Pass "next" back as "before" for the following page (null: nothing older).
+#  With trace=True (--trace) every answer is preceded by
+#      {"id": 1, "trace": [...]}    the stages of FriendlyCodeChatbot.explain()
+
+import json
+
+
+def _parse_request(line, number):
+    """Return (id, request); request is the parsed object of a JSON line, else None"""
+    if line.lstrip().startswith("{"):
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("expected a JSON object")
+        return request.get("id", number), request
+    return number, None
+
+
+def _question(request, line):
+    """The question a request asks, or None for a history search"""
+    if request is None:
+        return line
+    if "search" in request:
+        if not isinstance(request["search"], str):
+            raise ValueError("'search' must be a string")
+        return None
+    question = request.get("question")
+    if not isinstance(question, str):
+        raise ValueError("missing string 'question' field")
+    return question
+
+
+def _search(bot, request):
+    limit = request.get("limit", 20)
+    before = request.get("before")
+    if not isinstance(limit, int) or not (before is None or isinstance(before, int)):
+        raise ValueError("'limit' and 'before' must be numbers")
+    results, cursor = bot.search_history(request["search"], limit, before, request.get("session"))
+    return {"results": results, "next": cursor}
+
+
+def serve_stdio(bot, input_file, output_file, trace=False):
+    """Answer questions from input_file until EOF; returns the number answered"""
+    def emit(event):
+        output_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        output_file.flush()
+
+    answered = 0
+    for number, line in enumerate(input_file, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        # Errors carry the request's own id once the line has parsed
+        request_id = number
+        try:
+            request_id, request = _parse_request(line, number)
+            question = _question(request, line)
+            if question is None:
+                emit(dict({"id": request_id}, **_search(bot, request)))
+                continue
+        except ValueError as e:
+            emit({"id": request_id, "error": f"Invalid request: {e}"})
+            continue
+        try:
+            if trace:
+                emit({"id": request_id, "trace": bot.explain(question)["stages"]})
+            rule_id, chunks = bot.stream_response(question)
+            parts = []
+            for chunk in chunks:
+                parts.append(chunk)
+                emit({"id": request_id, "delta": chunk})
+        except Exception as e:
+            emit({"id": request_id, "error": f"Sorry, I encountered an error: {e}"})
+            continue
+        # Journal append only; the history file is never rewritten here
+        bot.record([(question, "".join(parts))])
+        emit({"id": request_id, "done": True, "rule": rule_id})
+        answered += 1
+    if bot.journal is not None:
+        bot.journal.flush()
+    return answered
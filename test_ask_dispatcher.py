@@ -0,0 +1,102 @@
+"""
+Checks for the GUI worker pool and single history writer
+"""
+
+import threading
+import time
+
+from ask_dispatcher import AskDispatcher
+from coder_chatbot import FriendlyCodeChatbot
+
+
+def collect(bot, workers=3):
+    delivered = []
+
+    def deliver(ticket, answer):
+        delivered.append((ticket, answer))
+
+    return AskDispatcher(bot, deliver, workers=workers), delivered
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_answers_delivered_in_order_and_recorded_once():
+    bot = FriendlyCodeChatbot(history_file=None)
+    original = bot.get_smart_response
+
+    def jittery(question):
+        # Later questions finish first
+        time.sleep(0.05 if question.endswith("0") else 0)
+        return original(question)
+
+    bot.get_smart_response = jittery
+    dispatcher, delivered = collect(bot)
+    questions = [f"explain loops {i}" for i in range(10)] + ["what is python 0"]
+    tickets = [dispatcher.submit(q) for q in questions]
+    wait_for(lambda: len(delivered) == len(questions))
+    assert [ticket for ticket, _ in delivered] == tickets
+    dispatcher.shutdown(timeout=2)
+    assert [q for q, _ in bot.history] == questions
+
+
+def test_superseded_and_cleared_requests_are_cancelled():
+    bot = FriendlyCodeChatbot(history_file=None)
+    release = threading.Event()
+    original = bot.get_smart_response
+    bot.get_smart_response = lambda q: (release.wait(5), original(q))[1]
+    dispatcher, delivered = collect(bot, workers=1)
+    busy = dispatcher.submit("what is git")
+    time.sleep(0.05)
+    first = dispatcher.submit("What is Python?")
+    second = dispatcher.submit("what is python")
+    release.set()
+    wait_for(lambda: len(delivered) == 3)
+    answers = dict(delivered)
+    assert answers[busy] is not None and answers[first] is None and answers[second] is not None
+
+    release.clear()
+    dispatcher.submit("explain loops")
+    dispatcher.clear_history()
+    release.set()
+    wait_for(lambda: len(delivered) == 4)
+    assert delivered[-1][1] is None
+    dispatcher.shutdown(timeout=2)
+    assert bot.history == []
+
+
+def test_cancelled_stream_is_closed():
+    bot = FriendlyCodeChatbot(history_file=None)
+    started, closed = threading.Event(), threading.Event()
+
+    def pieces():
+        try:
+            while True:
+                started.set()
+                yield "word "
+                time.sleep(0.01)
+        finally:
+            closed.set()
+
+    bot.stream_response = lambda question: ("model", pieces())
+    delivered = []
+    dispatcher = AskDispatcher(bot, lambda ticket, answer: delivered.append(answer),
+                               workers=1, on_partial=lambda ticket, text: None)
+    dispatcher.submit("write me a poem")
+    assert started.wait(5)
+    dispatcher.cancel_all()
+    # The generator (and with it the model) is stopped, not left to run out
+    assert closed.wait(5)
+    wait_for(lambda: delivered == [None])
+    dispatcher.shutdown(timeout=2)
+
+
+if __name__ == "__main__":
+    test_answers_delivered_in_order_and_recorded_once()
+    test_superseded_and_cleared_requests_are_cancelled()
+    test_cancelled_stream_is_closed()
+    print("All dispatcher checks passed")
@@ -0,0 +1,51 @@
+"""
+Checks for ask_many and the JSONL batch runner
+"""
+
+import io
+import json
+import os
+import tempfile
+
+from batch import run_batch
+from coder_chatbot import FriendlyCodeChatbot
+
+QUESTIONS = ["What is Python?", "explain loops", "hello", "What is a variable?", "git"] * 6
+
+
+def test_ask_many_keeps_order_across_processes():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        bot = FriendlyCodeChatbot(history_file=path)
+        answers = bot.ask_many(QUESTIONS, workers=2, chunksize=4)
+        assert answers == [bot.get_smart_response(q) for q in QUESTIONS]
+        bot.journal.close()
+        assert [q for q, _ in FriendlyCodeChatbot(history_file=path).history] == QUESTIONS
+
+
+def test_run_batch_streams_jsonl():
+    bot = FriendlyCodeChatbot(history_file=None)
+    lines = [json.dumps({"id": i, "question": q}) for i, q in enumerate(QUESTIONS)]
+    lines.insert(3, json.dumps("a bare question string"))
+    output = io.StringIO()
+    count = run_batch(bot, lines, output, workers=1, chunksize=8)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == len(results) == len(QUESTIONS) + 1
+    assert results[0]["rule"] == "python" and results[0]["id"] == 0
+    assert results[3]["question"] == "a bare question string"
+    assert len(bot.history) == count
+
+
+def test_standard_streams_stay_open():
+    import sys
+    from batch import open_input, open_output
+    with open_input("-") as input_file, open_output("-") as output_file:
+        assert input_file is sys.stdin and output_file is sys.stdout
+    assert not sys.stdin.closed and not sys.stdout.closed
+
+
+if __name__ == "__main__":
+    test_ask_many_keeps_order_across_processes()
+    test_run_batch_streams_jsonl()
+    test_standard_streams_stay_open()
+    print("All batch checks passed")
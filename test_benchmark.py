@@ -0,0 +1,40 @@
+"""
+Checks for the benchmark corpus and regression comparison
+"""
+
+import random
+
+from benchmark import compare_results, rule_questions
+from coder_chatbot import FriendlyCodeChatbot
+
+
+def test_corpus_is_reproducible_and_hits_its_rules():
+    bot = FriendlyCodeChatbot(history_file=None)
+    first = rule_questions(bot.pack, random.Random(1), per_rule=20)
+    assert first == rule_questions(bot.pack, random.Random(1), per_rule=20)
+    assert all(bot.respond(q)[1] == "python_list" for q in first["python_list"])
+    assert all(bot.respond(q)[1] == "default" for q in first["default"])
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"metrics": {
+        "ask": {"value": 1.0, "unit": "ms", "better": "lower"},
+        "throughput": {"value": 100.0, "unit": "questions/s", "better": "higher"},
+    }}
+    current = {"metrics": {
+        "ask": {"value": 1.1, "unit": "ms", "better": "lower"},
+        "throughput": {"value": 50.0, "unit": "questions/s", "better": "higher"},
+        "new_metric": {"value": 5.0, "unit": "ms", "better": "lower"},
+    }}
+    regressions = compare_results(baseline, current, tolerance=0.2)
+    assert [name for name, *_ in regressions] == ["throughput"]
+    # A count that was zero has no relative change; any increase is a regression
+    lost = {"metrics": {"lost": {"value": 0, "unit": "records", "better": "lower"}}}
+    assert compare_results(lost, lost) == []
+    assert [name for name, *_ in compare_results(lost, {"metrics": {"lost": dict(lost["metrics"]["lost"], value=3)}})] == ["lost"]
+
+
+if __name__ == "__main__":
+    test_corpus_is_reproducible_and_hits_its_rules()
+    test_compare_flags_only_real_regressions()
+    print("All benchmark checks passed")
@@ -0,0 +1,105 @@
+"""
+Checks for the display-independent parts of the chat views
+"""
+
+import random
+from concurrent.futures import Future
+
+from chat_views import THEMES, StyleRegistry, _HeightIndex, message_pieces
+
+
+class FakeWidget:
+    def __init__(self):
+        self.options = {}
+        self.tags = {}
+        self.bubble_styles = None
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def tag_configure(self, tag, **options):
+        self.tags[tag] = options
+
+    def set_styles(self, styles, bg=None):
+        self.bubble_styles = styles
+        self.options["bg"] = bg
+
+
+def test_height_index_matches_brute_force():
+    rng = random.Random(7)
+    index = _HeightIndex()
+    heights = []
+    for _ in range(300):
+        value = rng.randint(0, 60)
+        index.append(value)
+        heights.append(value)
+    for _ in range(200):
+        i = rng.randrange(len(heights))
+        heights[i] = rng.randint(0, 60)
+        index.set(i, heights[i])
+    assert index.total() == sum(heights)
+    for i in range(0, len(heights), 17):
+        assert index.prefix(i) == sum(heights[:i])
+    for y in range(0, sum(heights), 97):
+        found = index.find(y)
+        assert sum(heights[:found]) <= y < sum(heights[:found + 1])
+
+
+def test_style_registry_applies_theme_to_registered_widgets():
+    styles = StyleRegistry(theme="dark")
+    window, text, bubbles = FakeWidget(), FakeWidget(), FakeWidget()
+    styles.register(window, "window")
+    styles.register(text, "text")
+    styles.register(text, "tags")
+    styles.register(bubbles, "bubbles")
+    assert window.options["bg"] == THEMES["dark"]["roles"]["window"]["bg"]
+    assert text.tags["User"] == THEMES["dark"]["tags"]["User"]
+    styles.apply("light")
+    assert window.options["bg"] == THEMES["light"]["roles"]["window"]["bg"]
+    assert text.options["fg"] == THEMES["light"]["roles"]["text"]["fg"]
+    assert text.tags["Bot"] == THEMES["light"]["tags"]["Bot"]
+    assert bubbles.bubble_styles is THEMES["light"]["bubbles"]
+    assert bubbles.options["bg"] == THEMES["light"]["roles"]["window"]["bg"]
+
+
+class SlowHighlighter:
+    """Hands out Futures that the test completes by hand"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, code, language=""):
+        future = Future()
+        self.futures.append((future, code))
+        return future
+
+
+def test_message_pieces_chunk_and_tag_code():
+    message = "Intro text\n```python\nimport os\n```\n" + "tail " * 10
+    highlighter = SlowHighlighter()
+    pieces = message_pieces("Bot", message, highlighter, chunk=8)
+    first = next(pieces)
+    assert first == ("Intro te", ("Bot",))
+    # The block was submitted as soon as the first piece was asked for
+    (future, code), = highlighter.futures
+    assert code == "import os"
+    collected = [first]
+    for piece in pieces:
+        if isinstance(piece, Future):
+            # Still tokenizing: the caller comes back later
+            future.set_result([(0, 6, "keyword")])
+            continue
+        collected.append(piece)
+    assert "".join(text for text, _ in collected) == message
+    assert all(len(text) <= 8 for text, _ in collected)
+    assert ("import", ("Bot", "code", "code_keyword")) in collected
+    assert (" os", ("Bot", "code")) in collected
+    # Without a highlighter code is still marked as code
+    assert ("import os", ("Bot", "code")) in list(message_pieces("Bot", message))
+
+
+if __name__ == "__main__":
+    test_height_index_matches_brute_force()
+    test_style_registry_applies_theme_to_registered_widgets()
+    test_message_pieces_chunk_and_tag_code()
+    print("All chat view checks passed")
@@ -0,0 +1,72 @@
+"""
+Checks for code block detection and the cached background highlighter
+"""
+
+from code_highlight import COMMENT, KEYWORD, NUMBER, STRING, BUILTIN, Highlighter, code_spans, tokenize
+
+ANSWER = """Try this:
+
+```python
+def greet(name):
+    return f"Hi {name}"  # friendly
+```
+
+Or in JavaScript:
+~~~js
+const n = 42;
+~~~
+
+    indented = True
+"""
+
+
+def kinds(code, language=""):
+    return [(code[start:end], kind) for start, end, kind in tokenize(code, language)]
+
+
+def test_code_spans():
+    spans = code_spans(ANSWER)
+    assert [(ANSWER[start:end], language) for start, end, language in spans] == [
+        ('def greet(name):\n    return f"Hi {name}"  # friendly', "python"),
+        ("const n = 42;", "js"),
+        ("    indented = True", ""),
+    ]
+    # An unclosed fence runs to the end of the text
+    assert [(s, e) for s, e, _ in code_spans("x\n```\nopen")] == [(6, 10)]
+    assert code_spans("no code here") == []
+
+
+def test_tokenize_by_language():
+    assert kinds('def greet(name):\n    return f"Hi {name}"  # friendly', "python") == [
+        ("def", KEYWORD), ("return", KEYWORD), ('f"Hi {name}"', STRING), ("# friendly", COMMENT)]
+    assert kinds("const n = 42; // answer", "js") == [
+        ("const", KEYWORD), ("42", NUMBER), ("// answer", COMMENT)]
+    assert kinds("SELECT count(*) FROM t -- all", "sql") == [
+        ("SELECT", KEYWORD), ("count", BUILTIN), ("FROM", KEYWORD), ("-- all", COMMENT)]
+    # No language name: guessed from the code
+    assert kinds("print(len(items))") == [("print", BUILTIN), ("len", BUILTIN)]
+    assert kinds("let total = 0;")[0] == ("let", KEYWORD)
+
+
+def test_highlighter_caches_per_snippet():
+    highlighter = Highlighter(cache_size=2)
+    try:
+        tokens = highlighter.submit("x = 1", "python").result(timeout=5)
+        assert tokens == tokenize("x = 1", "python")
+        # Known snippets come back as an already finished future
+        cached = highlighter.submit("x = 1", "python")
+        assert cached.done() and cached.result() is tokens
+        highlighter.submit("y = 2", "python").result(timeout=5)
+        highlighter.submit("z = 3", "python").result(timeout=5)
+        # Least recently used snippet is dropped first
+        assert highlighter.submit("z = 3", "python").done()
+        assert highlighter.submit("x = 1", "python").result(timeout=5) is not tokens
+    finally:
+        highlighter.close()
+
+
+if __name__ == "__main__":
+    test_code_spans()
+    test_tokenize_by_language()
+    test_highlighter_caches_per_snippet()
+    print("All code highlight checks passed")
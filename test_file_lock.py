@@ -0,0 +1,55 @@
+"""
+Checks for the advisory inter-process file lock
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+from file_lock import FileLock
+
+
+def _try_lock(path, queue):
+    lock = FileLock(path, timeout=0.05)
+    try:
+        with lock:
+            queue.put("acquired")
+    except TimeoutError:
+        queue.put("timeout")
+    lock.close()
+
+
+def _other_process_result(path):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_try_lock, args=(path, queue))
+    process.start()
+    process.join()
+    return queue.get()
+
+
+def test_lock_excludes_other_processes():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl.lock")
+        lock = FileLock(path)
+        with lock:
+            assert _other_process_result(path) == "timeout"
+        assert _other_process_result(path) == "acquired"
+        lock.close()
+
+
+def test_lock_is_reentrant():
+    with tempfile.TemporaryDirectory() as folder:
+        lock = FileLock(os.path.join(folder, "x.lock"))
+        with lock:
+            with lock.shared():
+                assert lock.locked
+            assert lock.locked
+        assert not lock.locked
+        lock.close()
+
+
+if __name__ == "__main__":
+    test_lock_excludes_other_processes()
+    test_lock_is_reentrant()
+    print("All file lock checks passed")
@@ -0,0 +1,35 @@
+"""
+Checks for the typo-tolerant deletion index
+"""
+
+from fuzzy_match import DeletionIndex, deletions, edit_distance, max_edits
+
+
+def test_edit_limits_grow_with_word_length():
+    assert [max_edits(word) for word in ("git", "case", "class", "function", "javascript")] == [0, 0, 1, 1, 2]
+    assert deletions("abc", 1) == {"abc", "bc", "ac", "ab"}
+    assert edit_distance("pyhton", "python", 2) == 1      # swapped letters count once
+    assert edit_distance("javscript", "javascript", 2) == 1
+    assert edit_distance("abcdef", "badcfe", 2) == 3     # stops counting past the limit
+
+
+def test_lookup():
+    index = DeletionIndex(["python", "javascript", "dictionary", "function", "array", "case", "base"])
+    assert index.lookup("pyhton") == "python"
+    assert index.lookup("javscript") == "javascript"
+    assert index.lookup("dictinary") == "dictionary"
+    assert index.lookup("fucntion") == "function"
+    assert index.lookup("aray") == "array"                # the limit follows the intended word
+    assert index.lookup("python") == "python"
+    # Short words and words too far away are left alone
+    assert index.lookup("cse") is None
+    assert index.lookup("bass") is None
+    assert index.lookup("pthn") is None
+    assert index.lookup("fictional") is None
+    assert index.lookup("pyhton") == "python"             # cached answer is the same
+
+
+if __name__ == "__main__":
+    test_edit_limits_grow_with_word_length()
+    test_lookup()
+    print("All fuzzy match checks passed")
@@ -0,0 +1,248 @@
+"""
+Checks for the append-only history journal
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import weakref
+
+from history_store import HistoryArchive, HistoryJournal
+
+
+def test_append_and_reload():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path, durability="fsync")
+        journal.append("What is Python?", "Python is amazing!")
+        journal.extend([("q2", "a2"), ("q3", "a3")])
+        journal.close()
+        with open(path, "r", encoding="utf-8") as f:
+            assert len(f.readlines()) == 3
+        assert HistoryJournal(path).load() == [("What is Python?", "Python is amazing!"), ("q2", "a2"), ("q3", "a3")]
+
+
+def test_batched_records_are_visible_after_flush():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path, durability="batch", batch_size=100)
+        for i in range(10):
+            journal.append(f"q{i}", f"a{i}")
+        journal.flush()
+        assert len(HistoryJournal(path).load()) == 10
+        journal.close()
+
+
+def test_legacy_json_is_converted():
+    with tempfile.TemporaryDirectory() as folder:
+        legacy = os.path.join(folder, "history.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([["old question", "old answer"]], f)
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path, legacy_path=legacy)
+        assert journal.load() == [("old question", "old answer")]
+        journal.append("new question", "new answer")
+        journal.close()
+        assert HistoryJournal(path).load() == [("old question", "old answer"), ("new question", "new answer")]
+
+
+def test_torn_line_and_clear_are_compacted():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        with open(path, "wb") as f:
+            f.write(b'{"q": "lost", "a": "x"}\n{"op": "clear"}\n{"q": "kept", "a": "y"}\n{"q": "torn')
+        journal = HistoryJournal(path, compact_threshold=1)
+        journal.append("after crash", "z")
+        journal.wait_for_compaction()
+        journal.close()
+        with open(path, "rb") as f:
+            lines = f.read().splitlines()
+        assert [json.loads(line)["q"] for line in lines] == ["kept", "after crash"]
+
+
+def test_tail_pages_match_full_load():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path, durability="none")
+        journal.extend([(f"old{i}", "x") for i in range(50)])
+        journal.clear()
+        journal.extend([(f"q{i}", f"line one\nline {i}") for i in range(1000)])
+        journal.close()
+        journal = HistoryJournal(path)
+        turns, cursor = journal.load_tail(100)
+        assert turns[-1] == ("q999", "line one\nline 999") and len(turns) == 100
+        while cursor is not None:
+            older, cursor = journal.load_before(cursor, 333)
+            turns = older + turns
+        # Paging stops at the clear marker, like a full load
+        assert turns == journal.load()
+        # A compaction moves every offset; the cursor falls back to counting
+        _, cursor = journal.load_tail(10)
+        journal.compact()
+        older, cursor = journal.load_before(cursor, 10, newer=10)
+        assert older[-1][0] == "q989" and cursor is None
+        journal.close()
+
+
+def test_compaction_rotates_old_turns_into_archive():
+    for compression in ("gzip", "lzma"):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "history.jsonl")
+            archive = HistoryArchive(os.path.join(folder, "history.archive"), compression)
+            journal = HistoryJournal(path, durability="none", archive=archive, keep_turns=10)
+            expected = []
+            for batch in range(3):
+                turns = [(f"q{batch}-{i}", "same canned answer") for i in range(25)]
+                expected.extend(turns)
+                journal.extend(turns)
+                journal.compact()
+            assert len(archive.segments()) == 3
+            assert journal.load() == expected[-10:]
+            assert list(journal.iter_all()) == expected
+            journal.clear()
+            assert archive.segments() == [] and list(journal.iter_all()) == []
+            journal.close()
+
+
+class _Pack:
+    """Just the parts of KnowledgePack the journal uses"""
+
+    def __init__(self, answers, fingerprint="v1"):
+        self.answers = answers
+        self.fingerprint = fingerprint
+
+    def rule_for_answer(self, text):
+        return next((rule for rule, answer in self.answers.items() if answer == text), None)
+
+    def has_answer(self, rule_id):
+        return rule_id in self.answers
+
+    def answer(self, rule_id):
+        return self.answers[rule_id]
+
+
+def test_pack_answers_are_stored_as_references():
+    canned = "A long canned answer about lists. " * 40
+    pack = _Pack({"python_list": canned})
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        archive = HistoryArchive(os.path.join(folder, "history.archive"))
+        journal = HistoryJournal(path, durability="none", archive=archive, keep_turns=5,
+                                 answer_source=lambda: pack)
+        expected = []
+        for i in range(30):
+            turn = (f"list question {i}", canned) if i % 3 else (f"other {i}", f"generated {i}")
+            expected.append(turn)
+            journal.append(*turn)
+        journal.close()
+        # The canned text is written once, not once per turn
+        with open(path, "rb") as f:
+            assert f.read().count(canned.encode("utf-8")) == 1
+        # Another process with a newer knowledge pack resolves the old answers from the file
+        pack.answers = {"python_list": "changed"}
+        pack.fingerprint = "v2"
+        reader = HistoryJournal(path, archive=archive, keep_turns=5, answer_source=lambda: pack)
+        loaded = reader.load()
+        assert loaded == expected and loaded[1][1] is loaded[2][1]
+        # A tail page starting after the definition still resolves it
+        assert reader.load_tail(4)[0] == expected[-4:]
+        reader.compact()
+        # Compaction keeps the definition and gives archive segments their own copy
+        assert list(HistoryJournal(path, archive=archive).iter_all()) == expected
+        assert len(archive.segments()) == 1
+        reader.close()
+
+
+def _append_turns(path, writer, count):
+    journal = HistoryJournal(path, durability="none", compact_threshold=4096,
+                             archive=HistoryArchive(path + ".archive"), keep_turns=20)
+    for i in range(count):
+        journal.append(f"w{writer}-{i}", "answer " * 20)
+    journal.wait_for_compaction()
+    journal.close()
+
+
+def test_concurrent_processes_lose_no_turns():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=_append_turns, args=(path, w, 150)) for w in range(3)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        journal = HistoryJournal(path, archive=HistoryArchive(path + ".archive"))
+        questions = [q for q, _ in journal.iter_all()]
+        journal.close()
+        assert sorted(questions) == sorted(f"w{w}-{i}" for w in range(3) for i in range(150))
+        # Each writer's own turns stay in order
+        assert [q for q in questions if q.startswith("w1-")] == [f"w1-{i}" for i in range(150)]
+
+
+def test_bot_history_window_stays_bounded():
+    from coder_chatbot import FriendlyCodeChatbot
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        bot = FriendlyCodeChatbot(history_file=path, durability="none", history_window=50)
+        bot.journal.compact_threshold = 2000
+        for i in range(300):
+            bot.ask(f"what is python {i}")
+        bot.journal.wait_for_compaction()
+        bot.save_history()
+        assert len(bot.history) == 50 and bot.history[-1][0] == "what is python 299"
+        assert [q for q, _ in bot.iter_history()] == [f"what is python {i}" for i in range(300)]
+        bot.journal.close()
+        reloaded = FriendlyCodeChatbot(history_file=path, history_window=50)
+        assert list(reloaded.history) == list(bot.history)
+        reloaded.journal.close()
+
+
+def test_older_page_never_pushes_out_newer_turns():
+    from coder_chatbot import FriendlyCodeChatbot
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path)
+        journal.extend([(f"q{i}", "a") for i in range(10)])
+        journal.close()
+        bot = FriendlyCodeChatbot(history_file=path, history_limit=2, history_window=5)
+        original = bot.journal.load_before
+
+        def load_before(*args, **kwargs):
+            # The history writer records two turns while the older page is read
+            bot.record([("new1", "a"), ("new2", "a")])
+            return original(*args, **kwargs)
+
+        bot.journal.load_before = load_before
+        assert bot.load_older_history() == [("q7", "a")]
+        assert [q for q, _ in bot.history_snapshot()] == ["q7", "q8", "q9", "new1", "new2"]
+        assert not bot.has_older_history()
+        bot.journal.close()
+
+
+def test_unclosed_journals_can_be_collected():
+    import history_store
+    with tempfile.TemporaryDirectory() as folder:
+        journal = HistoryJournal(os.path.join(folder, "history.jsonl"))
+        journal.append("q", "a")
+        assert journal in history_store._open_journals
+        journal.close()
+        assert journal not in history_store._open_journals
+        ref = weakref.ref(HistoryJournal(os.path.join(folder, "other.jsonl")))
+        # Nothing but the exit hook's weak set refers to it
+        assert ref() is None
+
+
+if __name__ == "__main__":
+    test_append_and_reload()
+    test_batched_records_are_visible_after_flush()
+    test_legacy_json_is_converted()
+    test_torn_line_and_clear_are_compacted()
+    test_tail_pages_match_full_load()
+    test_compaction_rotates_old_turns_into_archive()
+    test_pack_answers_are_stored_as_references()
+    test_concurrent_processes_lose_no_turns()
+    test_bot_history_window_stays_bounded()
+    test_older_page_never_pushes_out_newer_turns()
+    test_unclosed_journals_can_be_collected()
+    print("All history journal checks passed")
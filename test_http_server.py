@@ -0,0 +1,162 @@
+"""
+Checks for the asyncio HTTP/JSON server
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+
+from coder_chatbot import FriendlyCodeChatbot
+import http_server
+from http_server import ChatServer
+from metrics import Metrics
+
+
+async def request(reader, writer, method, path, payload=None, headers=""):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{headers}"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line == "\r\n":
+            break
+        name, _, value = line.partition(":")
+        response_headers[name.lower()] = value.strip()
+    data = await reader.readexactly(int(response_headers["content-length"]))
+    if response_headers["content-type"].startswith("text/plain"):
+        return status, data.decode("utf-8")
+    return status, json.loads(data)
+
+
+def test_keep_alive_and_sessions():
+    async def scenario():
+        server = ChatServer(FriendlyCodeChatbot(history_file=None, metrics=Metrics()), port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        status, first = await request(reader, writer, "POST", "/ask", {"question": "What is git?"})
+        assert status == 200 and first["rule"] == "git"
+        session = first["session"]
+        # Same connection, same session
+        status, second = await request(reader, writer, "POST", "/ask",
+                                       {"question": "hello", "session": session})
+        assert status == 200 and second["session"] == session
+        status, history = await request(reader, writer, "GET", f"/history?session={session}")
+        assert [turn["question"] for turn in history["history"]] == ["What is git?", "hello"]
+        status, text = await request(reader, writer, "GET", "/metrics")
+        assert status == 200 and 'chatbot_rule_hits_total{rule="git"} 1' in text
+        status, _ = await request(reader, writer, "GET", "/missing")
+        assert status == 404
+        status, _ = await request(reader, writer, "GET", "/ask")
+        assert status == 405
+        writer.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_saved_sessions_search_and_paging():
+    async def scenario(bot):
+        server = ChatServer(bot, port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        for question in ("What is git?", "git branches", "hello"):
+            await request(reader, writer, "POST", "/ask", {"question": question, "session": "s1"})
+        await request(reader, writer, "POST", "/ask", {"question": "git tags", "session": "s2"})
+        status, found = await request(reader, writer, "GET", "/search?q=git&session=s1")
+        assert status == 200 and [r["question"] for r in found["results"]] == ["git branches", "What is git?"]
+        # Saved sessions page back from the database, not only from memory
+        server.sessions = type(server.sessions)()
+        status, page = await request(reader, writer, "GET", "/history?session=s1&limit=2")
+        assert [turn["question"] for turn in page["history"]] == ["git branches", "hello"]
+        status, page = await request(reader, writer, "GET", f"/history?session=s1&limit=2&before={page['next']}")
+        assert [turn["question"] for turn in page["history"]] == ["What is git?"] and page["next"] is None
+        status, _ = await request(reader, writer, "GET", "/search")
+        assert status == 400
+        # Pages never grow past MAX_PAGE_SIZE, whatever limit asks for
+        http_server.MAX_PAGE_SIZE = 1
+        try:
+            status, found = await request(reader, writer, "GET", "/search?q=git&limit=1000000")
+            assert len(found["results"]) == 1 and found["next"] is not None
+            status, page = await request(reader, writer, "GET", "/history?session=s1&limit=1000000")
+            assert [turn["question"] for turn in page["history"]] == ["hello"]
+        finally:
+            http_server.MAX_PAGE_SIZE = 200
+        writer.close()
+        await server.stop()
+
+    with tempfile.TemporaryDirectory() as folder:
+        bot = FriendlyCodeChatbot(history_file=os.path.join(folder, "history.jsonl"), history_backend="sqlite")
+        asyncio.run(scenario(bot))
+        bot.journal.close()
+
+
+def test_bad_content_length_is_rejected():
+    async def scenario():
+        server = ChatServer(FriendlyCodeChatbot(history_file=None), port=0)
+        await server.start()
+        for length, expected in (("-5", 400), ("many", 400), (str(http_server.MAX_BODY_SIZE + 1), 413)):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(f"POST /ask HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            assert status == expected, length
+            writer.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_and_backpressure():
+    bot = FriendlyCodeChatbot(history_file=None)
+    calls = []
+    release = threading.Event()
+    original = bot.respond
+
+    def slow_respond(question):
+        calls.append(question)
+        release.wait(5)
+        return original(question)
+
+    bot.respond = slow_respond
+
+    async def scenario():
+        server = ChatServer(bot, port=0, workers=1, queue_size=1)
+        await server.start()
+        connections = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(4)]
+
+        async def ask(index, question):
+            reader, writer = connections[index]
+            return await request(reader, writer, "POST", "/ask", {"question": question})
+
+        # Two identical questions share one computation
+        first = asyncio.create_task(ask(0, "What is Python?"))
+        second = asyncio.create_task(ask(1, "what is python"))
+        await asyncio.sleep(0.1)
+        # The worker is busy and one more question fills the queue
+        third = asyncio.create_task(ask(2, "explain loops"))
+        await asyncio.sleep(0.1)
+        status, body = await ask(3, "what is a variable")
+        assert status == 503, body
+        release.set()
+        results = await asyncio.gather(first, second, third)
+        assert all(status == 200 for status, _ in results)
+        assert results[0][1]["answer"] == results[1][1]["answer"]
+        assert sorted(calls) == ["What is Python?", "explain loops"]
+        for _, writer in connections:
+            writer.close()
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_keep_alive_and_sessions()
+    test_saved_sessions_search_and_paging()
+    test_bad_content_length_is_rejected()
+    test_single_flight_and_backpressure()
+    print("All HTTP server checks passed")
@@ -0,0 +1,118 @@
+"""
+Checks for loading and compiling the knowledge pack
+"""
+
+import json
+import os
+import tempfile
+import time
+
+import knowledge_pack
+from knowledge_pack import COMPILED_NAME, KnowledgePack, KnowledgePackError
+
+
+def write_pack(folder, answer="First answer", version=1):
+    os.makedirs(os.path.join(folder, "answers"), exist_ok=True)
+    spec = {
+        "format": 1,
+        "name": "test",
+        "version": version,
+        "rules": [
+            {"id": "topic", "keywords": ["topic"], "priority": 1, "answer": "answers/topic.md"},
+            {"id": "group", "keywords": ["group"], "priority": 2},
+            {"id": "default", "keywords": [], "answer": "answers/default.md"},
+        ],
+    }
+    with open(os.path.join(folder, "pack.json"), "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+    with open(os.path.join(folder, "answers", "topic.md"), "w", encoding="utf-8") as f:
+        f.write(answer + "\n")
+    with open(os.path.join(folder, "answers", "default.md"), "w", encoding="utf-8") as f:
+        f.write("Default 🚀\n")
+
+
+def test_compile_and_lazy_answers():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        pack = KnowledgePack.load(folder)
+        assert os.path.exists(os.path.join(folder, COMPILED_NAME))
+        assert pack.version == 1
+        assert pack.answer("topic") == "First answer"
+        assert pack.answer("default") == "Default 🚀"
+        assert not pack.has_answer("group")
+        assert pack.matcher.match("a topic question").rule_id == "topic"
+        # The history journal stores these answers as references
+        assert pack.answer("topic") is pack.answer("topic")
+        assert pack.rule_for_answer("Default 🚀") == "default"
+        assert pack.rule_for_answer("Default 🚀 and more") is None
+        pack.close()
+
+
+def test_recompiles_when_sources_change():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        first = KnowledgePack.load(folder)
+        fingerprint = first.fingerprint
+        first.close()
+        time.sleep(0.01)
+        write_pack(folder, answer="Second answer", version=2)
+        second = KnowledgePack.load(folder)
+        assert second.answer("topic") == "Second answer"
+        assert second.version == 2
+        assert second.fingerprint != fingerprint
+        second.close()
+
+
+def test_recompile_reads_only_changed_answers():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        first = KnowledgePack.load(folder)
+        first.matcher
+        time.sleep(0.01)
+        with open(os.path.join(folder, "answers", "topic.md"), "w", encoding="utf-8") as f:
+            f.write("Edited answer\n")
+        read = []
+        original = knowledge_pack._read_answer
+        knowledge_pack._read_answer = lambda source_dir, path: read.append(path) or original(source_dir, path)
+        try:
+            second = KnowledgePack.load(folder, previous=first)
+        finally:
+            knowledge_pack._read_answer = original
+        assert read == ["answers/topic.md"]
+        assert second.answer("topic") == "Edited answer"
+        assert second.answer("default") == "Default 🚀"
+        # Same content as a full compile, so fingerprints stay comparable
+        assert second.fingerprint == KnowledgePack(knowledge_pack.compile_pack(folder)).fingerprint
+        # The rules did not change: the trie and typo index are shared
+        assert second.matcher is first.matcher
+        first.close()
+        second.close()
+
+
+def test_compiled_pack_without_sources():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        KnowledgePack.load(folder).close()
+        os.remove(os.path.join(folder, "pack.json"))
+        pack = KnowledgePack.load(folder)
+        assert pack.answer("topic") == "First answer"
+        pack.close()
+
+
+def test_missing_pack_raises():
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            KnowledgePack.load(folder)
+        except (OSError, KnowledgePackError):
+            pass
+        else:
+            raise AssertionError("Loading an empty folder should fail")
+
+
+if __name__ == "__main__":
+    test_compile_and_lazy_answers()
+    test_recompiles_when_sources_change()
+    test_recompile_reads_only_changed_answers()
+    test_compiled_pack_without_sources()
+    test_missing_pack_raises()
+    print("All knowledge pack checks passed")
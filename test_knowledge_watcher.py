@@ -0,0 +1,151 @@
+"""
+Checks for reloading the knowledge pack while the chatbot runs
+"""
+
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from coder_chatbot import FriendlyCodeChatbot
+from knowledge_pack import KnowledgePack
+from knowledge_watcher import KnowledgeWatcher
+
+RULES = [
+    {"id": "short_message", "keywords": [], "answer": "answers/short_message.md"},
+    {"id": "topic", "keywords": ["topic"], "priority": 1, "answer": "answers/topic.md"},
+    {"id": "default", "keywords": [], "answer": "answers/default.md"},
+]
+
+_edits = itertools.count(1)
+
+
+def write_file(folder, name, text):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    # Make every edit visible to the size/mtime stamps, however fast the test runs
+    stamp = time.time_ns() + next(_edits) * 10 ** 9
+    os.utime(path, ns=(stamp, stamp))
+
+
+def write_pack(folder, rules=RULES):
+    write_file(folder, "pack.json", json.dumps({"format": 1, "name": "test", "version": 1, "rules": rules}))
+    write_file(folder, "answers/short_message.md", "Short\n")
+    write_file(folder, "answers/topic.md", "Topic v1\n")
+    write_file(folder, "answers/default.md", "Default\n")
+
+
+def test_edits_go_live_and_broken_packs_are_kept_out():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        bot = FriendlyCodeChatbot(history_file=None)
+        bot.use_pack(KnowledgePack.load(folder))
+        reloaded = []
+        watcher = KnowledgeWatcher(bot, on_reload=reloaded.append)
+        assert watcher.check() is None
+        assert bot.get_smart_response("tell me about the topic") == "Topic v1"
+
+        old_pack = bot.pack
+        write_file(folder, "answers/topic.md", "Topic v2\n")
+        assert watcher.check() is bot.pack is not old_pack
+        assert reloaded == [bot.pack]
+        assert bot.get_smart_response("tell me about the topic") == "Topic v2"
+        # A question already answering from the old pack still sees the old answer
+        assert old_pack.answer("topic") == "Topic v1"
+
+        # Invalid JSON, then a rule with an unknown parent: the last good pack stays live
+        live = bot.pack
+        write_file(folder, "pack.json", "{not json")
+        assert watcher.check() is None and watcher.check() is None
+        assert watcher.errors == 1 and bot.pack is live
+        write_pack(folder, RULES + [{"id": "orphan", "keywords": ["orphan"], "parent": "missing"}])
+        assert watcher.check() is None and bot.pack is live
+        assert bot.get_smart_response("tell me about the topic") == "Topic v2"
+
+        write_pack(folder)
+        assert watcher.check() is bot.pack is not live
+        assert watcher.reloads == 2 and watcher.errors == 2
+
+
+def test_rejected_pack_is_closed():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        bot = FriendlyCodeChatbot(history_file=None)
+        bot.use_pack(KnowledgePack.load(folder))
+        live = bot.pack
+        offered = []
+        original = bot.use_pack
+        bot.use_pack = lambda pack: (offered.append(pack), original(pack))
+        # Loads fine, but the bot refuses a pack without a default answer
+        write_pack(folder, [rule for rule in RULES if rule["id"] != "default"])
+        watcher = KnowledgeWatcher(bot)
+        assert watcher.check() is None and bot.pack is live and watcher.errors == 1
+        (rejected,) = offered
+        assert rejected is not live and rejected._data.closed
+        assert not live._data.closed
+
+
+def test_watcher_thread_reloads_in_the_background():
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        bot = FriendlyCodeChatbot(history_file=None)
+        bot.use_pack(KnowledgePack.load(folder))
+        watcher = KnowledgeWatcher(bot, interval=0.01).start()
+        try:
+            write_file(folder, "answers/topic.md", "Topic v2\n")
+            deadline = time.monotonic() + 5
+            while watcher.reloads == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert bot.get_smart_response("topic please") == "Topic v2"
+        finally:
+            watcher.stop()
+
+
+def test_reload_keeps_metrics_registered_once():
+    from metrics import Metrics
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder)
+        metrics = Metrics()
+        bot = FriendlyCodeChatbot(history_file=None, metrics=metrics)
+        gauges = dict(metrics._gauges)
+        bot.respond("tell me about python")
+        bot.use_pack(KnowledgePack.load(folder))
+        assert metrics._gauges == gauges
+        assert metrics.counter("rule_hits_total", rule="python") == 1
+        assert "topic" in str(metrics.snapshot()["counters"])
+
+
+def test_reload_updates_the_retrieval_index_in_place():
+    rules = RULES + [{"id": "extra", "keywords": ["extra"], "answer": "answers/extra.md"}]
+    with tempfile.TemporaryDirectory() as folder:
+        write_pack(folder, rules)
+        write_file(folder, "answers/extra.md", "Decorators wrap functions\n")
+        bot = FriendlyCodeChatbot(history_file=None)
+        bot.use_pack(KnowledgePack.load(folder))
+        index = bot.retriever()
+        assert index.search("decorators")[0][0] == "extra"
+        added = []
+        original = index.add_document
+        index.add_document = lambda doc_id, text: (added.append(doc_id), original(doc_id, text))
+
+        write_file(folder, "answers/topic.md", "Generators yield values\n")
+        bot.use_pack(KnowledgePack.load(folder, previous=bot.pack))
+        assert bot.retriever() is index and added == ["topic"]
+        assert index.search("generators")[0][0] == "topic"
+
+        write_pack(folder)
+        bot.use_pack(KnowledgePack.load(folder, previous=bot.pack))
+        assert bot.retriever() is index and "extra" not in index
+        assert index.search("decorators") == []
+
+
+if __name__ == "__main__":
+    test_edits_go_live_and_broken_packs_are_kept_out()
+    test_rejected_pack_is_closed()
+    test_watcher_thread_reloads_in_the_background()
+    test_reload_keeps_metrics_registered_once()
+    test_reload_updates_the_retrieval_index_in_place()
+    print("All knowledge watcher checks passed")
@@ -0,0 +1,119 @@
+"""
+Checks for the compiled intent matcher behind get_smart_response
+"""
+
+from coder_chatbot import FriendlyCodeChatbot
+from intent_matcher import IntentMatcher, Rule, tokenize
+from knowledge_pack import KnowledgePack
+
+RULES = KnowledgePack.load().rules
+
+
+def winner(matcher, question):
+    rule = matcher.match(question)
+    return rule.rule_id if rule else None
+
+
+def test_priority_order():
+    matcher = IntentMatcher(RULES)
+    cases = {
+        "hello": "greeting",
+        "hello there my friend": None,
+        "How do I create a function in Python?": "python_function",
+        "What are JavaScript arrays?": "javascript_array",
+        "deepfake detection": "deepfake",
+        "computer vision": "computer_vision",
+        "machine learning": "ai_ml",
+        "what is a variable": "variable",
+        "explain loops": "loop",
+        "how do I sum numbers in javascript": "math",
+    }
+    for question, expected in cases.items():
+        assert winner(matcher, question) == expected, question
+
+
+def test_word_boundaries():
+    matcher = IntentMatcher(RULES)
+    # "ai" inside "explain", "def" inside "default", "hi" inside "this"
+    assert winner(matcher, "please explain this to me") is None
+    assert winner(matcher, "python default arguments") == "python"
+    assert winner(matcher, "what is a digital signal") is None
+    assert tokenize("Node.js, C and HTML!") == ["node", "js", "c", "and", "html"]
+
+
+def test_fallthrough_and_children():
+    matcher = IntentMatcher([
+        Rule("topic", ["topic"], priority=1, fallthrough=True),
+        Rule("topic_child", ["child"], priority=1, parent="topic"),
+        Rule("later", ["later"], priority=2),
+    ])
+    assert winner(matcher, "topic with child") == "topic_child"
+    assert winner(matcher, "topic later") == "later"
+    assert winner(matcher, "child later") == "later"
+
+
+def test_explain_reports_every_rule_considered():
+    matcher = IntentMatcher(RULES)
+    trace = matcher.explain("how do I sum numbers in javascript")
+    assert trace["winner"] == matcher.match("how do I sum numbers in javascript").rule_id == "math"
+    outcomes = {step["rule"]: (step["outcome"], step["keyword"]) for step in trace["steps"]}
+    assert outcomes["math"] == ("won", "sum")
+    assert outcomes["javascript"] == ("shadowed", "javascript")
+    steps = matcher.explain("hello there my friend")["steps"]
+    assert steps[0]["outcome"] == "skipped" and "at most 2" in steps[0]["reason"]
+    # The bot adds the cache, retrieval and model stages around the rules
+    bot = FriendlyCodeChatbot(history_file=None)
+    bot.respond("tell me about recursion")
+    stats = bot.cache.stats()
+    trace = bot.explain("tell me about recursion")
+    assert [stage["stage"] for stage in trace["stages"]] == ["cache", "rules", "retrieval"]
+    assert trace["stages"][0]["hit"] and trace["rule"] == "default"
+    # Explaining only observes the cache: no new entries, hits or misses
+    assert bot.explain("what is git")["rule"] == "git"
+    assert not bot.explain("what is git")["stages"][0]["hit"]
+    assert bot.cache.stats() == stats
+    assert trace["answer"] == bot.get_smart_response("tell me about recursion")
+    assert bot.history == []
+
+
+def test_typos_match_after_exact_matching_fails():
+    matcher = IntentMatcher(RULES)
+    cases = {
+        "what is pyhton": "python",
+        "what is javscript": "javascript",
+        "dictinary in python": "python_dict",
+        "how do I write a fucntion": "function",
+        "what is a varaible": "variable",
+        # An exact match is only narrowed down, never replaced by another topic
+        "javascript with pyhton": "javascript",
+    }
+    for question, expected in cases.items():
+        assert winner(matcher, question) == expected, question
+    trace = matcher.explain("dictinary in python")
+    assert trace["corrections"] == {"dictinary": "dictionary"}
+    assert trace["tokens"] == ["dictionary", "in", "python"]
+    assert matcher.explain("what is python")["corrections"] == {}
+    assert winner(IntentMatcher(RULES, fuzzy=False), "what is pyhton") is None
+    # Once a parent matched, only words of its children's keywords are corrected to
+    assert matcher.correct(["pyhton", "dictinary"], targets={"dictionary"}) == (
+        ["pyhton", "dictionary"], {"dictinary": "dictionary"})
+    assert matcher.explain("python with javscript")["corrections"] == {}
+    bot = FriendlyCodeChatbot(history_file=None)
+    assert bot.respond("how do I use a pyhton dictinary")[1] == "python_dict"
+
+
+def test_smart_response_uses_rules():
+    bot = FriendlyCodeChatbot()
+    assert bot.get_smart_response("Q").startswith("I see you sent a short message")
+    assert bot.get_smart_response("what is python?").startswith("Python is amazing")
+    assert bot.get_smart_response("help").startswith("I'm here to help with programming")
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_word_boundaries()
+    test_fallthrough_and_children()
+    test_explain_reports_every_rule_considered()
+    test_typos_match_after_exact_matching_fails()
+    test_smart_response_uses_rules()
+    print("All matcher checks passed")
@@ -0,0 +1,58 @@
+"""
+Checks for the in-process metrics
+"""
+
+import os
+import tempfile
+
+from coder_chatbot import FriendlyCodeChatbot
+from metrics import Metrics
+
+
+def test_counters_histograms_and_prometheus_text():
+    metrics = Metrics()
+    metrics.inc("hits_total", rule="python")
+    metrics.inc("hits_total", 2, rule="python")
+    metrics.declare("hits_total", rule="never")
+    metrics.observe("latency_seconds", 0.0003)
+    metrics.observe("latency_seconds", 10.0)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {'hits_total{rule="python"}': 3, 'hits_total{rule="never"}': 0}
+    histogram = snapshot["histograms"]["latency_seconds"]
+    assert histogram["count"] == 2 and histogram["buckets"]["0.0005"] == 1 and histogram["buckets"]["+Inf"] == 2
+    text = metrics.render_prometheus()
+    assert "# TYPE chatbot_hits_total counter" in text
+    assert 'chatbot_latency_seconds_bucket{le="+Inf"} 2' in text
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "metrics.prom")
+        metrics.write(path)
+        with open(path, "r", encoding="utf-8") as f:
+            assert f.read() == text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.inc("hits_total")
+    with metrics.timer("latency_seconds"):
+        pass
+    assert metrics.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def test_bot_counts_rule_hits_and_fallbacks():
+    metrics = Metrics()
+    bot = FriendlyCodeChatbot(history_file=None, metrics=metrics)
+    for question in ("What is git?", "what is git", "qwerty uiop", "hello"):
+        bot.ask(question)
+    assert metrics.counter("rule_hits_total", rule="git") == 2
+    assert metrics.counter("rule_hits_total", rule="css") == 0
+    snapshot = metrics.snapshot()
+    assert 'rule_hits_total{rule="css"}' in snapshot["counters"]
+    assert snapshot["gauges"]["fallback_ratio"] == 0.25
+    assert snapshot["histograms"]["ask_seconds"]["count"] == 4
+
+
+if __name__ == "__main__":
+    test_counters_histograms_and_prometheus_text()
+    test_disabled_metrics_record_nothing()
+    test_bot_counts_rule_hits_and_fallbacks()
+    print("All metrics checks passed")
@@ -0,0 +1,71 @@
+"""
+Checks for the optional local model backend (stand-in model only)
+"""
+
+import threading
+import time
+
+from ask_dispatcher import AskDispatcher
+from coder_chatbot import MODEL_RULE, FriendlyCodeChatbot
+from model_backend import LazyModel, StandInBackend
+
+
+def test_rules_answer_until_the_model_is_ready():
+    release = threading.Event()
+
+    class SlowBackend(StandInBackend):
+        def load(self):
+            release.wait(5)
+
+    model = LazyModel(SlowBackend()).start()
+    bot = FriendlyCodeChatbot(history_file=None, model=model)
+    assert bot.respond("weather idea")[1] == "default"
+    assert bot.respond("What is git?")[1] == "git"
+    release.set()
+    assert model.wait(5) and model.ready
+    answer, rule_id = bot.respond("weather idea")
+    assert rule_id == MODEL_RULE and "stand-in model" in answer
+    # Deterministic, and rules still win over the model
+    assert bot.respond("Weather idea")[0] == answer
+    assert bot.respond("What is git?")[1] == "git"
+
+
+def test_model_answers_stream_in_pieces():
+    model = LazyModel(StandInBackend(token_delay=0.01)).start()
+    model.wait(5)
+    bot = FriendlyCodeChatbot(history_file=None, model=model)
+    rule_id, chunks = bot.stream_response("weather idea")
+    pieces = list(chunks)
+    assert rule_id == MODEL_RULE and len(pieces) > 5
+
+    partials, delivered = [], []
+    done = threading.Event()
+    dispatcher = AskDispatcher(bot, lambda t, a: (delivered.append(a), done.set()),
+                               on_partial=lambda t, text: partials.append(text), partial_interval=0.02)
+    dispatcher.submit("another unmatched question")
+    assert done.wait(5)
+    dispatcher.shutdown(timeout=2)
+    assert partials and all(delivered[0].startswith(text) for text in partials)
+    assert bot.history == [("another unmatched question", delivered[0])]
+
+
+def test_failed_load_keeps_rule_answers():
+    class BrokenBackend(StandInBackend):
+        def load(self):
+            raise OSError("no weights in the local cache")
+
+    model = LazyModel(BrokenBackend()).start()
+    states = []
+    model.on_loaded(lambda loaded: states.append(loaded.state))
+    model.wait(5)
+    time.sleep(0.01)
+    assert states == ["failed"] and not model.ready
+    bot = FriendlyCodeChatbot(history_file=None, model=model)
+    assert bot.respond("weather idea")[1] == "default"
+
+
+if __name__ == "__main__":
+    test_rules_answer_until_the_model_is_ready()
+    test_model_answers_stream_in_pieces()
+    test_failed_load_keeps_rule_answers()
+    print("All model backend checks passed")
@@ -0,0 +1,71 @@
+"""
+Checks for the normalized LRU response cache
+"""
+
+import os
+import tempfile
+import time
+
+from coder_chatbot import FriendlyCodeChatbot
+from response_cache import ResponseCache, normalize_question
+
+
+def test_normalized_keys():
+    assert normalize_question("  How do I create a FUNCTION in Python?? ") == "how do i create a function in python"
+    cache = ResponseCache(max_size=4)
+    cache.put("What is a variable?", "answer")
+    assert cache.get("what is a   variable") == "answer"
+    assert cache.get("what is a loop") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_and_ttl_eviction():
+    cache = ResponseCache(max_size=2)
+    cache.put("one", 1)
+    cache.put("two", 2)
+    cache.get("one")
+    cache.put("three", 3)
+    assert cache.get("two") is None
+    assert cache.get("one") == 1
+
+    cache = ResponseCache(max_size=2, ttl=0.01)
+    cache.put("one", 1)
+    time.sleep(0.02)
+    assert cache.get("one") is None
+
+
+def test_namespace_change_invalidates():
+    cache = ResponseCache()
+    cache.put("question", "old", namespace="pack-v1")
+    assert cache.get("question", namespace="pack-v1") == "old"
+    assert cache.get("question", namespace="pack-v2") is None
+    assert len(cache) == 0
+
+
+def test_persistence_starts_warm():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "cache.json")
+        cache = ResponseCache(path=path)
+        cache.put("what is git", ("Git Basics", "git"), namespace="v1")
+        cache.save()
+        warm = ResponseCache(path=path)
+        assert warm.get("What is Git?", namespace="v1") == ("Git Basics", "git")
+
+
+def test_bot_uses_cache():
+    with tempfile.TemporaryDirectory() as folder:
+        bot = FriendlyCodeChatbot(history_file=os.path.join(folder, "history.jsonl"))
+        first = bot.get_smart_response("What is a variable?")
+        second = bot.get_smart_response("what is a variable")
+        assert first == second
+        assert bot.cache.stats()["hits"] == 1
+        bot.journal.close()
+
+
+if __name__ == "__main__":
+    test_normalized_keys()
+    test_lru_and_ttl_eviction()
+    test_namespace_change_invalidates()
+    test_persistence_starts_warm()
+    test_bot_uses_cache()
+    print("All response cache checks passed")
@@ -0,0 +1,64 @@
+"""
+Checks for the BM25 retrieval fallback
+"""
+
+from coder_chatbot import FriendlyCodeChatbot
+from retrieval import BM25Index, _numpy_available
+
+
+def build(use_numpy):
+    index = BM25Index(use_numpy=use_numpy)
+    index.add_document("git", "git commit branch merge pull push")
+    index.add_document("css", "css colors layout flexbox grid selectors")
+    index.add_document("python", "python lists dictionaries functions classes")
+    return index
+
+
+def test_ranking_and_incremental_add():
+    index = build(use_numpy=False)
+    assert index.search("how do I merge a branch")[0][0] == "git"
+    assert index.search("weather forecast") == []
+    index.add_document("git_rebase", "git rebase branch history rewrite rebase")
+    assert index.search("rebase my branch")[0][0] == "git_rebase"
+    if _numpy_available:
+        vectorized = build(use_numpy=True)
+        vectorized.add_document("git_rebase", "git rebase branch history rewrite rebase")
+        expected = index.scores("rebase branch with flexbox list")
+        assert all(abs(a - b) < 1e-9 for a, b in zip(vectorized.scores("rebase branch with flexbox list"), expected))
+
+
+def test_removed_and_replaced_documents_score_like_a_fresh_index():
+    for use_numpy in {False, _numpy_available}:
+        index = build(use_numpy)
+        index.add_document("git", "git rebase branch history")
+        index.remove_document("css")
+        index.add_document("js", "javascript promises async await fetch")
+        fresh = BM25Index(use_numpy=use_numpy)
+        fresh.add_document("git", "git rebase branch history")
+        fresh.add_document("python", "python lists dictionaries functions classes")
+        fresh.add_document("js", "javascript promises async await fetch")
+        query = "rebase a branch, fetch lists and flexbox"
+        assert len(index) == 3 and "css" not in index
+        scores, expected = dict(index.search(query)), dict(fresh.search(query))
+        assert scores.keys() == expected.keys()
+        assert all(abs(scores[doc_id] - expected[doc_id]) < 1e-9 for doc_id in expected)
+        assert index.search("flexbox grid") == []
+        # The slot of the removed document is reused
+        assert len(index.doc_ids) == 3
+
+
+def test_bot_falls_back_to_retrieval():
+    bot = FriendlyCodeChatbot(history_file=None)
+    answer, rule_id = bot.respond("await fetch data from server")
+    assert rule_id == "javascript_async" and answer == bot.pack.answer("javascript_async")
+    answer, rule_id = bot.respond("sort items in a collection")
+    assert rule_id == "default" and "Related topics:" in answer
+    answer, rule_id = bot.respond("weather idea")
+    assert (answer, rule_id) == (bot.pack.answer("default"), "default")
+
+
+if __name__ == "__main__":
+    test_ranking_and_incremental_add()
+    test_removed_and_replaced_documents_score_like_a_fresh_index()
+    test_bot_falls_back_to_retrieval()
+    print("All retrieval checks passed")
@@ -0,0 +1,42 @@
+"""
+Checks for the offline rule analyzer
+"""
+
+from intent_matcher import IntentMatcher, Rule
+from knowledge_pack import KnowledgePack
+from rule_analyzer import analyze, format_report, read_questions, unreachable_children
+
+
+def test_reports_shadowed_dead_and_overlapping_rules():
+    pack = KnowledgePack.load()
+    questions = list(read_questions([
+        "capital letters in javascript",
+        '{"question": "sum of numbers in js"}',
+        '"what is a python array"',
+        "",
+        "how do I sum numbers in javascript",
+    ]))
+    assert len(questions) == 4
+    report = analyze(pack, questions)
+    assert report["wins"] == {"math": 2, "string_case": 1, "python_list": 1}
+    by = {loss["winner"]: loss["count"] for loss in report["shadowed"]["javascript"]["by"]}
+    assert by == {"math": 2, "string_case": 1}
+    dead = {entry["rule"]: entry["reason"] for entry in report["dead"]}
+    assert dead["html"] == "never matched" and "math" not in dead
+    assert report["overlaps"]["keywords"]["array"] == ["python_list", "javascript_array"]
+    assert "Shadowed" in format_report(report)
+
+
+def test_child_hidden_by_an_earlier_sibling_is_unreachable():
+    matcher = IntentMatcher([
+        Rule("topic", ["topic"], priority=1),
+        Rule("broad", ["a", "b"], priority=1, parent="topic"),
+        Rule("narrow", ["b"], priority=2, parent="topic"),
+    ])
+    assert unreachable_children(matcher) == [("narrow", "broad")]
+
+
+if __name__ == "__main__":
+    test_reports_shadowed_dead_and_overlapping_rules()
+    test_child_hidden_by_an_earlier_sibling_is_unreachable()
+    print("All rule analyzer checks passed")
@@ -0,0 +1,57 @@
+"""
+Checks for code block extraction and the content-addressed snippet store
+"""
+
+import json
+import os
+import tempfile
+
+from snippet_store import SnippetStore, extract_code_blocks
+
+ANSWER = """Python Lists:
+```python
+numbers = [1, 2, 3]
+print(numbers)
+```
+
+An indented example:
+
+    for n in numbers:
+        print(n)
+
+Text with { braces } and print( is not code.
+~~~
+echo hi
+~~~
+"""
+
+
+def test_extracts_fenced_and_indented_blocks():
+    blocks = extract_code_blocks(ANSWER)
+    assert blocks == [
+        ("python", "numbers = [1, 2, 3]\nprint(numbers)"),
+        ("", "for n in numbers:\n    print(n)"),
+        ("", "echo hi"),
+    ]
+    assert extract_code_blocks("No code here, just { and print(") == []
+
+
+def test_snippets_are_stored_once():
+    with tempfile.TemporaryDirectory() as folder:
+        directory = os.path.join(folder, "snippets")
+        store = SnippetStore(directory)
+        written = store.save_async(ANSWER).result()
+        assert len(written) == 3 and written[0].endswith(".py")
+        assert store.save(ANSWER) == []
+        # A fresh store reads the index and still skips known snippets
+        again = SnippetStore(directory)
+        assert again.save(ANSWER) == [] and len(again) == 3
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            assert len(json.load(f)["snippets"]) == 3
+        store.close()
+
+
+if __name__ == "__main__":
+    test_extracts_fenced_and_indented_blocks()
+    test_snippets_are_stored_once()
+    print("All snippet store checks passed")
@@ -0,0 +1,150 @@
+"""
+Checks for the SQLite history backend
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+
+from history_store import HistoryArchive, HistoryJournal
+from sqlite_history import SqliteHistory, fts_query
+
+
+def test_pages_follow_stable_ids():
+    with tempfile.TemporaryDirectory() as folder:
+        history = SqliteHistory(os.path.join(folder, "history.db"))
+        history.extend([(f"q{i}", f"a{i}") for i in range(10)])
+        history.extend([("s0", "x"), ("s1", "y")], session="abc")
+        turns, cursor = history.load_tail(5)
+        assert [q for q, _ in turns] == ["q7", "q8", "q9", "s0", "s1"]
+        # Writes after the cursor was handed out do not move it
+        history.append("newest", "z")
+        older, cursor = history.load_before(cursor, 5)
+        assert [q for q, _ in older] == ["q2", "q3", "q4", "q5", "q6"]
+        older, cursor = history.load_before(cursor, 5)
+        assert [q for q, _ in older] == ["q0", "q1"] and cursor is None
+        assert history.load_tail(10, session="abc") == ([("s0", "x"), ("s1", "y")], None)
+        assert len(history.load()) == 13
+        history.close()
+
+
+def test_search_finds_every_word_newest_first():
+    with tempfile.TemporaryDirectory() as folder:
+        history = SqliteHistory(os.path.join(folder, "history.db"))
+        history.extend([("How do lists work?", "Lists keep order"),
+                        ("git rebase", "Rebasing rewrites commits"),
+                        ("sort a list", "Use sorted(my_list)")])
+        results, cursor = history.search("list")
+        assert [r["question"] for r in results] == ["sort a list"] and cursor is None
+        assert [r["question"] for r in history.search("lis*")[0]] == ["sort a list", "How do lists work?"]
+        # Words may come from the question and the answer
+        assert [r["question"] for r in history.search("GIT commits")[0]] == ["git rebase"]
+        first, cursor = history.search("list*", limit=1)
+        assert [r["question"] for r in history.search("list*", limit=1, before=cursor)[0]] == ["How do lists work?"]
+        assert fts_query('my_list "') == '"my" "list"' and history.search("?!") == ([], None)
+        history.clear()
+        assert history.search("list") == ([], None) and history.load() == []
+        history.close()
+
+
+def test_pack_answers_are_stored_once():
+    from knowledge_pack import KnowledgePack
+    pack = KnowledgePack.load()
+    answer = pack.answer("python_list")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.db")
+        history = SqliteHistory(path, answer_source=lambda: pack)
+        history.extend([(f"list {i}", answer) for i in range(50)] + [("other", "free text")])
+        rows = history._db.execute("SELECT COUNT(*), COUNT(answer) FROM turns").fetchone()
+        assert rows == (51, 1)
+        assert history._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 1
+        history.close()
+        reopened = SqliteHistory(path)
+        assert reopened.load()[0] == ("list 0", answer)
+        word = next(w for w in answer.lower().split() if w.isalpha() and len(w) > 4)
+        assert len(reopened.search(word, limit=100)[0]) == 50
+        reopened.close()
+
+
+def test_journal_is_imported_once_and_left_alone():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        archive = HistoryArchive(os.path.join(folder, "history.archive"))
+        journal = HistoryJournal(path, archive=archive, keep_turns=2)
+        journal.extend([(f"old {i}", "a") for i in range(5)])
+        journal.compact()
+        journal.close()
+        with open(path, "rb") as f:
+            before = f.read()
+        history = SqliteHistory(os.path.join(folder, "history.db"), legacy_path=path)
+        assert [q for q, _ in history.load()] == [f"old {i}" for i in range(5)]
+        history.clear()
+        history.close()
+        # Cleared after the import: the journal is not imported a second time
+        assert SqliteHistory(os.path.join(folder, "history.db"), legacy_path=path).load() == []
+        with open(path, "rb") as f:
+            assert f.read() == before
+
+        legacy = os.path.join(folder, "old.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([["array question", "array answer"]], f)
+        # A missing journal falls back to the .json file next to it
+        history = SqliteHistory(os.path.join(folder, "old.db"), legacy_path=os.path.join(folder, "old.jsonl"))
+        assert history.load() == [("array question", "array answer")]
+        history.close()
+
+
+def _append_turns(path, writer, count):
+    history = SqliteHistory(path, durability="none")
+    for i in range(count):
+        history.append(f"w{writer}-{i}", "answer")
+    history.close()
+
+
+def test_concurrent_processes_lose_no_turns():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.db")
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=_append_turns, args=(path, w, 100)) for w in range(3)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        history = SqliteHistory(path)
+        questions = [q for q, _ in history.load()]
+        assert sorted(questions) == sorted(f"w{w}-{i}" for w in range(3) for i in range(100))
+        assert len(history.search("answer", limit=1000)[0]) == 300
+        history.close()
+
+
+def test_bot_uses_the_sqlite_backend():
+    from coder_chatbot import FriendlyCodeChatbot, format_search_results
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        journal = HistoryJournal(path)
+        journal.append("imported question", "imported answer")
+        journal.close()
+        bot = FriendlyCodeChatbot(history_file=path, history_limit=2, history_backend="sqlite")
+        for i in range(3):
+            bot.ask(f"what is python {i}")
+        results, _ = bot.search_history("imported")
+        assert [r["question"] for r in results] == ["imported question"]
+        assert format_search_results("imported ", results).splitlines()[2:] == [
+            "• imported question", "    imported answer"]
+        bot.journal.close()
+        reloaded = FriendlyCodeChatbot(history_file=path, history_limit=2, history_backend="sqlite")
+        assert [q for q, _ in reloaded.history] == ["what is python 1", "what is python 2"]
+        assert [q for q, _ in reloaded.load_older_history()] == ["imported question", "what is python 0"]
+        assert not reloaded.has_older_history()
+        reloaded.journal.close()
+
+
+if __name__ == "__main__":
+    test_pages_follow_stable_ids()
+    test_search_finds_every_word_newest_first()
+    test_pack_answers_are_stored_once()
+    test_journal_is_imported_once_and_left_alone()
+    test_concurrent_processes_lose_no_turns()
+    test_bot_uses_the_sqlite_backend()
+    print("All SQLite history checks passed")
@@ -0,0 +1,49 @@
+"""
+Cold start budget: importing the chatbot and loading the newest history page
+must stay fast and independent of how long the history has grown
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Generous enough for slow CI machines, far below a transformers/torch import
+STARTUP_BUDGET = 2.0
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import coder_chatbot
+bot = coder_chatbot.FriendlyCodeChatbot(sys.argv[1], history_limit=coder_chatbot.HISTORY_PAGE_SIZE)
+bot.respond("What is a python list?")
+elapsed = time.perf_counter() - start
+heavy = [name for name in ("tkinter", "pyperclip", "transformers", "torch") if name in sys.modules]
+print(elapsed, len(bot.history), ",".join(heavy))
+"""
+
+
+def measure_startup(history_path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, history_path], cwd=here,
+                            capture_output=True, text=True, check=True)
+    elapsed, loaded, heavy = (result.stdout.strip().split(" ") + [""])[:3]
+    return float(elapsed), int(loaded), heavy
+
+
+def test_cold_start_stays_within_budget():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "history.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(100000):
+                f.write(json.dumps({"q": f"question {i}", "a": "answer " * 20}) + "\n")
+        elapsed, loaded, heavy = measure_startup(path)
+        assert loaded == 200
+        assert heavy == "", f"imported at start-up: {heavy}"
+        assert elapsed < STARTUP_BUDGET, f"cold start took {elapsed:.2f}s"
+
+
+if __name__ == "__main__":
+    test_cold_start_stays_within_budget()
+    print("All startup checks passed")
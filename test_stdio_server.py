@@ -0,0 +1,63 @@
+"""
+Checks for the headless --serve-stdio mode
+"""
+
+import io
+import json
+import subprocess
+import sys
+
+from coder_chatbot import FriendlyCodeChatbot
+from stdio_server import serve_stdio
+
+
+def test_streams_events_per_question():
+    bot = FriendlyCodeChatbot(history_file=None)
+    stdin = io.StringIO('what is git?\n\n{"id": "abc", "question": "hello"}\n{"id": 5}\n')
+    stdout = io.StringIO()
+    assert serve_stdio(bot, stdin, stdout) == 2
+    events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    git_answer = "".join(e["delta"] for e in events if e.get("id") == 1 and "delta" in e)
+    assert git_answer == bot.get_smart_response("what is git?")
+    assert {"id": "abc", "done": True, "rule": "greeting"} in events
+    # The request's own id comes back with the error; the line number only for unparsable lines
+    assert events[-1]["id"] == 5 and "error" in events[-1]
+    assert [q for q, _ in bot.history] == ["what is git?", "hello"]
+
+
+def test_trace_precedes_each_answer():
+    bot = FriendlyCodeChatbot(history_file=None)
+    stdout = io.StringIO()
+    serve_stdio(bot, io.StringIO("capital letters in javascript\n"), stdout, trace=True)
+    events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    rules = next(stage for stage in events[0]["trace"] if stage["stage"] == "rules")
+    assert rules["winner"] == "string_case" == events[-1]["rule"]
+
+
+def test_search_requests_page_through_the_history():
+    bot = FriendlyCodeChatbot(history_file=None)
+    bot.record([("what is a list", "ordered"), ("git push", "upload"), ("list comprehension", "[x for x in y]")])
+    stdin = io.StringIO('{"id": 1, "search": "list", "limit": 1}\n{"id": 2, "search": "list", "before": 3}\n'
+                        '{"id": 3, "search": 5}\n{"id": "x", "search": "git", "limit": "all"}\n{"id": 9, \n')
+    stdout = io.StringIO()
+    assert serve_stdio(bot, stdin, stdout) == 0
+    first, second, invalid, bad_limit, unparsable = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert invalid["id"] == 3 and bad_limit["id"] == "x" and "error" in bad_limit
+    assert unparsable["id"] == 5 and "error" in unparsable
+    assert [r["question"] for r in first["results"]] == ["list comprehension"] and first["next"] == 3
+    assert [r["question"] for r in second["results"]] == ["what is a list"] and second["next"] is None
+    assert "error" in invalid and len(bot.history) == 3
+
+
+def test_headless_import_skips_tkinter():
+    code = "import sys, coder_chatbot; print('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+if __name__ == "__main__":
+    test_streams_events_per_question()
+    test_trace_precedes_each_answer()
+    test_search_requests_page_through_the_history()
+    test_headless_import_skips_tkinter()
+    print("All stdio server checks passed")